@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+ANN backend comparison: recall@k, query latency and index memory on synthetic chunk vectors
+
+Vectors are clustered, normalized 384-d float32 (the MiniLM embedding size). Every
+(backend, size) pair runs in its own subprocess; memory is the resident set growth while
+building the index, measured after the dataset itself is in memory. Ground truth is exact
+inner-product search with numpy. HNSW settings come from HNSW_M / HNSW_EF_CONSTRUCTION /
+HNSW_EF_SEARCH, so export those to sweep them.
+
+Usage: python benchmarks/bench_ann.py [--sizes 100000,1000000] [--backends chroma,hnswlib,faiss,faiss-sq8,faiss-pq]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import numpy as np
+
+DIM = 384
+CLUSTERS = 256
+BATCH = 5000
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def make_dataset(size, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((CLUSTERS, DIM)).astype(np.float32)
+    data = np.empty((size, DIM), dtype=np.float32)
+    for start in range(0, size, 100_000):
+        end = min(size, start + 100_000)
+        assignment = rng.integers(0, CLUSTERS, end - start)
+        data[start:end] = centers[assignment] + 0.6 * rng.standard_normal((end - start, DIM)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    picks = rng.integers(0, size, queries)
+    query_vectors = data[picks] + 0.1 * rng.standard_normal((queries, DIM)).astype(np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+    return data, query_vectors
+
+def ground_truth(data, queries, k):
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_labels = np.zeros((len(queries), k), dtype=np.int64)
+    for start in range(0, len(data), 100_000):
+        scores = queries @ data[start:start + 100_000].T
+        labels = np.arange(start, start + scores.shape[1])[None, :].repeat(len(queries), axis=0)
+        scores = np.hstack([best_scores, scores])
+        labels = np.hstack([best_labels, labels])
+        top = np.argsort(-scores, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_labels = np.take_along_axis(labels, top, axis=1)
+    return best_labels
+
+class ChromaIndex:
+    """The same HNSW settings applied to a Chroma collection, for comparison"""
+
+    def __init__(self):
+        import chromadb
+        from config import HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH
+        client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench_ann_chroma_"))
+        self.collection = client.create_collection("bench", metadata={
+            "hnsw:space": "ip",
+            "hnsw:M": HNSW_M,
+            "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+            "hnsw:search_ef": HNSW_EF_SEARCH,
+        })
+
+    def add(self, labels, vectors):
+        self.collection.add(ids=[str(label) for label in labels], embeddings=vectors.tolist())
+
+    def search(self, queries, k):
+        result = self.collection.query(query_embeddings=queries.tolist(), n_results=k, include=[])
+        return [[int(label) for label in row] for row in result["ids"]], None
+
+def make_index(backend):
+    from core.ann_store import FaissIndex, HnswlibIndex
+    if backend == "chroma":
+        return ChromaIndex()
+    if backend == "hnswlib":
+        return HnswlibIndex(DIM)
+    if backend == "faiss":
+        return FaissIndex(DIM, "none")
+    if backend == "faiss-sq8":
+        return FaissIndex(DIM, "sq8")
+    if backend == "faiss-pq":
+        return FaissIndex(DIM, "pq")
+    raise ValueError(backend)
+
+def child(backend, size, queries, k):
+    data, query_vectors = make_dataset(size, queries)
+    truth = ground_truth(data, query_vectors, k)
+    rss_before = current_rss_mb()
+
+    index = make_index(backend)
+    start = time.perf_counter()
+    for offset in range(0, size, BATCH):
+        index.add(list(range(offset, min(size, offset + BATCH))), data[offset:offset + BATCH])
+    build_seconds = time.perf_counter() - start
+    index_mb = current_rss_mb() - rss_before
+
+    latencies = []
+    recalls = []
+    for i in range(queries):
+        start = time.perf_counter()
+        labels, _ = index.search(query_vectors[i:i + 1], k)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(labels[0]) & set(truth[i].tolist())) / k)
+
+    latencies.sort()
+    print(json.dumps({
+        "backend": backend,
+        "size": size,
+        "build_seconds": round(build_seconds, 1),
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000, 3),
+        "index_rss_mb": round(index_mb, 1),
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100000,1000000")
+    parser.add_argument("--backends", default="chroma,hnswlib,faiss,faiss-sq8,faiss-pq")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, size = args.child.split(":")
+        child(backend, int(size), args.queries, args.k)
+        return
+
+    print(f"{'backend':>10} {'size':>9} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p99 ms':>8} {'index MB':>9} {'build s':>8}")
+    for size in (int(value) for value in args.sizes.split(",")):
+        for backend in args.backends.split(","):
+            run = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", f"{backend}:{size}",
+                 "--queries", str(args.queries), "--k", str(args.k)],
+                capture_output=True, text=True,
+            )
+            if run.returncode != 0:
+                print(f"{backend:>10} {size:>9} failed: {run.stderr.strip().splitlines()[-1] if run.stderr.strip() else run.returncode}")
+                continue
+            r = json.loads(run.stdout.strip().splitlines()[-1])
+            print(f"{backend:>10} {size:>9} {r['recall_at_k']:>9.3f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['index_rss_mb']:>9.1f} {r['build_seconds']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
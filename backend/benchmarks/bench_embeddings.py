@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Embedding backends on CPU: vector parity with sentence-transformers and throughput
+
+Sentences of mixed length (short queries to chunk-sized passages) are embedded by the torch
+backend and by ONNX Runtime in fp32 and dynamic int8. Parity is the cosine similarity of each
+ONNX vector with the torch vector for the same sentence; a backend passes at min cosine >= 0.99.
+Throughput is sentences/sec over the whole set after one warm-up batch. The embedding cache is
+bypassed. The first ONNX run exports (and quantizes) the model into EMBEDDING_ONNX_DIR.
+
+Usage: python benchmarks/bench_embeddings.py [--sentences 2000] [--batch-size 64] [--threads 0] [--backends torch,onnx,onnx-int8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import numpy as np
+
+WORDS = (
+    "the deploy pipeline rolls back when health checks fail billing invoices are generated nightly "
+    "search indexing runs after every upload backups rotate weekly credentials expire quarterly "
+    "the on-call engineer reviews alerts and updates the runbook before closing an incident"
+).split()
+PARITY_THRESHOLD = 0.99
+
+def make_sentences(count, seed=3):
+    rng = random.Random(seed)
+    sentences = []
+    for i in range(count):
+        # Mostly chunk-sized passages, like ingestion, with some short query-like texts
+        length = rng.randint(5, 15) if i % 4 == 0 else rng.randint(40, 110)
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + ".")
+    return sentences
+
+def make_backend(name, threads):
+    if name == "torch":
+        from core.embeddings import create_model_embeddings
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return create_model_embeddings()
+    from core.embeddings import create_onnx_embeddings
+    return create_onnx_embeddings(quantize=name == "onnx-int8")
+
+def measure(backend, sentences, batch_size):
+    backend.embed_documents(sentences[:batch_size])
+    start = time.perf_counter()
+    vectors = np.asarray(backend.embed_documents(sentences), dtype=np.float32)
+    return vectors, len(sentences) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sentences", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads, 0 for the runtime default")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    args = parser.parse_args()
+
+    # Read by config when the backends are first imported
+    os.environ["EMBEDDING_BATCH_SIZE"] = str(args.batch_size)
+    os.environ["EMBEDDING_THREADS"] = str(args.threads)
+
+    sentences = make_sentences(args.sentences)
+    reference = None
+    baseline_rate = None
+    for name in args.backends.split(","):
+        vectors, rate = measure(make_backend(name, args.threads), sentences, args.batch_size)
+        line = f"{name:>10}: {rate:8.1f} sentences/s"
+        if reference is None:
+            reference, baseline_rate = vectors, rate
+        else:
+            cosine = (reference * vectors).sum(axis=1) / (
+                np.linalg.norm(reference, axis=1) * np.linalg.norm(vectors, axis=1))
+            verdict = "ok" if cosine.min() >= PARITY_THRESHOLD else "BELOW THRESHOLD"
+            line += (f" ({rate / baseline_rate:.2f}x), cosine vs {args.backends.split(',')[0]} "
+                     f"min {cosine.min():.4f} mean {cosine.mean():.4f} {verdict}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
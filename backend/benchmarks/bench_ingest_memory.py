@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Peak RSS of document ingestion: eager load + split versus the streaming pipeline
+
+Each mode runs in its own subprocess so its peak resident set size is measured in isolation.
+Embedding is left out (batches are hashed and dropped) so the numbers isolate the loader and
+splitter. A document of --rows rows or paragraphs is generated for each of --formats; pass
+--file to measure a real PDF/TXT/CSV/Markdown file instead.
+
+Usage: python benchmarks/bench_ingest_memory.py [--rows 500000] [--formats csv,txt,md] [--file path/to/doc.pdf]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+BATCH_SIZE = 64
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_eager(path):
+    from core.document_loader import load_pdf, load_txt, load_csv, split_docs, is_markdown
+    loaders = {".pdf": load_pdf, ".txt": load_txt, ".csv": load_csv, ".md": load_txt, ".markdown": load_txt}
+    docs = loaders[os.path.splitext(path)[1].lower()](path)
+    chunks = split_docs(docs, chunk_size=500, chunk_overlap=100, markdown=is_markdown(path))
+    for start in range(0, len(chunks), BATCH_SIZE):
+        hash(tuple(doc.page_content for doc in chunks[start:start + BATCH_SIZE]))
+    return len(chunks)
+
+def run_streaming(path):
+    from core.document_loader import iter_documents, iter_split_docs, batched, is_markdown
+    count = 0
+    chunks = iter_split_docs(iter_documents(path), chunk_size=500, chunk_overlap=100, markdown=is_markdown(path))
+    for batch in batched(chunks, BATCH_SIZE):
+        hash(tuple(doc.page_content for doc in batch))
+        count += len(batch)
+    return count
+
+def child(mode, path):
+    start = time.perf_counter()
+    chunks = (run_eager if mode == "eager" else run_streaming)(path)
+    elapsed = time.perf_counter() - start
+    print(f"{chunks} {elapsed:.3f} {peak_rss_mb():.1f}")
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("id,title,body\n")
+        for i in range(rows):
+            f.write(f'{i},Note {i},"Machine learning is a subset of artificial intelligence, row {i}."\n')
+
+def write_txt(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(f"Note {i}: machine learning is a subset of artificial intelligence, paragraph {i}.\n\n")
+
+def write_markdown(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            if i % 20 == 0:
+                f.write(f"# Chapter {i // 20}\n\n")
+            if i % 5 == 0:
+                f.write(f"## Section {i // 5}\n\n")
+            f.write(f"Note {i}: machine learning is a subset of artificial intelligence, paragraph {i}.\n\n")
+
+WRITERS = {"csv": write_csv, "txt": write_txt, "md": write_markdown}
+
+def measure(path):
+    print(f"Document: {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)")
+    results = {}
+    for mode in ("eager", "streaming"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode, "--file", path],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        chunks, elapsed, rss = int(output[-3]), float(output[-2]), float(output[-1])
+        results[mode] = rss
+        print(f"{mode:>9}: {chunks} chunks in {elapsed:.2f}s, peak RSS {rss:.1f} MB")
+    print(f"Peak RSS reduction: {results['eager'] / results['streaming']:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--formats", default="csv,txt,md", help="comma-separated generated formats: " + ",".join(WRITERS))
+    parser.add_argument("--file", help="measure this document instead of generated ones")
+    parser.add_argument("--child", choices=["eager", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.file)
+        return
+
+    if args.file:
+        measure(args.file)
+        return
+    directory = tempfile.mkdtemp(prefix="bench_ingest_")
+    for file_format in args.formats.split(","):
+        path = os.path.join(directory, f"corpus.{file_format}")
+        WRITERS[file_format](path, args.rows)
+        measure(path)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Markdown chunking cost: character splitting versus heading/section-aware splitting
+
+A synthetic corpus of structured notes (headings, prose, fenced code and tables) is chunked
+with both splitters at the ingestion settings (500 characters, 100 overlap). Every note plants
+facts in a paragraph, a code block and a table row; each fact has one query. Chunks are embedded
+with the configured embedding model and retrieved by cosine similarity. Reported per splitter:
+chunks per document, mean chunk size, hit rate at k, tokens handed to the prompt per answer
+(the top k chunks) and tokens read until the first chunk holding the answer.
+
+Tokens are estimated as characters / 4 unless --llm-tokens is given, which loads the chat model
+and counts with its tokenizer. With --dir the chunk statistics are also computed for a folder of
+your own Markdown files.
+
+Usage: python benchmarks/bench_markdown_chunking.py [--notes 200] [--k 4] [--dir ~/notes] [--llm-tokens]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import numpy as np
+from langchain_core.documents import Document
+from core.document_loader import make_splitter
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+SERVICES = ["billing", "search", "gateway", "scheduler", "exporter", "notifier"]
+PROSE = (
+    "This section was written after the last review and reflects how the team operates today. "
+    "Ask in the team channel before changing anything that is not covered here. "
+)
+
+def write_note(rng, i):
+    """One structured note and its (query, expected substring) pairs"""
+    service = SERVICES[i % len(SERVICES)]
+    port = 7000 + i
+    flag = f"--shard-limit={rng.randint(10, 99)}{i}"
+    owner = f"team-{rng.choice(['red', 'blue', 'green'])}-{i}"
+    rows = "\n".join(
+        f"| {service}-{i}-{env} | {rng.randint(1, 64)} | {owner if env == 'prod' else 'platform'} |"
+        for env in ("dev", "staging", "prod")
+    )
+    text = f"""# {service.title()} service {i}
+
+{PROSE * rng.randint(1, 2)}
+
+## Overview
+
+{PROSE * rng.randint(1, 3)}The {service} service {i} listens on port {port} behind the internal load balancer.
+
+## Deployment
+
+{PROSE * rng.randint(1, 2)}
+
+```bash
+# start the {service} worker {i}
+./run-{service} {flag} --port {port}
+./healthcheck {service}-{i}
+```
+
+### Rollback
+
+{PROSE * rng.randint(1, 2)}
+
+## Ownership
+
+| environment | replicas | owner |
+| ----------- | -------- | ----- |
+{rows}
+
+## Notes
+
+{PROSE * rng.randint(2, 4)}
+"""
+    queries = [
+        (f"Which port does the {service} service {i} listen on?", str(port)),
+        (f"What flag starts the {service} worker {i}?", flag),
+        (f"Who owns {service} service {i} in production?", owner),
+    ]
+    return text, queries
+
+def chunk(docs, markdown):
+    return make_splitter(CHUNK_SIZE, CHUNK_OVERLAP, markdown=markdown).split_documents(docs)
+
+def describe(name, docs, chunks, count):
+    sizes = [len(c.page_content) for c in chunks]
+    tokens = sum(count(c.page_content) for c in chunks)
+    print(f"{name:>11}: {len(chunks) / len(docs):.1f} chunks/doc, {np.mean(sizes):.0f} chars mean, "
+          f"{tokens / len(docs):.0f} tokens stored/doc")
+
+def evaluate(name, chunks, queries, embed, k, count):
+    vectors = np.asarray(embed.embed_documents([c.page_content for c in chunks]), dtype=np.float32)
+    query_vectors = np.asarray(embed.embed_documents([q for q, _ in queries]), dtype=np.float32)
+    hits, prompt_tokens, tokens_to_hit = 0, 0, []
+    for query_vector, (_, expected) in zip(query_vectors, queries):
+        ranked = np.argsort(-(vectors @ query_vector))[:k]
+        read = 0
+        for index in ranked:
+            read += count(chunks[index].page_content)
+            if expected in chunks[index].page_content:
+                hits += 1
+                tokens_to_hit.append(read)
+                break
+        prompt_tokens += sum(count(chunks[index].page_content) for index in ranked)
+    n = len(queries)
+    print(f"{name:>11}: hit@{k} {hits / n:.1%}, {prompt_tokens / n:.0f} tokens per answer, "
+          f"{np.mean(tokens_to_hit) if tokens_to_hit else 0:.0f} tokens to first hit")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--notes", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4, help="chunks retrieved per question")
+    parser.add_argument("--dir", help="also report chunk statistics for the Markdown files in this folder")
+    parser.add_argument("--llm-tokens", action="store_true", help="count tokens with the chat model's tokenizer")
+    args = parser.parse_args()
+
+    if args.llm_tokens:
+        from core.context_builder import count_tokens as count
+    else:
+        count = lambda text: len(text) // 4
+
+    rng = random.Random(11)
+    docs, queries = [], []
+    for i in range(args.notes):
+        text, note_queries = write_note(rng, i)
+        docs.append(Document(page_content=text, metadata={"source": f"note_{i}.md"}))
+        queries += note_queries
+
+    by_splitter = {"characters": chunk(docs, False), "sections": chunk(docs, True)}
+    print(f"Synthetic corpus: {len(docs)} notes, {len(queries)} questions")
+    for name, chunks in by_splitter.items():
+        describe(name, docs, chunks, count)
+
+    from core.embeddings import create_model_embeddings
+    model_embeddings = create_model_embeddings()
+    for name, chunks in by_splitter.items():
+        evaluate(name, chunks, queries, model_embeddings, args.k, count)
+
+    if args.dir:
+        own = []
+        for root, _, names in os.walk(os.path.expanduser(args.dir)):
+            for name in names:
+                if name.lower().endswith((".md", ".markdown")):
+                    with open(os.path.join(root, name), encoding="utf-8", errors="replace") as f:
+                        own.append(Document(page_content=f.read(), metadata={"source": name}))
+        if own:
+            print(f"{args.dir}: {len(own)} files")
+            for markdown, name in ((False, "characters"), (True, "sections")):
+                describe(name, own, chunk(own, markdown), count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+First-token latency of multi-turn chats with and without the llama.cpp prompt state cache
+
+Usage: python benchmarks/bench_prompt_cache.py [--chats 3] [--turns 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain.prompts import ChatPromptTemplate
+from config import PROMPT_CACHE_BYTES
+from core.chain import SYSTEM_PROMPT, PROMPT_PREFIX
+from core.llm import llm_pool
+from core.prompt_cache import enable_prompt_cache, warm_prompt_cache
+
+llm = llm_pool[0]
+
+CONTEXT = "Machine learning is a subset of artificial intelligence that learns from data. " * 8
+
+def render(history: list[str], question: str) -> str:
+    text = SYSTEM_PROMPT.format(
+        retrieved_context=CONTEXT,
+        history="\n".join(history) if history else "None",
+        user_query=question,
+    )
+    return ChatPromptTemplate.from_messages([("system", text)]).format_prompt().to_string()
+
+def first_token_latency(prompt: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    latency = None
+    response = ""
+    for chunk in llm.stream(prompt):
+        if latency is None:
+            latency = time.perf_counter() - start
+        response += chunk
+    return latency or 0.0, response
+
+def run(chats: int, turns: int) -> list[float]:
+    """Interleave several chats so each turn must find its own chat's state again"""
+    histories = [[] for _ in range(chats)]
+    latencies = []
+    for turn in range(turns):
+        for chat, history in enumerate(histories):
+            question = f"Chat {chat}, question {turn}: what does the context say about learning?"
+            latency, response = first_token_latency(render(history, question))
+            latencies.append(latency)
+            history += [f"User: {question}", f"Assistant: {response.strip()}"]
+    return latencies
+
+def summarize(label: str, latencies: list[float]):
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    print(f"{label:<14} first turn {latencies[0] * 1000:8.0f}ms   p50 {p50 * 1000:8.0f}ms   max {ordered[-1] * 1000:8.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=4)
+    args = parser.parse_args()
+
+    llm.client.set_cache(None)
+    uncached = run(args.chats, args.turns)
+
+    enable_prompt_cache(llm, PROMPT_CACHE_BYTES)
+    warm_prompt_cache(llm, PROMPT_PREFIX)
+    cached = run(args.chats, args.turns)
+
+    print(f"{args.chats} interleaved chats x {args.turns} turns")
+    summarize("without cache", uncached)
+    summarize("with cache", cached)
+
+if __name__ == "__main__":
+    main()
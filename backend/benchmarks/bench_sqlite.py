@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Chat history throughput: message inserts and per-chat loads on a large SQLite store
+
+Usage: python benchmarks/bench_sqlite.py [--messages 1000000] [--chats 2000] [--loads 500]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+# Point the store at a scratch database before config is imported
+scratch_dir = tempfile.mkdtemp(prefix="bench_sqlite_")
+os.environ["CHAT_HISTORY_DB_FILE"] = os.path.join(scratch_dir, "chat_history.db")
+
+from core import knowledge_base
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=500)
+    args = parser.parse_args()
+
+    knowledge_base.init_db()
+    chat_ids = [knowledge_base.create_chat(f"Chat {i}")["id"] for i in range(args.chats)]
+    content = "Machine learning is a subset of artificial intelligence. " * 4
+
+    # Every save_message is its own transaction, as it is when serving /chat
+    start = time.perf_counter()
+    for i in range(args.messages):
+        knowledge_base.save_message(chat_ids[i % args.chats], "user" if i % 2 == 0 else "assistant", content)
+        if (i + 1) % 100_000 == 0:
+            print(f"  inserted {i + 1:,} messages")
+    insert_seconds = time.perf_counter() - start
+
+    latencies = []
+    loaded = 0
+    for _ in range(args.loads):
+        chat_id = random.choice(chat_ids)
+        start = time.perf_counter()
+        loaded += len(knowledge_base.load_messages(chat_id))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    knowledge_base.get_chats()
+    list_seconds = time.perf_counter() - start
+
+    db_bytes = sum(
+        os.path.getsize(os.path.join(scratch_dir, name)) for name in os.listdir(scratch_dir)
+    )
+    print(f"{args.messages:,} messages across {args.chats:,} chats ({db_bytes / 1e6:.0f} MB on disk)")
+    print(f"insert   {args.messages / insert_seconds:10,.0f} messages/s")
+    print(f"load     {loaded / sum(latencies):10,.0f} messages/s   "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f}ms   p99 {percentile(latencies, 0.99) * 1000:.2f}ms per chat")
+    print(f"list     {list_seconds * 1000:10.2f} ms for all chats")
+
+if __name__ == "__main__":
+    main()
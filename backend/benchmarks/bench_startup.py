@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Server startup: import time, time to first /ping, time until /health reports ready and time to
+the first streamed token of a chat
+
+Each run starts `python server.py` in a fresh process against scratch databases, once with the
+background warm up and once without it (models then load on the first chat). Times are measured
+from process start; "first token" is the first body byte of a chat response sent as soon as
+/ping answers, so without warm up it includes loading every model.
+
+Usage: python benchmarks/bench_startup.py [--port 8765] [--modes warm,cold] [--timeout 600]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+def scratch_env(port, warm_up):
+    scratch_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    return {
+        **os.environ,
+        "PORT": str(port),
+        "WARM_UP_ON_STARTUP": "true" if warm_up else "false",
+        "CHROMA_DB_FILE": os.path.join(scratch_dir, "chroma_db"),
+        "CHUNK_INDEX_FILE": os.path.join(scratch_dir, "chunk_index.db"),
+        "CHAT_HISTORY_DB_FILE": os.path.join(scratch_dir, "chat_history.db"),
+        "EMBEDDING_CACHE_FILE": os.path.join(scratch_dir, "embedding_cache.db"),
+        "LOCAL_INDEX_DIR": os.path.join(scratch_dir, "ann_index"),
+        "WATCH_STATE_FILE": os.path.join(scratch_dir, "watch_state.db"),
+    }
+
+def import_seconds(env):
+    """Cost of importing the routes module in a fresh interpreter"""
+    code = "import time; start = time.perf_counter(); import routes; print(time.perf_counter() - start)"
+    run = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, env=env, capture_output=True, text=True)
+    if run.returncode != 0:
+        raise RuntimeError(run.stderr.strip().splitlines()[-1])
+    return float(run.stdout.strip().splitlines()[-1])
+
+def get(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def wait_for(check, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("server did not get there in time")
+
+def first_token(base, timeout):
+    request = urllib.request.Request(
+        f"{base}/chat/{uuid.uuid4()}",
+        data=json.dumps({"message": "Say hello in one word."}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read(1)
+        first = time.perf_counter()
+        response.read()
+    return first
+
+def run(mode, port, timeout):
+    env = scratch_env(port, mode == "warm")
+    imported = import_seconds(env)
+    base = f"http://127.0.0.1:{port}"
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=backend_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        pinged = wait_for(lambda: get(f"{base}/ping")["message"] == "pong", deadline)
+        token = first_token(base, timeout)
+        # Without warm up a chat that references no files never opens the vector store
+        ready = wait_for(lambda: get(f"{base}/health")["status"] == "healthy", deadline) if mode == "warm" else None
+        components = get(f"{base}/health")["components"]
+    finally:
+        server.terminate()
+        server.wait()
+
+    loads = ", ".join(f"{name} {c['load_seconds']}s" for name, c in components.items() if c["load_seconds"] is not None)
+    print(f"{mode:>5}: import routes {imported:.2f}s, first /ping {pinged - start:.2f}s, "
+          f"first token {token - start:.2f}s, healthy {f'{ready - start:.2f}s' if ready else '-'} ({loads})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="warm,cold", help="warm: background warm up, cold: load on first use")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        run(mode, args.port, args.timeout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Chat streaming throughput: tokens/sec delivered to an HTTP client, one event per token versus coalesced
+
+A stub endpoint streams synthetic tokens through the same coalescing and SSE framing as /chat
+(no model), served by uvicorn on localhost. The client parses the events and counts tokens,
+events and bytes. --rate caps generation in tokens/sec (0 produces them as fast as possible,
+which measures the protocol overhead alone).
+
+Usage: python benchmarks/bench_streaming.py [--tokens 20000] [--rate 0] [--port 8766]
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from core.streaming import coalesce_events, format_event
+from config import STREAM_FLUSH_BYTES, STREAM_FLUSH_SECONDS
+
+TOKEN = "tok1 "
+MODES = {
+    "per-token": {"flush_seconds": 0, "flush_bytes": 0},
+    "coalesced": {"flush_seconds": STREAM_FLUSH_SECONDS, "flush_bytes": STREAM_FLUSH_BYTES},
+}
+
+def create_app():
+    app = FastAPI()
+
+    async def fake_chat(count, rate):
+        for i in range(count):
+            # Yield to the loop like a real generation step does
+            await asyncio.sleep(1 / rate if rate else 0)
+            yield TOKEN
+        yield {"type": "final", "response": TOKEN * count}
+
+    @app.get("/stream/{mode}")
+    async def stream(mode: str, request: Request, tokens: int, rate: float = 0):
+        async def generate():
+            events = coalesce_events(fake_chat(tokens, rate), request.is_disconnected, **MODES[mode])
+            try:
+                async for event, data in events:
+                    yield format_event(event, data)
+            finally:
+                await events.aclose()
+        return StreamingResponse(generate(), media_type="text/event-stream")
+
+    return app
+
+def read_stream(port, mode, tokens, rate):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    start = time.perf_counter()
+    connection.request("GET", f"/stream/{mode}?tokens={tokens}&rate={rate}")
+    response = connection.getresponse()
+    text, events, received = "", 0, 0
+    first_token = None
+    buffer = b""
+    while True:
+        chunk = response.read1(65536)
+        if not chunk:
+            break
+        received += len(chunk)
+        buffer += chunk
+        *frames, buffer = buffer.split(b"\n\n")
+        for frame in frames:
+            event, data = frame.decode().split("\n", 1)
+            events += 1
+            if event == "event: token":
+                first_token = first_token or time.perf_counter()
+                text += json.loads(data[len("data: "):])["text"]
+    elapsed = time.perf_counter() - start
+    connection.close()
+    delivered = len(text) // len(TOKEN)
+    assert delivered == tokens, f"{mode}: {delivered} of {tokens} tokens delivered"
+    return delivered / elapsed, events, received, first_token - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="generated tokens/sec, 0 for unthrottled")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(create_app(), host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        for mode in MODES:
+            rate, events, received, first = read_stream(args.port, mode, args.tokens, args.rate)
+            print(f"{mode:>10}: {rate:10.0f} tokens/s delivered, {events} events, {received / 1024:.0f} KiB, "
+                  f"first token {first * 1000:.1f} ms")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite: ingest, retrieval, /chat under concurrency and chat history storage
+
+Each corpus size runs in its own process against scratch stores. A synthetic corpus of txt, csv
+and pdf files (about one chunk per note) is ingested format by format, then planted note codes
+are queried through the hybrid and similarity retrievers, then /chat is served by uvicorn and
+hit by concurrent clients referencing corpus files. The LLM is a deterministic fake that streams
+a fixed answer at --tokens-per-second, so chat numbers measure the pipeline rather than the
+model. History throughput (message writes, full loads, page reads) runs once in its own process.
+Embeddings use the configured model unless --fake-embeddings is given (hash vectors, for quick
+runs where retrieval quality does not matter).
+
+Results are written as JSON with the commit they were measured on; --compare prints the
+change of every number against an earlier results file.
+
+Usage: python benchmarks/bench_suite.py [--sizes 1000,10000,100000] [--formats txt,csv,pdf]
+           [--tokens-per-second 20] [--response-tokens 64] [--concurrency 1,4,16] [--queries 200]
+           [--fake-embeddings] [--output results.json] [--compare earlier.json]
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+TOPICS = ["deployment", "billing", "search indexing", "authentication", "backups", "email delivery"]
+FILLER = [
+    "The team reviewed the incident timeline and agreed on follow-up actions.",
+    "Monitoring dashboards were checked after the change went out.",
+    "The on-call rotation was informed and the runbook was updated.",
+    "Customers saw no impact while the migration ran overnight.",
+    "A follow-up ticket tracks the remaining cleanup work.",
+    "Alert thresholds were tuned to reduce noise during releases.",
+]
+ANSWER_WORDS = "Based on the notes the fix is to rotate the credentials and restart the affected worker".split()
+NOTES_PER_FILE = 200
+NOTE_CHARS = 440       # One note per chunk with the default 500 character splitter
+PDF_LINE_CHARS = 95
+PDF_LINES_PER_PAGE = 60
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+def latency_summary(seconds):
+    return {
+        "p50_ms": round(percentile(seconds, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 0.99) * 1000, 2),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2) if seconds else 0.0,
+    }
+
+# ---------- Synthetic corpus ----------
+
+def make_note(rng, index):
+    """A note of about NOTE_CHARS characters around one planted code, returning (code, topic, text)"""
+    topic = rng.choice(TOPICS)
+    code = f"KB-{index:06d}-{rng.randint(1000, 9999)}"
+    text = f"Note {code} on {topic}: rotate the {topic} credentials and restart worker {index % 97}."
+    while len(text) < NOTE_CHARS:
+        text += " " + rng.choice(FILLER)
+    return code, topic, text[:NOTE_CHARS].rsplit(" ", 1)[0] + "."
+
+def pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path, paragraphs):
+    """A plain Helvetica PDF with one text line per content-stream line, no dependencies"""
+    lines = []
+    for paragraph in paragraphs:
+        words, line = paragraph.split(), ""
+        for word in words:
+            if len(line) + len(word) + 1 > PDF_LINE_CHARS:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines += [line, ""]
+    pages = [lines[i:i + PDF_LINES_PER_PAGE] for i in range(0, len(lines), PDF_LINES_PER_PAGE)]
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({pdf_escape(line)}) Tj T*" for line in page) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode("latin-1"))
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {len(objects)} 0 R >>".encode("latin-1")
+        )
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+def write_corpus(directory, chunks, formats, seed=11):
+    """About `chunks` notes split evenly over the formats, one subdirectory per format.
+
+    Returns {format: directory} and the (code, topic) of every note for queries.
+    """
+    rng = random.Random(seed)
+    per_format = max(1, chunks // len(formats))
+    dirs, planted, index = {}, [], 0
+    for file_format in formats:
+        dirs[file_format] = os.path.join(directory, file_format)
+        os.makedirs(dirs[file_format])
+        for file_number, start in enumerate(range(0, per_format, NOTES_PER_FILE)):
+            notes = [make_note(rng, index + i) for i in range(min(NOTES_PER_FILE, per_format - start))]
+            index += len(notes)
+            planted += [(code, topic) for code, topic, _ in notes]
+            path = os.path.join(dirs[file_format], f"{file_format}_notes_{file_number:04d}.{file_format}")
+            if file_format == "txt":
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(text for _, _, text in notes))
+            elif file_format == "csv":
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["code", "topic", "note"])
+                    writer.writerows(notes)
+            elif file_format == "pdf":
+                write_pdf(path, [text for _, _, text in notes])
+            else:
+                raise ValueError(f"Unsupported corpus format: {file_format}")
+    return dirs, planted
+
+# ---------- Stubs ----------
+
+def install_fake_llm(tokens_per_second, response_tokens):
+    """Replace core.llm with a deterministic streamer before anything imports it"""
+    import types
+    from typing import Iterator
+    from langchain_core.language_models.llms import LLM
+    from langchain_core.outputs import GenerationChunk
+    from config import LLM_POOL_SIZE
+    from core.lazy import LazyComponent
+    from core.scheduler import InferenceScheduler
+
+    class PacedFakeLLM(LLM):
+        """Streams the same answer one word-token at a time at a fixed rate.
+
+        Only the sync stream is implemented, so astream runs it in a thread per step like LlamaCpp.
+        """
+
+        tokens_per_second: float = 20.0
+        response_tokens: int = 64
+
+        @property
+        def _llm_type(self) -> str:
+            return "paced-fake"
+
+        def answer_tokens(self):
+            return [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(self.response_tokens)]
+
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs) -> str:
+            return "".join(self.answer_tokens())
+
+        def _stream(self, prompt, stop=None, run_manager=None, **kwargs) -> Iterator[GenerationChunk]:
+            interval = 1 / self.tokens_per_second if self.tokens_per_second else 0
+            for token in self.answer_tokens():
+                if interval:
+                    time.sleep(interval)
+                yield GenerationChunk(text=token)
+
+        def get_num_tokens(self, text: str) -> int:
+            return len(text.split())
+
+    module = types.ModuleType("core.llm")
+    module.llm_pool = LazyComponent("llm", lambda: [
+        PacedFakeLLM(tokens_per_second=tokens_per_second, response_tokens=response_tokens) for _ in range(LLM_POOL_SIZE)
+    ])
+    module.inference_scheduler = InferenceScheduler(module.llm_pool, size=LLM_POOL_SIZE)
+    sys.modules["core.llm"] = module
+
+def install_fake_embeddings():
+    """Replace core.embeddings with deterministic hash vectors"""
+    import types
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from core.lazy import LazyComponent
+
+    module = types.ModuleType("core.embeddings")
+    module.embeddings = LazyComponent("embeddings", lambda: DeterministicFakeEmbedding(size=384))
+    sys.modules["core.embeddings"] = module
+
+def scratch_env(scratch_dir, args):
+    return {
+        "CHROMA_DB_FILE": os.path.join(scratch_dir, "chroma_db"),
+        "CHUNK_INDEX_FILE": os.path.join(scratch_dir, "chunk_index.db"),
+        "CHAT_HISTORY_DB_FILE": os.path.join(scratch_dir, "chat_history.db"),
+        "EMBEDDING_CACHE_FILE": os.path.join(scratch_dir, "embedding_cache.db"),
+        "LOCAL_INDEX_DIR": os.path.join(scratch_dir, "ann_index"),
+        "WATCH_STATE_FILE": os.path.join(scratch_dir, "watch_state.db"),
+        "UPLOAD_DIR": os.path.join(scratch_dir, "files"),
+        "WATCH_DIRS": "",
+        "WARM_UP_ON_STARTUP": "false",
+        "TRACE_EXPORTERS": "",
+        # Every chat must run the full pipeline, and no request may be turned away at peak concurrency
+        "ANSWER_CACHE_ENABLED": "false",
+        "LLM_MAX_QUEUED": str(max(args.concurrency) * 2),
+        "LLM_QUEUE_TIMEOUT": "3600",
+    }
+
+# ---------- Workers (run in a child process with the scratch environment) ----------
+
+def bench_ingest(dirs):
+    from core.vector_store import ingest_files_to_knowledge_base
+
+    results, total_chunks, total_seconds = {}, 0, 0.0
+    for file_format, directory in dirs.items():
+        summary = ingest_files_to_knowledge_base([directory])
+        results[file_format] = {
+            "files": summary["files"],
+            "failed": summary["failed"],
+            "chunks": summary["chunks_embedded"],
+            "seconds": summary["seconds"],
+            "chunks_per_second": summary["chunks_per_second"],
+        }
+        total_chunks += summary["chunks_embedded"]
+        total_seconds += summary["seconds"]
+    results["total"] = {
+        "chunks": total_chunks,
+        "seconds": round(total_seconds, 2),
+        "chunks_per_second": round(total_chunks / total_seconds, 1) if total_seconds else 0.0,
+    }
+    return results
+
+def bench_retrieval(planted, queries, seed=5):
+    from core.vector_store import create_retriever
+
+    rng = random.Random(seed)
+    sample = rng.sample(planted, min(queries, len(planted)))
+    results = {}
+    for mode in ("hybrid", "similarity"):
+        retriever = create_retriever(None, mode)
+        retriever.invoke("warm up")
+        latencies, hits, returned = [], 0, 0
+        for code, topic in sample:
+            start = time.perf_counter()
+            docs = retriever.invoke(f"What does note {code} say about {topic}?")
+            latencies.append(time.perf_counter() - start)
+            returned += len(docs)
+            hits += any(code in doc.page_content for doc in docs)
+        results[mode] = {
+            **latency_summary(latencies),
+            "queries": len(sample),
+            "k": round(returned / len(sample), 2),
+            "hit_rate": round(hits / len(sample), 4),
+        }
+    return results
+
+def first_token_request(base, file_name, question):
+    """(time to first token event, total time, tokens) of one /chat request"""
+    request = urllib.request.Request(
+        f"{base}/chat/{uuid.uuid4()}",
+        data=json.dumps({"message": question, "files": [file_name]}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    start = time.perf_counter()
+    first, tokens, buffer = None, 0, b""
+    with urllib.request.urlopen(request, timeout=3600) as response:
+        while True:
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            buffer += chunk
+            *frames, buffer = buffer.split(b"\n\n")
+            for frame in frames:
+                event, data = frame.decode().split("\n", 1)
+                if event == "event: token":
+                    first = first or time.perf_counter()
+                    tokens += len(json.loads(data[len("data: "):])["text"].split())
+                elif event == "event: error":
+                    raise RuntimeError(data)
+    return first - start, time.perf_counter() - start, tokens
+
+def bench_chat(planted, file_names, concurrency_levels, requests_per_client, port):
+    import uvicorn
+    from server import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}"
+    rng = random.Random(9)
+    results = {}
+    try:
+        # Loads the (fake) model, embeddings and vector store outside the measurements
+        first_token_request(base, file_names[0], "warm up")
+        for clients in concurrency_levels:
+            jobs = []
+            for _ in range(clients * requests_per_client):
+                code, topic = rng.choice(planted)
+                jobs.append((rng.choice(file_names), f"What does note {code} say about {topic}?"))
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                runs = list(pool.map(lambda job: first_token_request(base, *job), jobs))
+            elapsed = time.perf_counter() - start
+            results[str(clients)] = {
+                "requests": len(runs),
+                "ttft": latency_summary([ttft for ttft, _, _ in runs]),
+                "total": latency_summary([total for _, total, _ in runs]),
+                "requests_per_second": round(len(runs) / elapsed, 2),
+                "tokens_per_second": round(sum(tokens for _, _, tokens in runs) / elapsed, 1),
+            }
+    finally:
+        server.should_exit = True
+        thread.join()
+    return results
+
+def bench_history(messages, chats, page_size=50):
+    from concurrent.futures import ThreadPoolExecutor as Pool
+    from core.knowledge_base import init_db, save_message, load_messages, get_chat_messages, encode_cursor
+
+    init_db()
+    chat_ids = [str(uuid.uuid4()) for _ in range(chats)]
+    text = " ".join(FILLER)
+
+    start = time.perf_counter()
+    for i in range(messages):
+        save_message(chat_ids[i % chats], "user" if i % 2 == 0 else "assistant", text)
+    write_seconds = time.perf_counter() - start
+
+    # Concurrent writers, one chat each, as several chats answering at once
+    start = time.perf_counter()
+    with Pool(max_workers=4) as pool:
+        list(pool.map(lambda i: save_message(chat_ids[i % chats], "assistant", text), range(messages)))
+    concurrent_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = sum(len(load_messages(chat_id)) for chat_id in chat_ids)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages = 0
+    for chat_id in chat_ids:
+        # Oldest first, each page continues after the last row of the previous one as /chats/{id} does
+        page = get_chat_messages(chat_id, limit=page_size)
+        while page:
+            pages += 1
+            page = get_chat_messages(chat_id, limit=page_size, after=encode_cursor(page[-1][4], page[-1][0]))
+    page_seconds = time.perf_counter() - start
+
+    return {
+        "writes_per_second": round(messages / write_seconds, 1),
+        "concurrent_writes_per_second": round(messages / concurrent_seconds, 1),
+        "messages_loaded_per_second": round(loaded / load_seconds, 1),
+        "pages_per_second": round(pages / page_seconds, 1),
+        "messages": messages * 2,
+        "chats": chats,
+    }
+
+def run_worker(args):
+    """Child process entry: the scratch environment is already set, build stubs then measure"""
+    if args.fake_embeddings:
+        install_fake_embeddings()
+    install_fake_llm(args.tokens_per_second, args.response_tokens)
+
+    if args.worker == "history":
+        result = bench_history(args.history_messages, args.history_chats)
+    else:
+        from core.knowledge_base import init_db
+        init_db()
+        corpus_dir = tempfile.mkdtemp(prefix="bench_corpus_")
+        dirs, planted = write_corpus(corpus_dir, args.chunks, args.formats)
+        file_names = sorted(name for directory in dirs.values() for name in os.listdir(directory))
+        result = {
+            "target_chunks": args.chunks,
+            "ingest": bench_ingest(dirs),
+            "retrieval": bench_retrieval(planted, args.queries),
+            "chat": bench_chat(planted, file_names, args.concurrency, args.requests_per_client, args.port),
+        }
+    print("RESULT " + json.dumps(result))
+
+# ---------- Driver ----------
+
+def spawn(worker_args, args):
+    scratch_dir = tempfile.mkdtemp(prefix="bench_suite_")
+    env = {**os.environ, **scratch_env(scratch_dir, args)}
+    command = [sys.executable, os.path.abspath(__file__), *worker_args, *args.passthrough]
+    run = subprocess.run(command, cwd=backend_dir, env=env, capture_output=True, text=True)
+    for line in run.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{' '.join(worker_args)} failed:\n{run.stderr.strip()[-2000:]}")
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results, prefix=""):
+    values = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            values.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+def compare(earlier_path, results):
+    with open(earlier_path) as f:
+        earlier = json.load(f)
+    before, after = flatten(earlier["results"]), flatten(results["results"])
+    print(f"\nCompared with {earlier['commit']} ({earlier['timestamp']}):")
+    for name in sorted(before.keys() & after.keys()):
+        change = f"{(after[name] - before[name]) / before[name]:+.1%}" if before[name] else "n/a"
+        print(f"  {name:<60} {before[name]:>12} -> {after[name]:>12}  {change}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="corpus sizes in chunks")
+    parser.add_argument("--formats", default="txt,csv,pdf")
+    parser.add_argument("--tokens-per-second", type=float, default=20, help="fake LLM streaming rate, 0 for unthrottled")
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--concurrency", default="1,4,16", help="simultaneous /chat clients")
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200, help="retrieval queries per mode")
+    parser.add_argument("--history-messages", type=int, default=5000)
+    parser.add_argument("--history-chats", type=int, default=50)
+    parser.add_argument("--fake-embeddings", action="store_true")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="results file, default benchmarks/results/<timestamp>-<commit>.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--worker", choices=["corpus", "history"], help=argparse.SUPPRESS)
+    parser.add_argument("--chunks", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.formats = args.formats.split(",")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    # Settings the child processes need, passed on unchanged
+    args.passthrough = [
+        "--formats", ",".join(args.formats), "--tokens-per-second", str(args.tokens_per_second),
+        "--response-tokens", str(args.response_tokens), "--concurrency", ",".join(map(str, args.concurrency)),
+        "--requests-per-client", str(args.requests_per_client), "--queries", str(args.queries),
+        "--history-messages", str(args.history_messages), "--history-chats", str(args.history_chats),
+        "--port", str(args.port),
+    ] + (["--fake-embeddings"] if args.fake_embeddings else [])
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {"corpora": {}}
+    for size in [int(size) for size in args.sizes.split(",")]:
+        print(f"Corpus of {size} chunks...", flush=True)
+        results["corpora"][str(size)] = run = spawn(["--worker", "corpus", "--chunks", str(size)], args)
+        print(f"  ingest {run['ingest']['total']['chunks_per_second']} chunks/s, "
+              f"hybrid retrieval p50 {run['retrieval']['hybrid']['p50_ms']}ms p99 {run['retrieval']['hybrid']['p99_ms']}ms, "
+              + ", ".join(f"ttft p50 {c['ttft']['p50_ms']}ms at {level} clients" for level, c in run["chat"].items()))
+    print("Chat history...", flush=True)
+    results["history"] = spawn(["--worker", "history"], args)
+    print(f"  {results['history']['writes_per_second']} writes/s, {results['history']['pages_per_second']} pages/s")
+
+    commit = git_commit()
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    report = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "params": {key: value for key, value in vars(args).items() if key not in ("worker", "chunks", "passthrough", "output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(backend_dir, "benchmarks", "results", f"{timestamp}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,14 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Models
 MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(BASE_DIR, "models", "zephyr-7b-alpha.Q5_K_M.gguf"))
 
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Embeddings backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(BASE_DIR, "models", "onnx"))  # Exported once per model
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() == "true"      # Dynamic int8 weights
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))   # ONNX Runtime intra-op threads, 0 lets it decide
+
 # Server configuration
 HOST = os.getenv("HOST", "0.0.0.0")
 PORT = os.getenv("PORT", 8002)
@@ -17,4 +25,122 @@ CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 # Database configuration
 DATA_DIR = os.path.join(BASE_DIR, "data")
 CHAT_HISTORY_DB_FILE = os.getenv("CHAT_HISTORY_DB_FILE", os.path.join(DATA_DIR, "chat_history.db"))
-CHROMA_DB_FILE = os.getenv("CHROMA_DB_FILE", os.path.join(DATA_DIR, "chroma_db"))
\ No newline at end of file
+CHROMA_DB_FILE = os.getenv("CHROMA_DB_FILE", os.path.join(DATA_DIR, "chroma_db"))
+CHUNK_INDEX_FILE = os.getenv("CHUNK_INDEX_FILE", os.path.join(os.path.dirname(CHROMA_DB_FILE), "chunk_index.db"))
+
+# Ingestion job queue
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", 2))         # Concurrent ingestion jobs
+INGEST_MAX_QUEUED = int(os.getenv("INGEST_MAX_QUEUED", 100))         # Jobs waiting before uploads are rejected
+INGEST_DEFAULT_PRIORITY = int(os.getenv("INGEST_DEFAULT_PRIORITY", 10))  # Lower value runs first
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))          # Chunks embedded per add_documents call
+INGEST_TEXT_BLOCK_CHARS = int(os.getenv("INGEST_TEXT_BLOCK_CHARS", 256 * 1024))  # Text and Markdown read per block
+JOB_HISTORY_LIMIT = int(os.getenv("JOB_HISTORY_LIMIT", 200))         # Finished jobs kept for /jobs
+
+# Embedding cache
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_FILE = os.getenv("EMBEDDING_CACHE_FILE", os.path.join(DATA_DIR, "embedding_cache.db"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 500_000))   # On-disk vectors before eviction
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", 10_000))  # In-memory LRU tier
+
+# Thread pools for blocking work called from async handlers
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", 4))   # Query embedding + vector search
+DB_WORKERS = int(os.getenv("DB_WORKERS", 4))                 # Chat history reads and writes
+
+# LLM inference scheduling
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 1))                       # Model instances loaded (each holds its own context)
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", LLM_POOL_SIZE))  # Generations running at once, capped at the pool size
+# Only LLM_MAX_CONCURRENT instances are ever handed out and each holds a full context, so build no more
+LLM_POOL_SIZE = max(1, min(LLM_POOL_SIZE, LLM_MAX_CONCURRENT))
+LLM_MAX_QUEUED = int(os.getenv("LLM_MAX_QUEUED", 32))                    # Requests waiting before new ones are rejected
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 60))            # Seconds a request may wait for a model
+LLM_GENERATION_TIMEOUT = float(os.getenv("LLM_GENERATION_TIMEOUT", 120)) # Seconds a single generation may run
+LLM_DEFAULT_PRIORITY = int(os.getenv("LLM_DEFAULT_PRIORITY", 10))        # Lower value is served first
+
+# llama.cpp prompt state cache (reused KV state for the system prompt and recent chats)
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+PROMPT_CACHE_BYTES = int(os.getenv("PROMPT_CACHE_BYTES", 2 << 30))   # Memory budget shared by the LLM pool
+
+# Prompt token budget
+LLM_N_CTX = int(os.getenv("LLM_N_CTX", 4096))                 # Context window shared by prompt and answer
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 512))        # Tokens reserved for the answer
+HISTORY_BUDGET_RATIO = float(os.getenv("HISTORY_BUDGET_RATIO", 0.35))  # Share of the prompt budget for history
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", 200))          # Length cap of the rolling chat summary
+SUMMARY_PRIORITY = int(os.getenv("SUMMARY_PRIORITY", 100))              # Summaries yield the model to chat requests
+
+# SQLite tuning
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", 65536))              # Page cache per connection
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", 256 << 20))      # Memory-mapped I/O window
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", 256))  # Prepared statements kept per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+# Chat history pagination
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", 1000))                  # Largest page a client may request
+HISTORY_STREAM_BATCH_SIZE = int(os.getenv("HISTORY_STREAM_BATCH_SIZE", 500)) # Rows held in memory while streaming
+
+# Retrieval
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")   # "hybrid" (BM25 + vector, RRF) or "similarity"
+HYBRID_K = int(os.getenv("HYBRID_K", 4))                 # Chunks returned after fusion
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", 20))    # Candidates fetched from each of BM25 and vector search
+RRF_K = int(os.getenv("RRF_K", 60))                      # Reciprocal-rank fusion damping constant
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))               # Term frequency saturation
+BM25_B = float(os.getenv("BM25_B", 0.75))                # Document length normalization
+
+# Cross-encoder reranking between retrieval and prompt building
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))         # Chunks over-fetched from the retriever
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", 4))                    # Chunks kept for the prompt after scoring
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))         # Pairs scored per forward pass
+RERANK_MAX_SECONDS = float(os.getenv("RERANK_MAX_SECONDS", 0.5))    # Scoring budget per query, the rest keep retrieval order
+RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", 50_000))  # Cached (query, chunk) scores
+
+# Near-duplicate chunk suppression (cosine similarity, 0 disables)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.92))  # Retrieved chunks this close to a better one are dropped
+INGEST_DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", 0.98))      # New chunks this close to another file's chunk share its vector
+
+# Uploaded documents, removed together with their vectors when a file is deleted
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "files"))
+
+# Vector index backend: "chroma", or a local "hnswlib", "faiss" or exact "flat" index
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(DATA_DIR, "ann_index"))
+HNSW_M = int(os.getenv("HNSW_M", 16))                              # Graph links per node: recall and memory grow with it
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 200)) # Build-time search width
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))              # Query-time search width: recall versus latency
+FAISS_QUANTIZATION = os.getenv("FAISS_QUANTIZATION", "none")      # "none", "sq8" (int8) or "pq"
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", 48))                      # PQ sub-quantizers, must divide the embedding size
+FAISS_TRAIN_SIZE = int(os.getenv("FAISS_TRAIN_SIZE", 20_000))      # Vectors searched exactly until the quantizer is trained
+LOCAL_INDEX_SAVE_SECONDS = float(os.getenv("LOCAL_INDEX_SAVE_SECONDS", 30))  # Rows added since the last save are replayed on load
+
+# Batch ingestion (/files/batch and ingest.py)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))             # Texts per model forward pass
+INGEST_BULK_BATCH_SIZE = int(os.getenv("INGEST_BULK_BATCH_SIZE", 512))        # Chunks from any number of files embedded and written together
+INGEST_PARSE_PROCESSES = int(os.getenv("INGEST_PARSE_PROCESSES", max(1, (os.cpu_count() or 2) // 2)))  # Parallel file parsers
+INGEST_BULK_MAX_FILE_MB = float(os.getenv("INGEST_BULK_MAX_FILE_MB", 20))    # Larger files use the streaming single-file path
+
+# Watched folders kept in sync with the knowledge base (comma-separated paths, empty disables)
+WATCH_DIRS = [path.strip() for path in os.getenv("WATCH_DIRS", "").split(",") if path.strip()]
+WATCH_STATE_FILE = os.getenv("WATCH_STATE_FILE", os.path.join(DATA_DIR, "watch_state.db"))  # Checkpoint of synced files
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", 2))   # Quiet period after the last change before a file is synced
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", 10))          # Rescan interval when file system events are unavailable
+WATCH_USE_EVENTS = os.getenv("WATCH_USE_EVENTS", "true").lower() == "true"  # false forces polling (e.g. network mounts)
+
+# Startup: models and the vector store load on first use, or in the background right after startup
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+# Answer cache: repeated questions over the same retrieved chunks reuse the stored answer
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))      # Query embedding cosine needed for a hit
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))       # Least recently used answers evicted beyond this
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 24 * 3600))  # Answers older than this are regenerated
+
+# Chat streaming: tokens are coalesced into fewer server-sent events
+STREAM_FLUSH_SECONDS = float(os.getenv("STREAM_FLUSH_SECONDS", 0.05))  # Longest a token waits for company
+STREAM_FLUSH_BYTES = int(os.getenv("STREAM_FLUSH_BYTES", 512))         # Buffered text sent as soon as it reaches this size
+
+# Request tracing: per-stage spans of sampled chat requests, written by a background thread
+TRACE_EXPORTERS = [name.strip() for name in os.getenv("TRACE_EXPORTERS", "").split(",") if name.strip()]  # "jsonl" and/or "otlp", empty disables
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))          # Share of requests traced
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(DATA_DIR, "traces.jsonl"))
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")  # OpenTelemetry collector, OTLP/HTTP JSON
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "second-brain")
@@ -0,0 +1,485 @@
+"""
+Local vector store: an in-memory ANN index over vectors, documents and metadata kept in SQLite.
+
+Index types:
+- "hnswlib": an HNSW graph (hnswlib)
+- "faiss": a FAISS HNSW index, optionally int8 (sq8) or product quantized (pq)
+- "flat": exact search with numpy, for small collections and tests
+
+The index file is saved periodically and rows added after the last save are replayed on load,
+so the SQLite table is always the source of truth.
+"""
+
+import json
+import os
+import threading
+import time
+from itertools import islice
+from typing import Any, Iterable, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from core.db import get_connection
+from config import (
+    LOCAL_INDEX_DIR,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    FAISS_QUANTIZATION,
+    FAISS_PQ_M,
+    FAISS_TRAIN_SIZE,
+    LOCAL_INDEX_SAVE_SECONDS,
+)
+
+def matches_where(metadata: dict, where: Optional[dict]) -> bool:
+    """Evaluate the subset of Chroma's where syntax used here: $and, $or, $eq, $ne, $in, $nin"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+    return True
+
+def merge_metadata(metadata: dict, update: dict) -> dict:
+    """Apply an update the way Chroma does: keys set to None are removed"""
+    merged = dict(metadata)
+    for key, value in update.items():
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return merged
+
+
+class FlatIndex:
+    """Exact inner-product search over all vectors"""
+
+    needs_training = False
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.labels = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+
+    def add(self, labels, vectors):
+        self.labels = np.concatenate([self.labels, np.asarray(labels, dtype=np.int64)])
+        self.vectors = np.vstack([self.vectors, vectors])
+
+    def mark_deleted(self, labels):
+        keep = ~np.isin(self.labels, list(labels))
+        self.labels, self.vectors = self.labels[keep], self.vectors[keep]
+
+    def search(self, queries, k):
+        if not len(self.labels):
+            return [[] for _ in queries], [[] for _ in queries]
+        scores = queries @ self.vectors.T
+        k = min(k, len(self.labels))
+        top = np.argsort(-scores, axis=1)[:, :k]
+        return self.labels[top].tolist(), np.take_along_axis(scores, top, axis=1).tolist()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def save(self, path):
+        np.savez(path + ".npz", labels=self.labels, vectors=self.vectors)
+
+    def load(self, path):
+        if not os.path.exists(path + ".npz"):
+            return False
+        data = np.load(path + ".npz")
+        self.labels, self.vectors = data["labels"], data["vectors"]
+        return True
+
+
+class HnswlibIndex:
+    """HNSW graph from hnswlib with explicit M / ef settings, deletes are marked in place"""
+
+    needs_training = False
+
+    def __init__(self, dim: int, capacity: int = 100_000):
+        import hnswlib
+        self.dim = dim
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=capacity, M=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION, allow_replace_deleted=True)
+        self.index.set_ef(HNSW_EF_SEARCH)
+
+    def add(self, labels, vectors):
+        needed = self.index.get_current_count() + len(labels)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, labels, replace_deleted=True)
+
+    def mark_deleted(self, labels):
+        for label in labels:
+            try:
+                self.index.mark_deleted(int(label))
+            except RuntimeError:
+                pass
+
+    def search(self, queries, k):
+        k = min(k, len(self))
+        self.index.set_ef(max(HNSW_EF_SEARCH, k))
+        while k > 0:
+            try:
+                labels, distances = self.index.knn_query(queries, k=k)
+                # hnswlib's ip distance is 1 - dot
+                return labels.tolist(), (1.0 - distances).tolist()
+            except RuntimeError:
+                # Fewer than k live elements are reachable once enough are marked deleted
+                k //= 2
+        return [[] for _ in queries], [[] for _ in queries]
+
+    def __len__(self):
+        return self.index.get_current_count()
+
+    def save(self, path):
+        self.index.save_index(path + ".hnsw")
+
+    def load(self, path):
+        if not os.path.exists(path + ".hnsw"):
+            return False
+        self.index.load_index(path + ".hnsw", allow_replace_deleted=True)
+        self.index.set_ef(HNSW_EF_SEARCH)
+        return True
+
+
+class FaissIndex:
+    """FAISS HNSW index, either full precision or compressed with int8 scalar or product quantization.
+
+    Quantized variants need training: vectors are searched exactly until FAISS_TRAIN_SIZE of them
+    have arrived, then the quantizer is trained on them and the index is built. FAISS HNSW cannot
+    remove vectors, deleted rows are filtered out by the store and dropped on the next rebuild.
+    """
+
+    def __init__(self, dim: int, quantization: str = FAISS_QUANTIZATION):
+        import faiss
+        self.faiss = faiss
+        self.dim = dim
+        if quantization == "sq8":
+            inner = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        elif quantization == "pq":
+            inner = faiss.IndexHNSWPQ(dim, FAISS_PQ_M, HNSW_M, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = HNSW_EF_SEARCH
+        self.index = faiss.IndexIDMap2(inner)
+        self.needs_training = not inner.is_trained
+        self.pending = FlatIndex(dim)
+
+    def add(self, labels, vectors):
+        if not self.needs_training:
+            self.index.add_with_ids(np.ascontiguousarray(vectors), np.asarray(labels, dtype=np.int64))
+            return
+        self.pending.add(labels, vectors)
+        if len(self.pending) >= FAISS_TRAIN_SIZE:
+            self.index.train(self.pending.vectors)
+            self.index.add_with_ids(self.pending.vectors, self.pending.labels)
+            self.needs_training = False
+            self.pending = FlatIndex(self.dim)
+
+    def mark_deleted(self, labels):
+        if self.needs_training:
+            self.pending.mark_deleted(labels)
+
+    def search(self, queries, k):
+        if self.needs_training:
+            return self.pending.search(queries, k)
+        k = min(k, self.index.ntotal)
+        if k == 0:
+            return [[] for _ in queries], [[] for _ in queries]
+        self.faiss.downcast_index(self.index.index).hnsw.efSearch = max(HNSW_EF_SEARCH, k)
+        scores, labels = self.index.search(np.ascontiguousarray(queries), k)
+        hits = [[(label, score) for label, score in zip(row_labels, row_scores) if label >= 0] for row_labels, row_scores in zip(labels, scores)]
+        return [[label for label, _ in row] for row in hits], [[score for _, score in row] for row in hits]
+
+    def __len__(self):
+        return len(self.pending) if self.needs_training else self.index.ntotal
+
+    def save(self, path):
+        # An untrained index is rebuilt from the stored rows instead
+        if not self.needs_training:
+            self.faiss.write_index(self.index, path + ".faiss")
+
+    def load(self, path):
+        if not os.path.exists(path + ".faiss"):
+            return False
+        self.index = self.faiss.read_index(path + ".faiss")
+        self.needs_training = False
+        return True
+
+
+INDEX_TYPES = {
+    "flat": FlatIndex,
+    "hnswlib": HnswlibIndex,
+    "faiss": FaissIndex,
+}
+
+
+class LocalANNStore(VectorStore):
+    """Vectors in a local ANN index, documents and metadata in SQLite.
+
+    Filters are applied after the ANN search, over-fetching until enough matches are found.
+    """
+
+    def __init__(self, embedding: Embeddings, directory: str = LOCAL_INDEX_DIR, index_type: str = "hnswlib"):
+        self.embedding = embedding
+        self.directory = directory
+        self.index_type = index_type
+        self.db_path = os.path.join(directory, "vectors.db")
+        self.index_path = os.path.join(directory, f"index_{index_type}")
+        self._lock = threading.RLock()
+        self._index = None
+        self._last_save = time.monotonic()
+
+        with get_connection(self.db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS vectors (
+                    label INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    file_id TEXT,
+                    document TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_file_id ON vectors (file_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS index_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._load_index()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def _conn(self):
+        return get_connection(self.db_path)
+
+    def _state(self, key: str, default: int = 0) -> int:
+        row = self._conn().execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, key: str, value: int):
+        conn.execute("INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, value))
+
+    def _load_index(self):
+        """Load the saved index and replay rows added after it was saved"""
+        row = self._conn().execute("SELECT vector FROM vectors LIMIT 1").fetchone()
+        if row is None:
+            return
+        self._index = INDEX_TYPES[self.index_type](len(np.frombuffer(row[0], dtype=np.float32)))
+        watermark = self._state("saved_label") if self._index.load(self.index_path) else 0
+        self._replay(watermark)
+
+    def _replay(self, after_label: int, batch: int = 10_000):
+        cursor = self._conn().execute("SELECT label, vector FROM vectors WHERE label > ? ORDER BY label", (after_label,))
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                break
+            self._index.add([label for label, _ in rows], np.vstack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows]))
+
+    def _save(self, force: bool = False):
+        if not force and time.monotonic() - self._last_save < LOCAL_INDEX_SAVE_SECONDS:
+            return
+        with self._conn() as conn:
+            max_label = conn.execute("SELECT COALESCE(MAX(label), 0) FROM vectors").fetchone()[0]
+            self._index.save(self.index_path)
+            self._set_state(conn, "saved_label", max_label)
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    # ------- Writes -------
+    def add_vectors(self, ids: List[str], vectors: list, documents: List[str], metadatas: List[dict]):
+        matrix = self._normalize(vectors)
+        with self._lock:
+            with self._conn() as conn:
+                labels = []
+                for vector_id, vector, document, metadata in zip(ids, matrix, documents, metadatas):
+                    cursor = conn.execute("""
+                        INSERT INTO vectors (id, file_id, document, metadata, vector) VALUES (?, ?, ?, ?, ?)
+                    """, (vector_id, (metadata or {}).get("id"), document, json.dumps(metadata or {}), vector.tobytes()))
+                    labels.append(cursor.lastrowid)
+            if self._index is None:
+                self._index = INDEX_TYPES[self.index_type](matrix.shape[1])
+            self._index.add(labels, matrix)
+            self._save()
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = ids or [str(i) for i in range(self.count(), self.count() + len(texts))]
+        self.add_vectors(ids, self.embedding.embed_documents(texts), texts, metadatas or [{} for _ in texts])
+        return ids
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]):
+        with self._conn() as conn:
+            for vector_id, update in zip(ids, metadatas):
+                row = conn.execute("SELECT metadata FROM vectors WHERE id = ?", (vector_id,)).fetchone()
+                if row:
+                    merged = merge_metadata(json.loads(row[0]), update)
+                    conn.execute("UPDATE vectors SET metadata = ?, file_id = ? WHERE id = ?", (json.dumps(merged), merged.get("id"), vector_id))
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            with self._conn() as conn:
+                labels = []
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    marks = ",".join("?" * len(batch))
+                    labels += [row[0] for row in conn.execute(f"SELECT label FROM vectors WHERE id IN ({marks})", batch)]
+                    conn.execute(f"DELETE FROM vectors WHERE id IN ({marks})", batch)
+                self._set_state(conn, "deleted", self._state("deleted") + len(labels))
+            if self._index is not None and labels:
+                self._index.mark_deleted(labels)
+        return True
+
+    def optimize(self, dead_ratio: float = 0.2):
+        """Rebuild the index from the stored rows once deleted entries make up dead_ratio of it"""
+        with self._lock:
+            if self._index is None:
+                return
+            live = self.count()
+            if self._state("deleted") <= dead_ratio * max(live, 1):
+                self._save(force=True)
+                return
+            self._index = None
+            with self._conn() as conn:
+                self._set_state(conn, "deleted", 0)
+                self._set_state(conn, "saved_label", 0)
+            for suffix in (".npz", ".hnsw", ".faiss"):
+                if os.path.exists(self.index_path + suffix):
+                    os.remove(self.index_path + suffix)
+            self._load_index()
+            if self._index is not None:
+                self._save(force=True)
+            print(f"Rebuilt {self.index_type} index with {live} vectors")
+
+    # ------- Reads -------
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def _rows_by_labels(self, labels: List[int]) -> dict:
+        if not labels:
+            return {}
+        marks = ",".join("?" * len(labels))
+        rows = self._conn().execute(f"SELECT label, id, document, metadata FROM vectors WHERE label IN ({marks})", [int(label) for label in labels])
+        return {label: (vector_id, document, json.loads(metadata)) for label, vector_id, document, metadata in rows}
+
+    def _search(self, queries: np.ndarray, k: int, where: Optional[dict]) -> list:
+        """Per query, up to k (id, document, metadata, similarity) matching the filter"""
+        with self._lock:
+            if self._index is None or len(self._index) == 0:
+                return [[] for _ in queries]
+            total = len(self._index)
+            results = [None] * len(queries)
+            pending = list(range(len(queries)))
+            fetch = k * (4 if where else 2)
+            while pending:
+                labels, scores = self._index.search(queries[pending], fetch)
+                rows = self._rows_by_labels(list({label for row in labels for label in row}))
+                still_pending = []
+                for query_index, row_labels, row_scores in zip(pending, labels, scores):
+                    matches = [
+                        (*rows[label], float(score))
+                        for label, score in zip(row_labels, row_scores)
+                        if label in rows and matches_where(rows[label][2], where)
+                    ]
+                    if len(matches) >= k or fetch >= total:
+                        results[query_index] = matches[:k]
+                    else:
+                        still_pending.append(query_index)
+                pending = still_pending
+                fetch = min(fetch * 4, total)
+            return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None):
+        matches = self._search(self._normalize([embedding]), k, filter)[0]
+        return [(Document(id=vector_id, page_content=document, metadata=metadata), score) for vector_id, document, metadata, score in matches]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def nearest(self, vectors: list, where: Optional[dict] = None) -> list:
+        matches = self._search(self._normalize(vectors), 1, where)
+        return [(found[0][0], found[0][3]) if found else None for found in matches]
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None, include: Optional[List[str]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None) -> dict:
+        include = ["documents", "metadatas"] if include is None else include
+        sql = "SELECT id, document, metadata, vector FROM vectors"
+        params = []
+        if ids is not None:
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+            sql += f" WHERE id IN ({','.join('?' * len(ids))})"
+            params = list(ids)
+        elif where and list(where) == ["id"] and not isinstance(where["id"], dict):
+            # The per-file lookups used by ingestion and deletes go through the file_id index
+            sql += " WHERE file_id = ?"
+            params = [where["id"]]
+            where = None
+        sql += " ORDER BY label"
+        if (limit is not None or offset) and not where:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit if limit is not None else -1, offset or 0]
+
+        rows = (
+            (vector_id, document, json.loads(metadata), vector)
+            for vector_id, document, metadata, vector in self._conn().execute(sql, params)
+        )
+        if where:
+            # Metadata filters run here, so the page is taken from the matches rather than in SQL
+            rows = (row for row in rows if matches_where(row[2], where))
+            if limit is not None or offset:
+                start = offset or 0
+                rows = islice(rows, start, None if limit is None else start + limit)
+
+        result = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        for vector_id, document, metadata, vector in rows:
+            result["ids"].append(vector_id)
+            if "documents" in include:
+                result["documents"].append(document)
+            if "metadatas" in include:
+                result["metadatas"].append(metadata)
+            if "embeddings" in include:
+                result["embeddings"].append(np.frombuffer(vector, dtype=np.float32))
+        return result
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
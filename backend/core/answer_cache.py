@@ -0,0 +1,146 @@
+"""
+Cache of generated answers for repeated questions over the same retrieved chunks
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+import numpy as np
+from config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_TTL_SECONDS
+
+
+class AnswerCache:
+    """Answers keyed by the set of retrieved chunk ids and the query embedding.
+
+    A lookup only considers entries built from exactly the same chunks, and returns the most
+    similar one whose query embedding is within the cosine threshold. Chunk ids are content
+    addressed, so a changed chunk is a different key; entries are also dropped as soon as a file
+    they drew on is re-ingested with changes or deleted. Entries expire after ttl_seconds and the
+    least recently used ones are evicted beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_SIMILARITY,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        enabled: bool = ANSWER_CACHE_ENABLED,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # entry id -> (chunk key, normalized query vector, file ids, answer, created at)
+        self._entries = OrderedDict()
+        self._by_chunks = {}
+        self._by_file = {}
+        self._next_id = 0
+        # Bumped on every invalidation, an answer generated across one is not stored
+        self.version = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _remove(self, entry_id: int):
+        chunk_key, _, file_ids, _, _ = self._entries.pop(entry_id)
+        bucket = self._by_chunks[chunk_key]
+        bucket.discard(entry_id)
+        if not bucket:
+            del self._by_chunks[chunk_key]
+        for file_id in file_ids:
+            entries = self._by_file.get(file_id)
+            if entries is not None:
+                entries.discard(entry_id)
+                if not entries:
+                    del self._by_file[file_id]
+
+    def get(self, query_vector, chunk_ids: Iterable[str], now: float = None) -> Optional[str]:
+        """The stored answer for a similar query over the same chunks, or None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic() if now is None else now
+        query = self._normalize(query_vector)
+        chunk_key = frozenset(chunk_ids)
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_chunks.get(chunk_key, ())):
+                _, vector, _, _, created = self._entries[entry_id]
+                if now - created > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                score = float(np.dot(query, vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id][3]
+
+    def put(self, query_vector, chunk_ids: Iterable[str], file_ids: Iterable[str], answer: str, version: int = None, now: float = None):
+        """Store an answer generated from the given chunks, which came from the given files.
+
+        version is the cache version read before retrieval; if files changed since, the answer is dropped.
+        """
+        if not self.enabled or not answer:
+            return
+        now = time.monotonic() if now is None else now
+        chunk_key = frozenset(chunk_ids)
+        file_ids = frozenset(file_ids)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (chunk_key, self._normalize(query_vector), file_ids, answer, now)
+            self._by_chunks.setdefault(chunk_key, set()).add(entry_id)
+            for file_id in file_ids:
+                self._by_file.setdefault(file_id, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_files(self, file_ids: List[str]) -> int:
+        """Drop every answer that drew on any of the files, returns how many were dropped"""
+        with self._lock:
+            entry_ids = set()
+            for file_id in file_ids:
+                entry_ids.update(self._by_file.get(file_id, ()))
+            for entry_id in entry_ids:
+                self._remove(entry_id)
+            self.version += 1
+            self.invalidations += len(entry_ids)
+            return len(entry_ids)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._by_file.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+answer_cache = AnswerCache()
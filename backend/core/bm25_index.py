@@ -0,0 +1,191 @@
+"""
+Persistent BM25 inverted index over the chunks stored in the vector store
+"""
+
+import math
+import re
+from collections import Counter
+from fastapi import HTTPException
+from config import CHUNK_INDEX_FILE, BM25_K1, BM25_B
+from core.db import get_connection
+
+# Keeps identifiers such as ERR-4012, v2.3.1 or user_id together as one term
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+
+# Terms so common that their posting lists cost more to scan than they add to the ranking
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its of on or she that the
+their them they this to was we were what when where which who will with you your
+""".split())
+
+def init_bm25_index():
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS bm25_docs (
+                    vector_id TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    length INTEGER NOT NULL
+                );
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS bm25_postings (
+                    term TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, vector_id)
+                ) WITHOUT ROWID;
+            """)
+            # Document count and total length, kept in step with bm25_docs so a search reads them in O(1)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS bm25_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    doc_count INTEGER NOT NULL,
+                    total_length INTEGER NOT NULL
+                );
+            """)
+            # Backfills an index built before the stats row existed, a no-op afterwards
+            cursor.execute("""
+                INSERT OR IGNORE INTO bm25_stats (id, doc_count, total_length)
+                SELECT 1, COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_bm25_docs_file_id ON bm25_docs (file_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_bm25_postings_vector_id ON bm25_postings (vector_id)")
+    except Exception as e:
+        print(f"Error in init_bm25_index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def tokenize(text: str) -> list[str]:
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+def is_empty() -> bool:
+    with get_connection(CHUNK_INDEX_FILE) as conn:
+        return conn.execute("SELECT 1 FROM bm25_docs LIMIT 1").fetchone() is None
+
+def _update_stats(cursor, doc_count: int, total_length: int):
+    """Apply a change in document count and total length, inside the caller's transaction"""
+    if doc_count or total_length:
+        cursor.execute("""
+            UPDATE bm25_stats SET doc_count = doc_count + ?, total_length = total_length + ? WHERE id = 1
+        """, (doc_count, total_length))
+
+def get_stats() -> tuple[int, int]:
+    """(document count, total length) of the indexed chunks"""
+    with get_connection(CHUNK_INDEX_FILE) as conn:
+        row = conn.execute("SELECT doc_count, total_length FROM bm25_stats WHERE id = 1").fetchone()
+        return row or (0, 0)
+
+def add_chunks(file_id: str, chunks: list[tuple[str, str]]):
+    """Index (vector id, chunk text) pairs belonging to a file"""
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            added_docs = added_length = 0
+            for vector_id, content in chunks:
+                terms = Counter(tokenize(content))
+                length = sum(terms.values())
+                # A re-indexed chunk replaces its old length rather than adding a document
+                old = cursor.execute("SELECT length FROM bm25_docs WHERE vector_id = ?", (vector_id,)).fetchone()
+                added_docs += old is None
+                added_length += length - (old[0] if old else 0)
+                cursor.execute("DELETE FROM bm25_postings WHERE vector_id = ?", (vector_id,))
+                cursor.execute("""
+                    INSERT OR REPLACE INTO bm25_docs (vector_id, file_id, length) VALUES (?, ?, ?)
+                """, (vector_id, file_id, length))
+                cursor.executemany("""
+                    INSERT INTO bm25_postings (term, vector_id, tf) VALUES (?, ?, ?)
+                """, [(term, vector_id, tf) for term, tf in terms.items()])
+            _update_stats(cursor, added_docs, added_length)
+    except Exception as e:
+        print(f"Error in add_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def remove_chunks(vector_ids: list[str]):
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            params = [(vector_id,) for vector_id in dict.fromkeys(vector_ids)]
+            lengths = [row[0] for vector_id, in params
+                       for row in cursor.execute("SELECT length FROM bm25_docs WHERE vector_id = ?", (vector_id,))]
+            cursor.executemany("DELETE FROM bm25_postings WHERE vector_id = ?", params)
+            cursor.executemany("DELETE FROM bm25_docs WHERE vector_id = ?", params)
+            _update_stats(cursor, -len(lengths), -sum(lengths))
+    except Exception as e:
+        print(f"Error in remove_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def set_owner(vector_id: str, file_id: str):
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            conn.execute("UPDATE bm25_docs SET file_id = ? WHERE vector_id = ?", (file_id, vector_id))
+    except Exception as e:
+        print(f"Error in set_owner: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def delete_file_index(file_id: str):
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            doc_count, total_length = cursor.execute("""
+                SELECT COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs WHERE file_id = ?
+            """, (file_id,)).fetchone()
+            cursor.execute("""
+                DELETE FROM bm25_postings WHERE vector_id IN (SELECT vector_id FROM bm25_docs WHERE file_id = ?)
+            """, (file_id,))
+            cursor.execute("DELETE FROM bm25_docs WHERE file_id = ?", (file_id,))
+            _update_stats(cursor, -doc_count, -total_length)
+    except Exception as e:
+        print(f"Error in delete_file_index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_vector_ids() -> set:
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            return {row[0] for row in conn.execute("SELECT vector_id FROM bm25_docs")}
+    except Exception as e:
+        print(f"Error in get_vector_ids: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def search(query: str, k: int, file_ids: list[str] = None) -> list[tuple[str, float]]:
+    """Top k (vector id, BM25 score) pairs for a query, optionally limited to some files"""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    try:
+        conn = get_connection(CHUNK_INDEX_FILE)
+        doc_count, total_length = get_stats()
+        if doc_count <= 0:
+            return []
+        avg_length = total_length / doc_count or 1
+
+        term_marks = ",".join("?" * len(terms))
+        doc_freq = dict(conn.execute(f"""
+            SELECT term, COUNT(*) FROM bm25_postings WHERE term IN ({term_marks}) GROUP BY term
+        """, terms).fetchall())
+
+        query_sql = f"""
+            SELECT p.term, p.vector_id, p.tf, d.length
+            FROM bm25_postings p JOIN bm25_docs d ON d.vector_id = p.vector_id
+            WHERE p.term IN ({term_marks})
+        """
+        params = list(terms)
+        if file_ids:
+            # A file also owns the shared chunks it references through the chunk index
+            file_marks = ",".join("?" * len(file_ids))
+            query_sql += f"""
+                AND (d.file_id IN ({file_marks})
+                     OR d.vector_id IN (SELECT vector_id FROM chunk_index WHERE file_id IN ({file_marks})))
+            """
+            params += file_ids + file_ids
+
+        scores = {}
+        for term, vector_id, tf, length in conn.execute(query_sql, params):
+            df = doc_freq[term]
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            scores[vector_id] = scores.get(vector_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    except Exception as e:
+        print(f"Error in bm25 search: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
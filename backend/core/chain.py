@@ -1,9 +1,21 @@
-from langchain.schema import HumanMessage, AIMessage, BaseMessage
 from langchain.prompts import ChatPromptTemplate
-from core.knowledge_base import load_messages, save_message
-from core.llm import llm
-from langchain_core.output_parsers import StrOutputParser
+from core.knowledge_base import load_messages, save_message, get_summary, save_summary
+from core.context_builder import build_context, fit_history, format_history, remaining_history_budget
+from core.llm import inference_scheduler
+from core.executor import run_in_executor, retrieval_executor, db_executor
+from core.reranker import reranker
+from core.answer_cache import answer_cache
+from core.embeddings import embeddings
+from core.tracing import start_trace
+from core import context_builder
+from core.metrics import (
+    llm_generated_tokens, llm_prompt_tokens, llm_time_to_first_token, llm_tokens_per_second, retrieval_chunks, retrieval_duration,
+)
+from contextlib import aclosing
 from datetime import datetime
+from config import LLM_DEFAULT_PRIORITY, LLM_GENERATION_TIMEOUT, SUMMARY_MAX_TOKENS, SUMMARY_PRIORITY
+import asyncio
+import time
 
 SYSTEM_PROMPT = """
 <|system|>
@@ -17,71 +29,232 @@ Instructions:
 - Do not include any labels like "Human:", "Assistant:", or "AI:" in your response
 
 <|user|>
-Context to use for answering:
-    {retrieved_context}
 Message history:
     {history}
+Context to use for answering:
+    {retrieved_context}
 Question: 
     {user_query}
 
 <|assistant|>
 """
 
-def format_history(history: list[BaseMessage]):
-    lines = []
-    for msg in history:
-        if isinstance(msg, HumanMessage):
-            lines.append(f"User: {msg.content}")
-        elif isinstance(msg, AIMessage):
-            lines.append(f"Assistant: {msg.content}")
-    return "\n".join(lines) if lines else "None"
+# Everything before the first per-request value is identical for every prompt, and history comes
+# before retrieved context so a chat's next turn shares the longest possible prefix with its last one
+PROMPT_PREFIX = ChatPromptTemplate.from_messages(
+    [("system", SYSTEM_PROMPT.split("{history}")[0])]
+).format_prompt().to_string()
+
+SUMMARY_PROMPT = """
+<|system|>
+You maintain a running summary of a conversation between a user and an assistant.
+Merge the new messages into the existing summary. Keep names, facts, decisions and open questions.
+Reply with the updated summary only, in under 150 words.
+
+<|user|>
+Existing summary:
+    {summary}
+New messages:
+    {conversation}
+
+<|assistant|>
+"""
+
+# Keeps background summary tasks alive until they finish
+_background_tasks = set()
+
+async def update_summary(chat_id: str):
+    """Fold the oldest messages into the chat's rolling summary once history outgrows its budget.
+
+    The tail is folded down to half the history budget, so this runs once every few turns
+    rather than on every turn, and the summary text (the start of the history) stays stable between folds.
+    """
+    summary, summarized_count = await run_in_executor(db_executor, get_summary, chat_id)
+    history = await run_in_executor(db_executor, load_messages, chat_id, summarized_count)
+
+    await inference_scheduler.load()
+    budget = remaining_history_budget(SYSTEM_PROMPT, summary)
+    if fit_history(history, budget) == 0:
+        return
 
-async def chat_stream(chat_id: str, user_query: str, retriever=None):
-    history = load_messages(chat_id)
+    fold_until = fit_history(history, budget // 2)
+    if fold_until == 0:
+        return
+    prompt = SUMMARY_PROMPT.format(summary=summary or "None", conversation=format_history(history[:fold_until]))
+    async with inference_scheduler.acquire(SUMMARY_PRIORITY) as llm:
+        new_summary = await llm.ainvoke(prompt, max_tokens=SUMMARY_MAX_TOKENS)
+    await run_in_executor(db_executor, save_summary, chat_id, new_summary.strip(), summarized_count + fold_until)
+    print(f"Summarized {fold_until} older messages of chat {chat_id}")
 
-    retrieved_context = ""
+def schedule_summary_update(chat_id: str):
+    task = asyncio.create_task(update_summary(chat_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def replay_answer(chat_id: str, user_query: str, answer: str):
+    """Stream a cached answer and record the turn like a generated one"""
+    yield answer
+    await run_in_executor(db_executor, save_message, chat_id, "user", user_query)
+    await run_in_executor(db_executor, save_message, chat_id, "assistant", answer)
+    yield {
+        "response": answer,
+        "type": "final",
+    }
+
+def context_event(docs: list, cached: bool) -> dict:
+    """The files the answer draws on, sent before the first token"""
+    return {
+        "type": "context",
+        "files": list(dict.fromkeys(doc.metadata.get("name") for doc in docs if doc.metadata.get("name"))),
+        "chunks": len(docs),
+        "cached": cached,
+    }
+
+async def chat_stream(chat_id: str, user_query: str, retriever=None, priority: int = LLM_DEFAULT_PRIORITY, rerank: bool = False):
+    """Stream the answer to a chat message, traced when the request is sampled"""
+    trace = start_trace("chat", chat_id=chat_id, priority=priority, rerank=rerank, retrieval=retriever is not None)
+    stream = answer_stream(trace, chat_id, user_query, retriever, priority, rerank)
+    status = "cancelled"
+    try:
+        async for item in stream:
+            if isinstance(item, dict) and item["type"] == "error":
+                status = "error"
+            yield item
+        if status != "error":
+            status = "ok"
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        # Closing stops generation and frees the model when the client goes away
+        await stream.aclose()
+        trace.finish(status)
+
+async def answer_stream(trace, chat_id: str, user_query: str, retriever=None, priority: int = LLM_DEFAULT_PRIORITY, rerank: bool = False):
+    # Embedding the query, searching Chroma and reading SQLite are blocking, keep them off the event loop
+    with trace.span("history_load") as span:
+        summary, summarized_count = await run_in_executor(db_executor, get_summary, chat_id)
+        history = await run_in_executor(db_executor, load_messages, chat_id, summarized_count)
+        span["messages"] = len(history)
+
+    cache_version = answer_cache.version
+    docs = []
     if retriever:
-        docs = retriever.invoke(user_query)
-        if docs:
-            seen = set()
-            unique_docs = []
-            for doc in docs:
-                if doc.page_content not in seen:
-                    seen.add(doc.page_content)
-                    unique_docs.append(doc)
-            retrieved_context = "\n\n".join([doc.page_content for doc in unique_docs])
-            print(f"Retrieved {len(unique_docs)} unique documents")
-        else:
-            print("No documents found")
-            retrieved_context = "None"
-
-    context_text = retrieved_context if retrieved_context else "None"
-    history_text = format_history(history)
-    full_prompt = SYSTEM_PROMPT.format(retrieved_context=context_text, history=history_text, user_query=user_query)
-    prompt = ChatPromptTemplate.from_messages([("system", full_prompt)])
-
-    print("Prompt sent to LLM:\n", prompt.format_prompt().to_string())
-    print("=" * 50)
-
-    chain = prompt | llm | StrOutputParser()
+        with trace.span("retrieval") as span:
+            started = time.perf_counter()
+            docs = await run_in_executor(retrieval_executor, retriever.invoke, user_query)
+            retrieval_duration.observe(time.perf_counter() - started)
+            retrieval_chunks.observe(len(docs))
+            span["chunks"] = len(docs)
+
+    seen = set()
+    unique_docs = []
+    for doc in docs:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            unique_docs.append(doc)
+
+    if rerank and unique_docs:
+        # One batched cross-encoder pass; only the best chunks go on to the prompt
+        with trace.span("rerank", candidates=len(unique_docs)):
+            unique_docs = await run_in_executor(retrieval_executor, reranker.rerank, user_query, unique_docs)
+
+    # A question opening a chat depends only on its chunks, so an earlier answer over the same chunks is reused
+    cache_key = None
+    if unique_docs and not summary and not history and answer_cache.enabled:
+        with trace.span("answer_cache") as span:
+            query_vector = await run_in_executor(retrieval_executor, embeddings.embed_query, user_query)
+            chunk_ids = [doc.id or doc.page_content for doc in unique_docs]
+            file_ids = {doc.metadata.get("id") for doc in unique_docs} - {None}
+            cache_key = (query_vector, chunk_ids, file_ids)
+            cached = answer_cache.get(query_vector, chunk_ids)
+            span["hit"] = cached is not None
+        if cached is not None:
+            trace.set(cached=True)
+            yield context_event(unique_docs, cached=True)
+            async for chunk in replay_answer(chat_id, user_query, cached):
+                yield chunk
+            return
+    yield context_event(unique_docs, cached=False)
+    unique_docs = [doc.page_content for doc in unique_docs]
+
+    # Token counting uses the model's tokenizer, so a cold start loads the model off the event loop first
+    with trace.span("model_load", ready=inference_scheduler.loaded):
+        await inference_scheduler.load()
+
+    # Trim history and context to the token budget; messages that no longer fit get summarized after this turn
+    with trace.span("prompt_build") as span:
+        history_text, context_docs, dropped = build_context(SYSTEM_PROMPT, user_query, summary, history, unique_docs)
+        retrieved_context = "\n\n".join(context_docs)
+
+        context_text = retrieved_context if retrieved_context else "None"
+        full_prompt = SYSTEM_PROMPT.format(retrieved_context=context_text, history=history_text, user_query=user_query)
+        prompt = ChatPromptTemplate.from_messages([("system", full_prompt)])
+        prompt_tokens = context_builder.count_tokens(full_prompt)
+        llm_prompt_tokens.observe(prompt_tokens)
+        span.update(chunks=len(unique_docs), chunks_in_prompt=len(context_docs), messages_dropped=dropped, prompt_tokens=prompt_tokens)
 
     response = ""
     try:
-        async for chunk in chain.astream({}):
-            response += chunk
-            yield chunk
+        # Wait for a free model instance; it is released as soon as generation stops,
+        # including when the client disconnects and the stream is closed
+        queued = time.perf_counter()
+        async with inference_scheduler.acquire(priority) as llm:
+            trace.add_span("queue_wait", queued)
+            deadline = asyncio.get_running_loop().time() + LLM_GENERATION_TIMEOUT
+            with trace.span("generation") as span:
+                started = time.perf_counter()
+                first_token = None
+                chunks = 0
+                timed_out = False
+                try:
+                    # Closed before the instance goes back to the pool, whether generation finished,
+                    # timed out or failed, or the client went away and this stream was closed. The
+                    # model is streamed directly: a closed RunnableSequence stream leaves the model's
+                    # own stream to be finalized later by the event loop, after the release.
+                    async with aclosing(llm.astream(prompt.invoke({}))) as stream:
+                        while True:
+                            # The deadline bounds every wait for a token, a stalled model times out too
+                            try:
+                                async with asyncio.timeout_at(deadline):
+                                    chunk = await anext(stream)
+                            except StopAsyncIteration:
+                                break
+                            except TimeoutError:
+                                print(f"Generation timed out after {LLM_GENERATION_TIMEOUT}s")
+                                span["timed_out"] = timed_out = True
+                                break
+                            if chunks == 0:
+                                first_token = time.perf_counter()
+                                trace.add_span("first_token", started, first_token)
+                                llm_time_to_first_token.observe(first_token - started)
+                            chunks += 1
+                            response += chunk
+                            yield chunk
+                    # Only complete answers are worth replaying
+                    if cache_key and not timed_out:
+                        answer_cache.put(*cache_key, response, version=cache_version)
+                finally:
+                    # Recorded once per generation, llama.cpp streams one token per chunk
+                    span["chunks"] = chunks
+                    llm_generated_tokens.inc(chunks)
+                    if chunks > 1:
+                        llm_tokens_per_second.observe((chunks - 1) / max(time.perf_counter() - first_token, 1e-9))
 
-        save_message(chat_id, "user", user_query)
-        save_message(chat_id, "assistant", response)
+        with trace.span("persistence"):
+            await run_in_executor(db_executor, save_message, chat_id, "user", user_query)
+            await run_in_executor(db_executor, save_message, chat_id, "assistant", response)
+        # Folding old turns into the summary happens off the response path
+        schedule_summary_update(chat_id)
     except Exception as e:
         print(f"Error in chat: {e}")
+        trace.set(error=str(e))
         yield {
-            "response": "Error processing your request",
-            "type": "final_response",
+            "message": "Error processing your request",
+            "type": "error",
         }
 
     yield {
         "response": response,
-        "type": "final_response",
+        "type": "final",
     }
-            
\ No newline at end of file
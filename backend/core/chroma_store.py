@@ -0,0 +1,34 @@
+"""
+Chroma collection with the methods the ingestion pipeline needs beyond LangChain's VectorStore
+"""
+
+from typing import List, Optional
+from langchain_chroma import Chroma
+from core.near_duplicates import distance_to_similarity
+
+
+class ChromaStore(Chroma):
+    """Chroma collection with the extra methods the ingestion pipeline uses"""
+
+    def add_vectors(self, ids: List[str], vectors: list, documents: List[str], metadatas: List[dict]):
+        self._collection.add(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[dict]):
+        self._collection.update(ids=ids, metadatas=metadatas)
+
+    def nearest(self, vectors: list, where: Optional[dict] = None) -> list:
+        """(id, cosine similarity) of the closest stored vector to each query vector, or None"""
+        if not self.count():
+            return [None] * len(vectors)
+        space = (self._collection.metadata or {}).get("hnsw:space", "l2")
+        results = self._collection.query(query_embeddings=vectors, n_results=1, where=where, include=["distances"])
+        return [
+            (ids[0], distance_to_similarity(distances[0], space)) if ids else None
+            for ids, distances in zip(results["ids"], results["distances"])
+        ]
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def optimize(self):
+        """Chroma maintains its own index"""
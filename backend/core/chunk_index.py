@@ -0,0 +1,112 @@
+import hashlib
+import json
+from fastapi import HTTPException
+from config import CHUNK_INDEX_FILE
+from core.db import get_connection
+
+def init_chunk_index():
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_index (
+                    file_id TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    vector_id TEXT NOT NULL,
+                    PRIMARY KEY (file_id, chunk_hash)
+                );
+            """)
+            # Near-duplicate chunks of different files share one vector
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_index_vector_id ON chunk_index (vector_id)")
+    except Exception as e:
+        print(f"Error in init_chunk_index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def hash_chunk(content: str, splitter_params: dict) -> str:
+    """Content address of a chunk, changing the splitter settings changes every hash"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(splitter_params, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+def get_file_chunks(file_id: str) -> dict:
+    """Map of chunk hash to vector id for every chunk stored for a file"""
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT chunk_hash, vector_id FROM chunk_index WHERE file_id = ?
+            """, (file_id,))
+            return dict(cursor.fetchall())
+    except Exception as e:
+        print(f"Error in get_file_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def add_file_chunks(file_id: str, chunks: list[tuple[str, str]]):
+    """Record (chunk hash, vector id) pairs for a file"""
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO chunk_index (file_id, chunk_hash, vector_id) VALUES (?, ?, ?)
+            """, [(file_id, chunk_hash, vector_id) for chunk_hash, vector_id in chunks])
+    except Exception as e:
+        print(f"Error in add_file_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def remove_file_chunks(file_id: str, chunk_hashes: list[str]):
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                DELETE FROM chunk_index WHERE file_id = ? AND chunk_hash = ?
+            """, [(file_id, chunk_hash) for chunk_hash in chunk_hashes])
+    except Exception as e:
+        print(f"Error in remove_file_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def delete_file_chunks(file_id: str):
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM chunk_index WHERE file_id = ?", (file_id,))
+    except Exception as e:
+        print(f"Error in delete_file_chunks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_vector_files(vector_ids: list[str]) -> dict:
+    """Map of vector id to the ids of every file whose chunks point at it"""
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            cursor = conn.cursor()
+            files = {vector_id: [] for vector_id in vector_ids}
+            for start in range(0, len(vector_ids), 500):
+                batch = vector_ids[start:start + 500]
+                cursor.execute(f"""
+                    SELECT vector_id, file_id FROM chunk_index WHERE vector_id IN ({','.join('?' * len(batch))})
+                """, batch)
+                for vector_id, file_id in cursor.fetchall():
+                    files[vector_id].append(file_id)
+            return files
+    except Exception as e:
+        print(f"Error in get_vector_files: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_indexed_file_ids() -> set:
+    try:
+        with get_connection(CHUNK_INDEX_FILE) as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT file_id FROM chunk_index")}
+    except Exception as e:
+        print(f"Error in get_indexed_file_ids: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def vacuum_chunk_index():
+    """Return pages freed by deletes to the filesystem"""
+    try:
+        conn = get_connection(CHUNK_INDEX_FILE)
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    except Exception as e:
+        print(f"Error in vacuum_chunk_index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
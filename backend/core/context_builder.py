@@ -0,0 +1,82 @@
+"""
+Fit retrieved context and chat history into the model's token budget
+"""
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from config import LLM_N_CTX, LLM_MAX_TOKENS, HISTORY_BUDGET_RATIO
+from core.llm import llm_pool
+
+def count_tokens(text: str) -> int:
+    """Token count using the loaded model's own tokenizer"""
+    return llm_pool[0].get_num_tokens(text)
+
+def format_message(msg: BaseMessage) -> str:
+    if isinstance(msg, HumanMessage):
+        return f"User: {msg.content}"
+    elif isinstance(msg, AIMessage):
+        return f"Assistant: {msg.content}"
+    return ""
+
+def format_history(history: list[BaseMessage], summary: str = ""):
+    lines = [f"Summary of earlier conversation: {summary}"] if summary else []
+    lines += [line for line in (format_message(msg) for msg in history) if line]
+    return "\n".join(lines) if lines else "None"
+
+def prompt_budget(template_tokens: int, query_tokens: int) -> int:
+    """Tokens left for history and context once the answer, template and question are reserved"""
+    return max(0, LLM_N_CTX - LLM_MAX_TOKENS - template_tokens - query_tokens)
+
+def history_budget(total_budget: int) -> int:
+    return int(total_budget * HISTORY_BUDGET_RATIO)
+
+def remaining_history_budget(template: str, summary: str, count=None) -> int:
+    """History tokens available next to the summary for a prompt with an empty question"""
+    count = count or count_tokens
+    empty_prompt = template.format(retrieved_context="", history="", user_query="")
+    budget = history_budget(prompt_budget(count(empty_prompt), 0))
+    return max(0, budget - (count(summary) if summary else 0))
+
+def fit_history(history: list[BaseMessage], budget: int, count=None) -> int:
+    """Index of the oldest message such that it and every newer message fit in the budget"""
+    count = count or count_tokens
+    used = 0
+    start = len(history)
+    for i in range(len(history) - 1, -1, -1):
+        tokens = count(format_message(history[i])) + 1   # newline separator
+        if used + tokens > budget:
+            break
+        used += tokens
+        start = i
+    return start
+
+def fit_documents(docs: list[str], budget: int, count=None) -> list[str]:
+    """Keep whole documents in ranked order while they fit the budget"""
+    count = count or count_tokens
+    kept = []
+    used = 0
+    for doc in docs:
+        tokens = count(doc) + 2   # blank line separator
+        if used + tokens > budget:
+            continue
+        kept.append(doc)
+        used += tokens
+    return kept
+
+def build_context(template: str, user_query: str, summary: str, history: list[BaseMessage], docs: list[str], count=None):
+    """Choose the history tail and documents for a prompt.
+
+    History gets up to HISTORY_BUDGET_RATIO of the budget (the summary counts against it) and
+    retrieved context gets the rest, including whatever history did not use.
+    Returns (history_text, context_docs, dropped_messages) where dropped_messages is the number of
+    oldest unsummarized messages that did not fit and should be folded into the summary.
+    """
+    count = count or count_tokens
+    empty_prompt = template.format(retrieved_context="", history="", user_query="")
+    budget = prompt_budget(count(empty_prompt), count(user_query))
+
+    summary_tokens = count(summary) if summary else 0
+    start = fit_history(history, max(0, history_budget(budget) - summary_tokens), count)
+    history_text = format_history(history[start:], summary)
+
+    context_docs = fit_documents(docs, budget - count(history_text), count)
+    return history_text, context_docs, start
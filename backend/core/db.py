@@ -0,0 +1,99 @@
+"""
+Shared SQLite access: one tuned connection per thread and database file
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from config import SQLITE_CACHE_KB, SQLITE_MMAP_BYTES, SQLITE_STATEMENT_CACHE, SQLITE_BUSY_TIMEOUT_MS
+from core.metrics import sqlite_query_duration
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",           # Readers no longer block the writer and vice versa
+    "PRAGMA synchronous=NORMAL",         # Safe with WAL, skips an fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA cache_size=-{SQLITE_CACHE_KB}",
+    f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+)
+
+_local = threading.local()
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement times on its connection's histogram"""
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            self.connection.query_duration.observe(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            self.connection.query_duration.observe(time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection that records how long each statement takes to execute, through it or its cursors"""
+
+    def __init__(self, path, *args, **kwargs):
+        super().__init__(path, *args, **kwargs)
+        self.query_duration = sqlite_query_duration.labels(os.path.basename(path))
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            self.query_duration.observe(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            self.query_duration.observe(time.perf_counter() - start)
+
+def get_connection(path: str) -> sqlite3.Connection:
+    """Connection for the calling thread, opened and tuned on first use.
+
+    Connections live as long as their thread (the executor and worker pools are long-lived),
+    so sqlite3's per-connection statement cache keeps every query prepared after its first run.
+    Use it as a context manager to wrap statements in a transaction.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, cached_statements=SQLITE_STATEMENT_CACHE, factory=TimedConnection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[path] = conn
+    return conn
+
+def open_stream_connection(path: str) -> sqlite3.Connection:
+    """Private connection for a long-running read that may be resumed from different threads"""
+    conn = sqlite3.connect(path, check_same_thread=False, factory=TimedConnection)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def migrate(conn: sqlite3.Connection, migrations: list):
+    """Apply the migrations newer than the database's user_version, each in its own transaction"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(migrations[version:], start=version + 1):
+        with conn:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        print(f"Applied migration {number} to {conn.execute('PRAGMA database_list').fetchone()[2]}")
@@ -2,6 +2,10 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.document_loaders import TextLoader
 from langchain_community.document_loaders import CSVLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from core.markdown_splitter import MarkdownSectionSplitter
+from config import INGEST_TEXT_BLOCK_CHARS
+import os
 
 def load_pdf(path):
     pdf_loader = PyPDFLoader(path)
@@ -18,11 +22,160 @@ def load_csv(path):
     docs = csv_loader.load()
     return docs
 
-def split_docs(docs, chunk_size=1600, chunk_overlap=300):
-    text_splitter = text_splitter = RecursiveCharacterTextSplitter(
+class TextBlockLoader:
+    """Reads a text file a block of characters at a time instead of all at once.
+
+    Every block is a Document with the same metadata as TextLoader's; blocks end wherever the
+    read stops, iter_split_docs joins them back up at chunk boundaries.
+    """
+
+    def __init__(self, file_path, encoding=None, block_chars=INGEST_TEXT_BLOCK_CHARS):
+        self.file_path = file_path
+        self.encoding = encoding
+        self.block_chars = block_chars
+
+    def lazy_load(self):
+        try:
+            with open(self.file_path, encoding=self.encoding) as f:
+                while True:
+                    block = f.read(self.block_chars)
+                    if not block:
+                        return
+                    yield Document(page_content=block, metadata={"source": str(self.file_path)})
+        except UnicodeDecodeError as e:
+            raise RuntimeError(f"Error loading {self.file_path}") from e
+
+    def load(self):
+        return list(self.lazy_load())
+
+# Lazy loaders yield one page (PDF), row (CSV) or block of text at a time instead of the whole document
+LAZY_LOADERS = {
+    ".pdf": PyPDFLoader,
+    ".txt": TextBlockLoader,
+    ".csv": CSVLoader,
+    ".md": TextBlockLoader,      # Raw Markdown, split along its structure by MarkdownSectionSplitter
+    ".markdown": TextBlockLoader,
+}
+
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+
+def is_markdown(path):
+    return os.path.splitext(path)[1].lower() in MARKDOWN_EXTENSIONS
+
+def iter_documents(path):
+    """Lazily load a supported file page by page, or return None for unsupported types"""
+    loader = LAZY_LOADERS.get(os.path.splitext(path)[1].lower())
+    if loader is None:
+        return None
+    return loader(path).lazy_load()
+
+SEPARATORS = ["\n\n", "\n", ". ", "!", "?", " ", ""]
+
+def make_splitter(chunk_size=1600, chunk_overlap=300, markdown=False):
+    if markdown:
+        return MarkdownSectionSplitter(chunk_size, chunk_overlap, separators=SEPARATORS)
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,          # max characters per chunk
         chunk_overlap=chunk_overlap,    # character overlap between chunks
-        separators=["\n\n", "\n", ". ", "!", "?", " ", ""]
+        separators=SEPARATORS
     )
+
+def split_docs(docs, chunk_size=1600, chunk_overlap=300, markdown=False):
+    text_splitter = make_splitter(chunk_size, chunk_overlap, markdown)
     return text_splitter.split_documents(docs)
 
+class BlockSplitter:
+    """Splits one text that arrives in blocks, holding back only what follows the last safe cut.
+
+    A block is not split until the next one arrives, so a text that fits in one block is split
+    exactly as a whole. Otherwise chunks up to the last safe cut are released: the start of the
+    last chunk for plain text, the last section boundary for Markdown. The rest is carried over
+    in front of the next block.
+    """
+
+    def __init__(self, text_splitter):
+        self.text_splitter = text_splitter
+        self.markdown = isinstance(text_splitter, MarkdownSectionSplitter)
+        self.pending = ""
+        self.headings = ()
+
+    def feed(self, text: str):
+        """Add the next block, returning (chunk text, heading path) pairs that are now final"""
+        sections = []
+        if self.pending:
+            if self.markdown:
+                sections, self.pending, self.headings = self.text_splitter.split_head(self.pending, self.headings)
+            else:
+                chunks = self.text_splitter.split_text(self.pending)
+                start = self.pending.rfind(chunks[-1]) if len(chunks) > 1 else -1
+                if start > 0:
+                    sections = [(chunk, ()) for chunk in chunks[:-1]]
+                    self.pending = self.pending[start:]
+        self.pending += text
+        return sections
+
+    def finish(self):
+        """Split whatever is held back, at the end of the text"""
+        text, headings = self.pending, self.headings
+        self.pending, self.headings = "", ()
+        if self.markdown:
+            return self.text_splitter.split_sections(text, headings)
+        return [(chunk, ()) for chunk in self.text_splitter.split_text(text)]
+
+def iter_split_docs(docs, chunk_size=1600, chunk_overlap=300, markdown=False):
+    """Split documents as they arrive, so only one page's chunks are held at a time.
+
+    Consecutive documents with the same metadata are one text read in blocks (TextBlockLoader)
+    and are split as one, without ever holding the whole text.
+    """
+    splitter = BlockSplitter(make_splitter(chunk_size, chunk_overlap, markdown))
+    metadata = None
+
+    def documents(sections):
+        for content, path in sections:
+            chunk_metadata = dict(metadata)
+            if path:
+                chunk_metadata["headings"] = " > ".join(path)
+            yield Document(page_content=content, metadata=chunk_metadata)
+
+    for doc in docs:
+        if metadata is not None and doc.metadata != metadata:
+            yield from documents(splitter.finish())
+        metadata = doc.metadata
+        yield from documents(splitter.feed(doc.page_content))
+    if metadata is not None:
+        yield from documents(splitter.finish())
+
+def batched(items, size):
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def parse_file(path, chunk_size, chunk_overlap, splitter_params):
+    """Load, split and hash a whole file, returning (pages, [(chunk hash, content, metadata)]).
+
+    Runs in worker processes during batch ingestion, so it only returns plain picklable data
+    and leaves embedding and storage to the parent.
+    """
+    from core.chunk_index import hash_chunk
+    docs = iter_documents(path)
+    if docs is None:
+        raise ValueError(f"Unsupported file type: {os.path.splitext(path)[1].lower()}")
+    pages = 0
+    def count_pages(docs):
+        nonlocal pages
+        for doc in docs:
+            pages += 1
+            yield doc
+    chunks = [
+        (hash_chunk(doc.page_content, splitter_params), doc.page_content, doc.metadata)
+        for doc in iter_split_docs(count_pages(docs), chunk_size, chunk_overlap, is_markdown(path))
+    ]
+    return pages, chunks
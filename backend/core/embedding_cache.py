@@ -0,0 +1,187 @@
+"""
+Persistent two-tier cache in front of an embeddings model
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from core.db import get_connection, migrate
+from core.metrics import embedding_cache_evictions, embedding_cache_lookups
+from config import EMBEDDING_CACHE_FILE, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MEMORY_ENTRIES
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_BATCH = 500
+
+# Schema history, applied in order when a cache is opened. Never edit an entry once shipped, append a new one.
+MIGRATIONS = [
+    # 1: initial schema
+    [
+        """
+        CREATE TABLE IF NOT EXISTS embeddings (
+            key BLOB PRIMARY KEY,
+            vector BLOB NOT NULL,
+            last_used REAL NOT NULL
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)",
+    ],
+]
+
+SELECT_VECTORS = "SELECT key, vector FROM embeddings WHERE key IN ({})"
+TOUCH_VECTOR = "UPDATE embeddings SET last_used = ? WHERE key = ?"
+INSERT_VECTOR = "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)"
+EVICT_VECTORS = "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)"
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that reuses vectors keyed by model name and a digest of the text.
+
+    Hot vectors live in an in-memory LRU, everything else in a SQLite table of float32 blobs
+    that is trimmed back to max_entries by least recent use. Each thread reads through its own
+    shared connection, so disk lookups run concurrently; only writes are serialized.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        path: str = EMBEDDING_CACHE_FILE,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()         # In-memory tier and counters
+        self._write_lock = threading.Lock()   # Disk writes and eviction
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        conn = self._conn()
+        migrate(conn, MIGRATIONS)
+        self._disk_entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _conn(self):
+        return get_connection(self.path)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _remember(self, key: bytes, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[bytes]) -> dict:
+        """Resolve keys from memory first, then disk, promoting disk hits into memory"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+        if found:
+            embedding_cache_lookups.labels("memory").inc(len(found))
+        if not missing:
+            return found
+
+        conn = self._conn()
+        rows = []
+        for start in range(0, len(missing), LOOKUP_BATCH):
+            batch = missing[start:start + LOOKUP_BATCH]
+            rows += conn.execute(SELECT_VECTORS.format(",".join("?" * len(batch))), batch).fetchall()
+        if not rows:
+            return found
+
+        disk_found = {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in rows}
+        found.update(disk_found)
+        with self._lock:
+            for key, vector in disk_found.items():
+                self._remember(key, vector)
+            self.disk_hits += len(disk_found)
+        embedding_cache_lookups.labels("disk").inc(len(disk_found))
+        now = time.time()
+        with self._write_lock, conn:
+            conn.executemany(TOUCH_VECTOR, [(now, key) for key in disk_found])
+        return found
+
+    def _store(self, items: dict):
+        now = time.time()
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        conn = self._conn()
+        with self._write_lock, conn:
+            cursor = conn.executemany(
+                INSERT_VECTOR,
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()],
+            )
+            self._disk_entries += max(cursor.rowcount, 0)
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """Drop the least recently used tenth of the table once it is over budget"""
+        if self._disk_entries <= self.max_entries:
+            return
+        target = int(self.max_entries * 0.9)
+        excess = self._disk_entries - target
+        conn.execute(EVICT_VECTORS, (excess,))
+        self._disk_entries = target
+        with self._lock:
+            self.evictions += excess
+        embedding_cache_evictions.inc(excess)
+
+    def _embed(self, texts: List[str], embed_missing) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+
+        # Embed each distinct missing text once, however often it repeats in the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            embedding_cache_lookups.labels("miss").inc(len(missing))
+            vectors = embed_missing(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "model": self.model_name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+                "evictions": self.evictions,
+            }
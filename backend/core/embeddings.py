@@ -1,14 +1,70 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-import torch
-
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={
-        "device": "cuda" if torch.cuda.is_available() else "cpu",
-        "trust_remote_code": True
-    },
-    encode_kwargs={
-        "batch_size": 32,
-        "normalize_embeddings": True
-    }
-)
\ No newline at end of file
+from config import EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, EMBEDDING_BATCH_SIZE, EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZE
+from core.embedding_cache import CachedEmbeddings
+from core.lazy import LazyComponent
+from core.metrics import embedding_batch_size, embedding_texts_per_second
+from langchain_core.embeddings import Embeddings
+import time
+
+class InstrumentedEmbeddings(Embeddings):
+    """Records batch sizes and throughput of the calls that reach the model"""
+
+    def __init__(self, underlying: Embeddings):
+        self.underlying = underlying
+
+    def embed_documents(self, texts):
+        start = time.perf_counter()
+        vectors = self.underlying.embed_documents(texts)
+        if texts:
+            embedding_batch_size.observe(len(texts))
+            embedding_texts_per_second.observe(len(texts) / max(time.perf_counter() - start, 1e-9))
+        return vectors
+
+    def embed_query(self, text):
+        start = time.perf_counter()
+        vector = self.underlying.embed_query(text)
+        embedding_batch_size.observe(1)
+        embedding_texts_per_second.observe(1 / max(time.perf_counter() - start, 1e-9))
+        return vector
+
+def create_model_embeddings():
+    # torch and sentence-transformers are imported here so importing this module stays cheap
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={
+            "device": "cuda" if torch.cuda.is_available() else "cpu",
+            "trust_remote_code": True
+        },
+        encode_kwargs={
+            "batch_size": EMBEDDING_BATCH_SIZE,
+            "normalize_embeddings": True
+        }
+    )
+
+def create_onnx_embeddings(quantize: bool = EMBEDDING_ONNX_QUANTIZE):
+    from core.onnx_embeddings import OnnxEmbeddings
+    onnx_embeddings = OnnxEmbeddings(EMBEDDING_MODEL, quantize=quantize)
+    onnx_embeddings.load()
+    return onnx_embeddings
+
+def create_embeddings(backend: str = EMBEDDING_BACKEND):
+    if backend == "torch":
+        model_embeddings = create_model_embeddings()
+        namespace = EMBEDDING_MODEL
+    elif backend == "onnx":
+        model_embeddings = create_onnx_embeddings()
+        # Runtimes agree to within rounding, not bit for bit, so each keeps its own cached vectors
+        namespace = f"{EMBEDDING_MODEL}:onnx-int8" if EMBEDDING_ONNX_QUANTIZE else f"{EMBEDDING_MODEL}:onnx"
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    # Only cache misses reach the model, so the metrics describe real model work
+    model_embeddings = InstrumentedEmbeddings(model_embeddings)
+    # Vectors are normalized, so the cache namespace records that alongside the model
+    if EMBEDDING_CACHE_ENABLED:
+        return CachedEmbeddings(model_embeddings, model_name=f"{namespace}:normalized")
+    return model_embeddings
+
+# The model loads on the first embed call (or during startup warm up)
+embeddings = LazyComponent("embeddings", create_embeddings)
@@ -0,0 +1,17 @@
+"""
+Bounded thread pools for blocking work awaited from async handlers
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import RETRIEVAL_WORKERS, DB_WORKERS
+
+# Separate pools so slow vector searches cannot starve history reads and writes
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+async def run_in_executor(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    """Run a blocking call on the given pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
@@ -0,0 +1,47 @@
+"""
+Hybrid retrieval: BM25 and vector search fused with reciprocal-rank fusion
+"""
+
+from typing import Any, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from core import bm25_index
+
+def reciprocal_rank_fusion(rankings: list[list[str]], rrf_k: int = 60) -> list[str]:
+    """Merge ranked id lists, each id scoring sum(1 / (rrf_k + rank)) over the lists it appears in"""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
+
+class HybridRetriever(BaseRetriever):
+    """Over-fetches fetch_k candidates from both the vector store and the BM25 index and keeps
+    the k best after fusion, so exact terms (codes, names, ids) and paraphrases both rank well
+    without inflating the prompt with a large k"""
+
+    vector_store: Any
+    file_ids: Optional[list[str]] = None
+    where: Optional[dict] = None
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        vector_docs = self.vector_store.similarity_search(query, k=self.fetch_k, filter=self.where)
+        keyword_hits = bm25_index.search(query, self.fetch_k, self.file_ids)
+
+        docs_by_id = {doc.id or doc.page_content: doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion(
+            [list(docs_by_id), [vector_id for vector_id, _ in keyword_hits]],
+            self.rrf_k,
+        )[:self.k]
+
+        # Chunks only found by keyword still need their text and metadata
+        missing = [key for key in fused if key not in docs_by_id]
+        if missing:
+            stored = self.vector_store.get(ids=missing, include=["documents", "metadatas"])
+            for vector_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                docs_by_id[vector_id] = Document(id=vector_id, page_content=content, metadata=metadata or {})
+        return [docs_by_id[key] for key in fused if key in docs_by_id]
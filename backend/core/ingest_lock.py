@@ -0,0 +1,85 @@
+"""
+Coordination between ingestion, deletes and compaction of the knowledge base
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class IngestGate:
+    """Lets any number of ingests and deletes run together, and compaction run alone.
+
+    Compaction decides what is garbage from a snapshot of the files and chunk index, so a sync
+    writing vectors at the same time would have them collected half way. A waiting compaction
+    holds back new ingests, so a steady stream of uploads cannot starve it.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = 0
+        self._exclusive = False
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive)
+            self._exclusive = True
+            self._condition.wait_for(lambda: self._active == 0)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+class FileLocks:
+    """One lock per file name, so each file is synced or deleted by one caller at a time.
+
+    Several names are always taken together and in sorted order, and nobody holding them asks
+    for more, so callers cannot deadlock. A lock exists only while someone holds or waits for it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}   # name -> [lock, holders and waiters]
+
+    @contextmanager
+    def hold(self, *names):
+        names = sorted(set(names))
+        with self._lock:
+            entries = []
+            for name in names:
+                entry = self._locks.setdefault(name, [threading.Lock(), 0])
+                entry[1] += 1
+                entries.append(entry)
+        acquired = []
+        try:
+            for entry in entries:
+                entry[0].acquire()
+                acquired.append(entry)
+            yield
+        finally:
+            for entry in reversed(acquired):
+                entry[0].release()
+            with self._lock:
+                for name, entry in zip(names, entries):
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._locks[name]
+
+
+ingest_gate = IngestGate()
+file_locks = FileLocks()
@@ -0,0 +1,190 @@
+"""
+Background ingestion jobs backed by a bounded worker pool
+"""
+
+import itertools
+import queue
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from fastapi import HTTPException
+from config import INGEST_MAX_WORKERS, INGEST_MAX_QUEUED, INGEST_DEFAULT_PRIORITY, JOB_HISTORY_LIMIT
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job it is running has been cancelled"""
+
+
+class Job:
+    def __init__(self, file_path: str, priority: int, file_paths: list = None):
+        self.id = str(uuid.uuid4())
+        self.file_path = file_path
+        self.file_paths = file_paths   # Set for batch jobs, which sync all these files together
+        self.priority = priority
+        self.status = QUEUED
+        self.progress = {
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+        }
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def update(self, **progress):
+        """Record progress counters reported by the ingestion pipeline"""
+        self.progress.update(progress)
+
+    def check_cancelled(self):
+        """Abort the running pipeline if a cancel was requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "file_path": self.file_path,
+            "file_count": len(self.file_paths) if self.file_paths is not None else 1,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Priority queue of ingestion jobs drained by a fixed number of worker threads"""
+
+    def __init__(self, max_workers: int = INGEST_MAX_WORKERS, max_queued: int = INGEST_MAX_QUEUED,
+                 ingest_file=None, ingest_files=None):
+        self.max_workers = max(1, max_workers)
+        self.max_queued = max_queued
+        self.ingest_file = ingest_file
+        self.ingest_files = ingest_files
+        # Unbounded so cancelled entries left behind never block a submit; capacity is counted in _queued
+        self._queue = queue.PriorityQueue()
+        self._queued = 0
+        self._counter = itertools.count()   # FIFO tie-break between equal priorities
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, file_path: str, priority: int = INGEST_DEFAULT_PRIORITY, file_paths: list = None) -> Job:
+        """Queue a file (or with file_paths, a batch of files) for ingestion, lower priority values run first"""
+        self._ensure_workers()
+        job = Job(file_path, priority, file_paths)
+        with self._lock:
+            if self.max_queued > 0 and self._queued >= self.max_queued:
+                raise HTTPException(status_code=503, detail="Ingestion queue is full, try again later")
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._prune()
+            self._queue.put_nowait((priority, next(self._counter), job))
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation, queued jobs are dropped and running jobs stop at the next batch"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job._cancel_event.set()
+            if job.status == QUEUED:
+                # The entry stays in the queue until a worker skips it, but no longer counts as queued
+                self._queued -= 1
+                self._set_finished(job, CANCELLED)
+        return True
+
+    def _set_finished(self, job: Job, status: str, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = datetime.now().isoformat()
+
+    def _finish(self, job: Job, status: str, result=None, error=None):
+        with self._lock:
+            self._set_finished(job, status, result, error)
+
+    def _start(self, job: Job) -> bool:
+        """Move a dequeued job to running, unless it was cancelled while queued"""
+        with self._lock:
+            if job.status != QUEUED:
+                return False
+            self._queued -= 1
+            job.status = RUNNING
+            job.started_at = datetime.now().isoformat()
+            return True
+
+    def _prune(self):
+        """Forget the oldest finished jobs once the history limit is reached"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                if not self._start(job):
+                    continue
+                if self.ingest_file is None or self.ingest_files is None:
+                    # Imported here so that importing this module does not load the embedding model
+                    from core.vector_store import ingest_file_to_knowledge_base, ingest_files_to_knowledge_base
+                    self.ingest_file = self.ingest_file or ingest_file_to_knowledge_base
+                    self.ingest_files = self.ingest_files or ingest_files_to_knowledge_base
+
+                if job.file_paths is not None:
+                    result = self.ingest_files(job.file_paths, job=job)
+                else:
+                    result = self.ingest_file(job.file_path, job=job)
+                if result:
+                    self._finish(job, COMPLETED, result=result)
+                else:
+                    self._finish(job, FAILED, error="No documents were added to the knowledge base")
+            except JobCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                print(f"Error in ingestion job {job.id}: {e}")
+                self._finish(job, FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+
+
+job_manager = JobManager()
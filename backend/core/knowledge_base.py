@@ -1,53 +1,136 @@
-import sqlite3
 from datetime import datetime
-import os
+import base64
+import json
 import uuid
 from langchain_core.messages import HumanMessage, AIMessage
-from config import CHAT_HISTORY_DB_FILE
+from config import CHAT_HISTORY_DB_FILE, HISTORY_STREAM_BATCH_SIZE
+from core.db import get_connection, open_stream_connection, migrate
 from fastapi import HTTPException
 
+# Every timestamp is written in local time in this one format, always with microseconds, so that
+# text order is time order. sqlite3's datetime adapter drops the microseconds when they are zero.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def now() -> str:
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+def normalize_timestamps(table: str, column: str, utc_default: bool) -> list:
+    """Statements rewriting a column written in an older format into TIMESTAMP_FORMAT"""
+    statements = []
+    if utc_default:
+        # Seconds only and no "T": a CURRENT_TIMESTAMP default, which is UTC
+        statements.append(
+            f"UPDATE {table} SET {column} = datetime({column}, 'localtime') WHERE length({column}) = 19 AND instr({column}, 'T') = 0"
+        )
+    statements += [
+        f"UPDATE {table} SET {column} = replace({column}, 'T', ' ') WHERE instr({column}, 'T') > 0",
+        f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19",
+    ]
+    return statements
+
+# Schema history, applied in order by init_db. Never edit an entry once shipped, append a new one.
+MIGRATIONS = [
+    # 1: initial schema
+    [
+        """
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id TEXT PRIMARY KEY,
+            chat_id TEXT NOT NULL,
+            role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chats (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            chat_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            summarized_count INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            id TEXT PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            path TEXT NOT NULL
+        );
+        """,
+    ],
+    # 2: indexes for per-chat history reads and the chat list
+    [
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_timestamp ON chat_messages (chat_id, timestamp, id)",
+        "CREATE INDEX IF NOT EXISTS idx_chats_updated_at ON chats (updated_at, id)",
+    ],
+    # 3: tombstone for files whose vectors and stored copy are still being removed
+    [
+        "ALTER TABLE files ADD COLUMN deleted_at TIMESTAMP",
+    ],
+    # 4: one timestamp format everywhere (see TIMESTAMP_FORMAT), keyset pagination compares them as text.
+    # Chats from older versions kept their CURRENT_TIMESTAMP defaults, which are UTC; the rest is local time
+    [
+        *normalize_timestamps("chats", "created_at", utc_default=True),
+        *normalize_timestamps("chats", "updated_at", utc_default=True),
+        *normalize_timestamps("chat_messages", "timestamp", utc_default=False),
+        *normalize_timestamps("chat_summaries", "updated_at", utc_default=False),
+        *normalize_timestamps("files", "deleted_at", utc_default=False),
+    ],
+]
+
+# Queries are module constants so every call hits the connection's prepared statement cache
+INSERT_FILE = "INSERT INTO files (id, name, path) VALUES (?, ?, ?)"
+DELETE_FILE = "DELETE FROM files WHERE name = ?"
+SELECT_FILES = "SELECT id, name, path FROM files WHERE deleted_at IS NULL"
+SELECT_FILE_ID = "SELECT id FROM files WHERE name = ? AND deleted_at IS NULL"
+SELECT_FILE_NAME = "SELECT name FROM files WHERE id = ?"
+SELECT_FILE_RECORD = "SELECT id, path FROM files WHERE name = ? AND deleted_at IS NULL"
+MARK_FILE_DELETED = "UPDATE files SET deleted_at = ? WHERE id = ?"
+SELECT_DELETED_FILES = "SELECT id, name, path FROM files WHERE deleted_at IS NOT NULL"
+SELECT_DELETED_FILE = "SELECT id, name, path FROM files WHERE deleted_at IS NOT NULL AND name = ?"
+PURGE_FILE = "DELETE FROM files WHERE id = ?"
+INSERT_MESSAGE = "INSERT INTO chat_messages (id, chat_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)"
+TOUCH_CHAT = "UPDATE chats SET updated_at = ? WHERE id = ?"
+SELECT_MESSAGES = """
+    SELECT id, chat_id, role, content, timestamp FROM chat_messages
+    WHERE chat_id = ? ORDER BY timestamp ASC, id ASC LIMIT -1 OFFSET ?
+"""
+DELETE_MESSAGES = "DELETE FROM chat_messages WHERE chat_id = ?"
+SELECT_SUMMARY = "SELECT summary, summarized_count FROM chat_summaries WHERE chat_id = ?"
+UPSERT_SUMMARY = """
+    INSERT INTO chat_summaries (chat_id, summary, summarized_count, updated_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        summary = excluded.summary,
+        summarized_count = excluded.summarized_count,
+        updated_at = excluded.updated_at
+"""
+DELETE_SUMMARY = "DELETE FROM chat_summaries WHERE chat_id = ?"
+INSERT_CHAT = "INSERT INTO chats (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)"
+UPDATE_CHAT_TITLE = "UPDATE chats SET title = ?, updated_at = ? WHERE id = ?"
+DELETE_CHAT = "DELETE FROM chats WHERE id = ?"
+
+def connect():
+    return get_connection(CHAT_HISTORY_DB_FILE)
+
 def init_db():
-    os.makedirs(os.path.dirname(CHAT_HISTORY_DB_FILE), exist_ok=True)
-    try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chat_messages (
-                    id TEXT PRIMARY KEY,
-                    chat_id TEXT NOT NULL,
-                    role TEXT NOT NULL CHECK (role IN ('user', 'assistant')),
-                    content TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS files (
-                    id TEXT PRIMARY KEY,
-                    name TEXT UNIQUE NOT NULL,
-                    path TEXT NOT NULL
-                );
-            """)
-            conn.commit()
+    """Create the database if needed and bring its schema up to date"""
+    try:
+        migrate(connect(), MIGRATIONS)
     except Exception as e:
         print(f"Error in init_db: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 def save_file(id: str, name: str, path: str):
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO files (id, name, path) VALUES (?, ?, ?)
-            """, (id, name, path))
-            conn.commit()
+        with connect() as conn:
+            conn.execute(INSERT_FILE, (id, name, path))
     except Exception as e:
         print(f"Error in save_file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -55,78 +138,239 @@ def save_file(id: str, name: str, path: str):
 def delete_file(file_name: str):
     """Delete a file from the database"""
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM files WHERE name = ?", (file_name,))
-            conn.commit()
+        with connect() as conn:
+            conn.execute(DELETE_FILE, (file_name,))
     except Exception as e:
         print(f"Error in delete_file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def mark_file_deleted(file_name: str):
+    """Hide a file from the knowledge base until its data is purged, returning (id, path) or None"""
+    try:
+        with connect() as conn:
+            record = conn.execute(SELECT_FILE_RECORD, (file_name,)).fetchone()
+            if record:
+                conn.execute(MARK_FILE_DELETED, (now(), record[0]))
+            return record
+    except Exception as e:
+        print(f"Error in mark_file_deleted: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_deleted_files(file_name: str = None):
+    """Files marked deleted whose purge has not finished, optionally only those with a given name"""
+    try:
+        if file_name is None:
+            return connect().execute(SELECT_DELETED_FILES).fetchall()
+        return connect().execute(SELECT_DELETED_FILE, (file_name,)).fetchall()
+    except Exception as e:
+        print(f"Error in get_deleted_files: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def purge_file(file_id: str):
+    """Remove a file's row once everything stored for it is gone"""
+    try:
+        with connect() as conn:
+            conn.execute(PURGE_FILE, (file_id,))
+    except Exception as e:
+        print(f"Error in purge_file: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 def get_files():
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM files
-            """)
-            return cursor.fetchall()
+        return connect().execute(SELECT_FILES).fetchall()
     except Exception as e:
         print(f"Error in get_files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 def get_file(file_name: str):
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM files WHERE name = ?
-            """, (file_name,))
-            file = cursor.fetchone()
-            return file[0] if file else None
+        file = connect().execute(SELECT_FILE_ID, (file_name,)).fetchone()
+        return file[0] if file else None
     except Exception as e:
         print(f"Error in get_file: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def get_file_name(file_id: str):
+    try:
+        file = connect().execute(SELECT_FILE_NAME, (file_id,)).fetchone()
+        return file[0] if file else None
+    except Exception as e:
+        print(f"Error in get_file_name: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 def save_message(chat_id: str, role: str, content: str):
     id = str(uuid.uuid4())
-    timestamp = datetime.now()
+    timestamp = now()
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO chat_messages (id, chat_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)
-            """, (id, chat_id, role, content, timestamp))
-            conn.commit()
+        with connect() as conn:
+            conn.execute(INSERT_MESSAGE, (id, chat_id, role, content, timestamp))
+            conn.execute(TOUCH_CHAT, (timestamp, chat_id))
     except Exception as e:
         print(f"Error in save_message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-def load_messages(chat_id: str):
+def load_messages(chat_id: str, offset: int = 0):
+    """Load a chat's messages in order, skipping the first `offset` (already summarized) ones"""
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM chat_messages WHERE chat_id = ? ORDER BY timestamp ASC
-            """, (chat_id,))
-            rows = cursor.fetchall()
-            messages = []
-            for row in rows:
-                if row[2] == "user":
-                    messages.append(HumanMessage(content=row[3]))
-                else:
-                    messages.append(AIMessage(content=row[3]))
-            return messages
+        rows = connect().execute(SELECT_MESSAGES, (chat_id, offset)).fetchall()
+        messages = []
+        for row in rows:
+            if row[2] == "user":
+                messages.append(HumanMessage(content=row[3]))
+            else:
+                messages.append(AIMessage(content=row[3]))
+        return messages
     except Exception as e:
         print(f"Error in load_messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def encode_cursor(timestamp: str, id: str) -> str:
+    """Opaque keyset cursor pointing at a row's (timestamp, id)"""
+    return base64.urlsafe_b64encode(json.dumps([timestamp, id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        timestamp, id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return [timestamp, id]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _keyset_query(select: str, key: str, conditions: list, params: list, limit, before, after, descending: bool):
+    """Build a keyset-paginated query over rows ordered by (key, id).
+
+    `before` and `after` are cursors: only rows with an earlier / later (key, id) are returned,
+    so paging never re-reads skipped rows the way OFFSET does. With a limit, the page is the one
+    adjacent to the cursor, or the newest rows when there is no cursor or only a `before` one.
+    Returns the SQL, its parameters and whether the rows come back reversed from listing order.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    if before:
+        conditions.append(f"({key}, id) < (?, ?)")
+        params += decode_cursor(before)
+    if after:
+        conditions.append(f"({key}, id) > (?, ?)")
+        params += decode_cursor(after)
+    if limit is None:
+        read_descending = descending
+    else:
+        read_descending = not (after and not before)
+    order = "DESC" if read_descending else "ASC"
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"{select} {where} ORDER BY {key} {order}, id {order} LIMIT ?"
+    return sql, params + [limit if limit is not None else -1], read_descending != descending
+
+MESSAGES_QUERY = ("SELECT id, chat_id, role, content, timestamp FROM chat_messages", "timestamp", ["chat_id = ?"])
+CHATS_QUERY = ("SELECT id, title, created_at, updated_at FROM chats", "updated_at", [])
+
+def _page(query, params, limit, before, after, descending):
+    select, key, conditions = query
+    sql, params, reversed_rows = _keyset_query(select, key, conditions, params, limit, before, after, descending)
+    rows = connect().execute(sql, params).fetchall()
+    return rows[::-1] if reversed_rows else rows
+
+def _stream(query, params, before, after, descending, batch_size):
+    """Iterator over every matching row in listing order, read straight from the cursor
+    with at most batch_size rows in memory. Cursors are validated before the first row is read.
+    """
+    select, key, conditions = query
+    sql, params, _ = _keyset_query(select, key, conditions, params, None, before, after, descending)
+
+    def rows():
+        # A dedicated connection, because the consumer may resume this generator on any thread
+        conn = open_stream_connection(CHAT_HISTORY_DB_FILE)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            conn.close()
+
+    return rows()
+
+def get_chat_messages(chat_id: str, limit: int = None, before: str = None, after: str = None):
+    """Message rows of a chat, oldest first, optionally one keyset page"""
+    try:
+        return _page(MESSAGES_QUERY, [chat_id], limit, before, after, descending=False)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_chat_messages: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def iter_chat_messages(chat_id: str, before: str = None, after: str = None, batch_size: int = HISTORY_STREAM_BATCH_SIZE):
+    """Message rows of a chat, oldest first, streamed from the database"""
+    return _stream(MESSAGES_QUERY, [chat_id], before, after, False, batch_size)
+
+def get_summary(chat_id: str):
+    """Rolling summary of a chat's oldest messages and how many messages it covers"""
+    try:
+        row = connect().execute(SELECT_SUMMARY, (chat_id,)).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+    except Exception as e:
+        print(f"Error in get_summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def save_summary(chat_id: str, summary: str, summarized_count: int):
+    try:
+        with connect() as conn:
+            conn.execute(UPSERT_SUMMARY, (chat_id, summary, summarized_count, now()))
+    except Exception as e:
+        print(f"Error in save_summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 def clear_messages(chat_id: str):
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
-            conn.commit()
+        with connect() as conn:
+            conn.execute(DELETE_MESSAGES, (chat_id,))
+            conn.execute(DELETE_SUMMARY, (chat_id,))
     except Exception as e:
         print(f"Error in clear_messages: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+def create_chat(title: str):
+    chat_id = str(uuid.uuid4())
+    created_at = now()
+    try:
+        with connect() as conn:
+            conn.execute(INSERT_CHAT, (chat_id, title, created_at, created_at))
+        return {"id": chat_id, "title": title, "created_at": created_at, "updated_at": created_at}
+    except Exception as e:
+        print(f"Error in create_chat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def get_chats(limit: int = None, before: str = None, after: str = None):
+    """Chat rows, most recently updated first, optionally one keyset page"""
+    try:
+        return _page(CHATS_QUERY, [], limit, before, after, descending=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_chats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def iter_chats(before: str = None, after: str = None, batch_size: int = HISTORY_STREAM_BATCH_SIZE):
+    """Chat rows, most recently updated first, streamed from the database"""
+    return _stream(CHATS_QUERY, [], before, after, True, batch_size)
+
+def update_chat_title(chat_id: str, title: str):
+    try:
+        with connect() as conn:
+            conn.execute(UPDATE_CHAT_TITLE, (title, now(), chat_id))
+    except Exception as e:
+        print(f"Error in update_chat_title: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def delete_chat(chat_id: str):
+    """Delete a chat together with its messages and summary"""
+    try:
+        with connect() as conn:
+            conn.execute(DELETE_MESSAGES, (chat_id,))
+            conn.execute(DELETE_SUMMARY, (chat_id,))
+            conn.execute(DELETE_CHAT, (chat_id,))
+    except Exception as e:
+        print(f"Error in delete_chat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
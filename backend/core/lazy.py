@@ -0,0 +1,101 @@
+"""
+Heavy components (models, vector store) built on first use instead of at import
+"""
+
+import threading
+import time
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+_components = {}
+
+
+class LazyComponent:
+    """Stands in for an object that is expensive to build.
+
+    The first attribute access (or resolve()) builds it exactly once, however many threads ask
+    at the same time; the others wait for that build. A failed build is recorded for /health and
+    retried on the next access.
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        self._state = NOT_LOADED
+        self._error = None
+        self._load_seconds = None
+        _components[name] = self
+
+    def resolve(self):
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                self._state = LOADING
+                start = time.perf_counter()
+                try:
+                    instance = self._factory()
+                except Exception as e:
+                    print(f"Error in loading {self._name}: {e}")
+                    self._state = FAILED
+                    self._error = str(e)
+                    raise
+                self._load_seconds = time.perf_counter() - start
+                self._error = None
+                self._instance = instance
+                self._state = READY
+                print(f"Loaded {self._name} in {self._load_seconds:.1f}s")
+            return self._instance
+
+    @property
+    def is_ready(self) -> bool:
+        return self._instance is not None
+
+    def status(self) -> dict:
+        return {
+            "state": self._state,
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            "error": self._error,
+        }
+
+    def __getattr__(self, attr):
+        # Only reached for attributes the proxy itself does not define
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+
+def component_status() -> dict:
+    """Readiness of every lazy component, by name"""
+    return {name: component.status() for name, component in _components.items()}
+
+def start_warm_up(steps: list) -> threading.Thread:
+    """Run the loading steps one after another on a background thread, so the server answers
+    requests while models load. A failing step is logged and the next one still runs."""
+    def run():
+        start = time.perf_counter()
+        for step in steps:
+            try:
+                step()
+            except Exception as e:
+                print(f"Error in warm up: {e}")
+        print(f"Warm up finished in {time.perf_counter() - start:.1f}s")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -1,16 +1,37 @@
-from langchain_community.llms import LlamaCpp
-from langchain_core.callbacks import StdOutCallbackHandler
-from config import MODEL_PATH   
+from config import MODEL_PATH, LLM_POOL_SIZE, LLM_N_CTX, LLM_MAX_TOKENS, PROMPT_CACHE_ENABLED, PROMPT_CACHE_BYTES
+from core.scheduler import InferenceScheduler
+from core.prompt_cache import enable_prompt_cache, warm_prompt_cache
+from core.lazy import LazyComponent
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-llm = LlamaCpp(
-    model_path=MODEL_PATH,
-    n_ctx=4096,     # User query + retrieved context + conversation history + system prompt
-    n_batch=256,        # Number of tokens to process in batch
-    temperature=0.1,    # Temperature for randomness in response generation
-    max_tokens=512,    # Maximum length of AI response
-    streaming=True,     # Stream the response
-    verbose=False,
-    callbacks=[StdOutCallbackHandler()],
-)
+def create_llm():
+    from langchain_community.llms import LlamaCpp
+
+    llm = LlamaCpp(
+        model_path=MODEL_PATH,
+        n_ctx=LLM_N_CTX,     # User query + retrieved context + conversation history + system prompt
+        n_batch=256,        # Number of tokens to process in batch
+        temperature=0.1,    # Temperature for randomness in response generation
+        max_tokens=LLM_MAX_TOKENS,    # Maximum length of AI response
+        streaming=True,     # Stream the response
+        verbose=False,
+    )
+    if PROMPT_CACHE_ENABLED:
+        enable_prompt_cache(llm, PROMPT_CACHE_BYTES // LLM_POOL_SIZE)
+    return llm
+
+def create_llm_pool():
+    # Each instance has its own llama.cpp context (weights are memory-mapped and shared between them)
+    return [create_llm() for _ in range(LLM_POOL_SIZE)]
+
+def warm_llm(llm):
+    """Evaluate the static system prompt on an instance ahead of its first request"""
+    # The prefix comes from the chat prompt, whose module imports this one
+    from core.chain import PROMPT_PREFIX
+    warm_prompt_cache(llm, PROMPT_PREFIX)
+
+# The GGUF is loaded on first use (or during startup warm up), not when this module is imported.
+# Instances are warmed by the scheduler while it loads them, before any request can hold one
+llm_pool = LazyComponent("llm", create_llm_pool)
+inference_scheduler = InferenceScheduler(llm_pool, size=LLM_POOL_SIZE, warm=warm_llm)
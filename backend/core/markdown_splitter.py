@@ -0,0 +1,255 @@
+"""
+Structure-aware Markdown chunking: chunks follow sections, code blocks and tables stay whole
+"""
+
+import re
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+HEADING = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+TABLE_ROW = re.compile(r"^\s*\|")
+TABLE_DIVIDER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+def parse_blocks(text: str, headings=()):
+    """Yield (kind, text, heading path) for every heading, paragraph, code block and table.
+
+    kind is "heading", "paragraph", "code" or "table"; the heading path is the tuple of titles
+    the block sits under, a heading's own path includes itself. headings is the (level, title)
+    stack the text starts under, for text continuing an earlier part of a document.
+    """
+    headings = list(headings)   # (level, title)
+    lines = []
+    kind = None
+    fence = None
+
+    def flush():
+        nonlocal lines, kind
+        block = "\n".join(lines).strip("\n")
+        result = (kind, block, tuple(title for _, title in headings)) if block.strip() else None
+        lines, kind = [], None
+        return result
+
+    for line in text.splitlines():
+        if fence:
+            lines.append(line)
+            if is_fence_end(line, fence):
+                fence = None
+                block = flush()
+                if block:
+                    yield block
+            continue
+
+        match = FENCE.match(line)
+        if match:
+            block = flush()
+            if block:
+                yield block
+            fence, kind, lines = match.group(1), "code", [line]
+            continue
+
+        match = HEADING.match(line)
+        if match:
+            block = flush()
+            if block:
+                yield block
+            level = len(match.group(1))
+            headings = [(l, title) for l, title in headings if l < level] + [(level, match.group(2))]
+            yield "heading", line.strip(), tuple(title for _, title in headings)
+            continue
+
+        if not line.strip():
+            block = flush()
+            if block:
+                yield block
+            continue
+
+        row_kind = "table" if TABLE_ROW.match(line) else "paragraph"
+        if kind is not None and kind != row_kind:
+            block = flush()
+            if block:
+                yield block
+        kind = row_kind
+        lines.append(line)
+
+    # An unclosed fence runs to the end of the file, as Markdown renders it
+    block = flush()
+    if block:
+        yield block
+
+def is_fence_end(line: str, fence: str) -> bool:
+    match = FENCE.match(line)
+    return bool(match) and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence) and not line.strip()[len(match.group(1)):]
+
+def last_cut(text: str, headings=()):
+    """Where text can be cut so both parts parse as they would together.
+
+    Returns the offset of the last heading outside a code fence, or failing that of the line after
+    the last blank line, and the (level, title) stack in effect there; offset 0 if there is none.
+    """
+    stack = list(headings)
+    fence = None
+    offset = 0
+    heading_cut = blank_cut = None
+    for line in text.splitlines(keepends=True):
+        content = line.rstrip("\r\n")
+        fence_match = FENCE.match(content)
+        heading = HEADING.match(content)
+        if fence:
+            if is_fence_end(content, fence):
+                fence = None
+        elif fence_match:
+            fence = fence_match.group(1)
+        elif heading:
+            if offset:
+                heading_cut = (offset, tuple(stack))
+            level = len(heading.group(1))
+            stack = [(l, title) for l, title in stack if l < level] + [(level, heading.group(2))]
+        elif not content.strip() and line.endswith("\n"):
+            blank_cut = (offset + len(line), tuple(stack))
+        offset += len(line)
+    return heading_cut or blank_cut or (0, tuple(headings))
+
+def hard_cut(text: str, size: int, headings=()):
+    """Where to cut text that has no safe cut within size characters, such as one huge code block.
+
+    Cuts after the last whole line of content that fits, or at size characters when not even one
+    does. Returns the offset, the heading stack there and the fence line the rest must re-open
+    with, empty when the cut is outside a code block.
+    """
+    stack = list(headings)
+    fence = opening = None
+    offset = 0
+    cut = None
+    for line in text.splitlines(keepends=True):
+        if offset + len(line) > size or not line.endswith("\n"):
+            break
+        content = line.rstrip("\r\n")
+        fence_match = FENCE.match(content)
+        heading = HEADING.match(content)
+        offset += len(line)
+        if fence:
+            if is_fence_end(content, fence):
+                fence = None
+        elif fence_match:
+            fence, opening = fence_match.group(1), content
+            continue
+        elif heading:
+            level = len(heading.group(1))
+            stack = [(l, title) for l, title in stack if l < level] + [(level, heading.group(2))]
+            continue
+        cut = (offset, tuple(stack), f"{opening}\n" if fence else "")
+    return cut or (size, tuple(stack), f"{opening}\n" if fence else "")
+
+
+class MarkdownSectionSplitter:
+    """Split Markdown along its heading structure.
+
+    A chunk never spans two sibling sections, but a section's subsections join it while they fit,
+    so short sections are not stored as fragments. Code blocks and tables are atomic up to
+    max_block_size and are otherwise cut between lines, re-opening the fence or repeating the
+    table header in every piece. Only paragraphs longer than a chunk fall back to character
+    splitting. Each chunk's heading path is stored as its "headings" metadata.
+    """
+
+    def __init__(self, chunk_size=1600, chunk_overlap=300, separators=None, max_block_size=None):
+        self.chunk_size = chunk_size
+        self.max_block_size = max_block_size or 2 * chunk_size
+        self.paragraph_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=separators,
+        )
+
+    def split_sections(self, text: str, headings=()):
+        """Return (chunk text, heading path) pairs; headings is the stack the text starts under"""
+        chunks = []
+        parts, size, path = [], 0, tuple(title for _, title in headings)
+
+        def flush():
+            nonlocal parts, size
+            # A heading with nothing under it is carried by its subsections' paths instead
+            if parts and any(kind != "heading" for kind, _ in parts):
+                chunks.append(("\n\n".join(block for _, block in parts), path))
+            parts, size = [], 0
+
+        for kind, block, block_path in parse_blocks(text, headings):
+            if kind == "heading":
+                # Subsections join the open chunk while they fit, anything else starts a new one
+                if block_path[:len(path)] != path or size + len(block) > self.chunk_size:
+                    flush()
+                if all(k == "heading" for k, _ in parts):
+                    path = block_path
+            for piece in self.split_block(kind, block):
+                if size + len(piece) > self.chunk_size and any(k != "heading" for k, _ in parts):
+                    # Headings move on with the content below them
+                    carried = []
+                    while parts[-1][0] == "heading":
+                        carried.insert(0, parts.pop())
+                    flush()
+                    parts, size, path = carried, sum(len(b) + 2 for _, b in carried), block_path
+                parts.append((kind, piece))
+                size += len(piece) + 2
+        flush()
+        return chunks
+
+    def split_block(self, kind: str, block: str):
+        if len(block) <= self.chunk_size or (kind in ("code", "table") and len(block) <= self.max_block_size):
+            return [block]
+        if kind == "code":
+            lines = block.split("\n")
+            opening = lines[0]
+            closing = lines[-1] if len(lines) > 1 and FENCE.match(lines[-1]) else FENCE.match(opening).group(1)
+            body = lines[1:-1] if len(lines) > 1 and FENCE.match(lines[-1]) else lines[1:]
+            return [f"{opening}\n{piece}\n{closing}" for piece in self.pack_lines(body, len(opening) + len(closing) + 2)]
+        if kind == "table":
+            lines = block.split("\n")
+            header = lines[:2] if len(lines) > 1 and TABLE_DIVIDER.match(lines[1]) else lines[:1]
+            header_text = "\n".join(header)
+            return [f"{header_text}\n{piece}" for piece in self.pack_lines(lines[len(header):], len(header_text) + 1)]
+        return self.paragraph_splitter.split_text(block)
+
+    def pack_lines(self, lines, reserved: int):
+        """Group lines into pieces of at most chunk_size characters including the reserved wrapper"""
+        pieces, current, size = [], [], reserved
+        for line in lines:
+            if current and size + len(line) + 1 > self.chunk_size:
+                pieces.append("\n".join(current))
+                current, size = [], reserved
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            pieces.append("\n".join(current))
+        return pieces
+
+    def split_head(self, text: str, headings=()):
+        """Split text up to its last section boundary, for a document read in blocks.
+
+        Returns the (chunk text, heading path) pairs, the rest of the text and the heading stack
+        the rest starts under; the rest goes in front of the next block. A rest longer than
+        max_block_size with no boundary in it is cut by force, so it is never held whole.
+        """
+        cut, rest_headings = last_cut(text, headings)
+        sections = self.split_sections(text[:cut], headings) if cut else []
+        # Cut pieces off by offset and slice the rest once, or a long block would be copied per piece
+        start, headings, reopen = cut, rest_headings, ""
+        while len(reopen) + len(text) - start > self.max_block_size:
+            window = reopen + text[start:start + self.chunk_size]
+            end, rest_headings, rest_reopen = hard_cut(window, self.chunk_size - len(reopen), headings)
+            # A code block cut here is closed, and opened again in front of the rest
+            closing = FENCE.match(rest_reopen).group(1) if rest_reopen else ""
+            sections += self.split_sections(window[:end] + closing, headings)
+            start += end - len(reopen)
+            headings, reopen = rest_headings, rest_reopen
+        return sections, reopen + text[start:], headings
+
+    def split_text(self, text: str):
+        return [chunk for chunk, _ in self.split_sections(text)]
+
+    def split_documents(self, docs):
+        chunks = []
+        for doc in docs:
+            for content, path in self.split_sections(doc.page_content):
+                metadata = dict(doc.metadata)
+                if path:
+                    metadata["headings"] = " > ".join(path)
+                chunks.append(Document(page_content=content, metadata=metadata))
+        return chunks
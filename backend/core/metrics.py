@@ -0,0 +1,217 @@
+"""
+Counters and histograms exposed in the Prometheus text format on /metrics
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = []
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """A named metric with optional labels; label values are passed positionally to labels()"""
+
+    type = None
+
+    def __init__(self, name: str, description: str, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        """(suffix, label text, value) lines for the exposition"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{suffix}{labels} {format_number(value)}" for suffix, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, description: str, labelnames=()):
+        super().__init__(f"{name}_total", description, labelnames)
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "", format_labels(self.labelnames, values), child.value
+
+
+class HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_number(bound)
+                yield "_bucket", format_labels(self.labelnames, values, f'le="{le}"'), cumulative
+            yield "_sum", format_labels(self.labelnames, values), total
+            yield "_count", format_labels(self.labelnames, values), cumulative
+
+
+class Gauge(Metric):
+    """Read when scraped; the function returns the value, or None to leave the gauge out"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, read):
+        super().__init__(name, description)
+        self.read = read
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return
+        if value is not None:
+            yield "", "", value
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+# Requests
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body, per route",
+    ("method", "route", "status"),
+)
+
+# Generation
+llm_generated_tokens = Counter("llm_generated_tokens", "Tokens streamed by the LLM")
+llm_tokens_per_second = Histogram(
+    "llm_generation_tokens_per_second", "Streaming rate of each generation, first token to last", buckets=RATE_BUCKETS,
+)
+llm_time_to_first_token = Histogram("llm_time_to_first_token_seconds", "Time from acquiring a model to its first token")
+llm_prompt_tokens = Histogram("llm_prompt_tokens", "Tokens in each chat prompt", buckets=TOKEN_BUCKETS)
+
+# Retrieval
+retrieval_duration = Histogram("retrieval_duration_seconds", "Time to retrieve the chunks for a chat message")
+retrieval_chunks = Histogram("retrieval_chunks", "Chunks returned per retrieval (k)", buckets=SIZE_BUCKETS)
+
+# Embeddings
+embedding_batch_size = Histogram("embedding_batch_size", "Texts per call to the embedding model", buckets=SIZE_BUCKETS)
+embedding_texts_per_second = Histogram(
+    "embedding_texts_per_second", "Embedding model throughput per call", buckets=RATE_BUCKETS,
+)
+embedding_cache_lookups = Counter(
+    "embedding_cache_lookups", "Texts looked up in the embedding cache, by the tier that had them or miss", ("result",),
+)
+embedding_cache_evictions = Counter("embedding_cache_evictions", "Vectors evicted from the on-disk embedding cache")
+
+# Ingestion
+ingest_chunks = Counter("ingest_chunks", "Chunks synced into the knowledge base, by outcome", ("result",))
+ingest_chunks_per_second = Histogram(
+    "ingest_chunks_per_second", "Chunks stored per second of each file sync", buckets=RATE_BUCKETS,
+)
+
+# SQLite
+sqlite_query_duration = Histogram("sqlite_query_duration_seconds", "Statement execution time", ("database",), buckets=FAST_BUCKETS)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each HTTP request until its response body is complete.
+
+    Only the response start message is inspected, so streamed bodies pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope; the template keeps label values bounded
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
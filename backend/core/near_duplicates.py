@@ -0,0 +1,52 @@
+"""
+Near-duplicate chunk suppression using the vectors already stored in the vector store
+"""
+
+from typing import Any
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """Cosine similarity from a Chroma distance between normalized vectors"""
+    if space in ("cosine", "ip"):
+        return 1.0 - distance
+    # Squared L2 between unit vectors is 2 - 2cos
+    return 1.0 - distance / 2.0
+
+def select_distinct(vectors, threshold: float) -> list[int]:
+    """Indices to keep, in order, dropping any vector whose cosine similarity to an already kept one
+    reaches the threshold"""
+    if len(vectors) == 0:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    kept = []
+    for i in range(len(matrix)):
+        if kept and float(np.max(matrix[kept] @ matrix[i])) >= threshold:
+            continue
+        kept.append(i)
+    return kept
+
+class NearDuplicateFilter(BaseRetriever):
+    """Drops retrieved chunks that say almost the same thing as a better-ranked one, such as
+    neighbours sharing their chunk overlap. Vectors are read back from the store, not re-embedded;
+    chunks without a stored id are always kept."""
+
+    retriever: BaseRetriever
+    vector_store: Any
+    threshold: float = 0.92
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        docs = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        ids = [doc.id for doc in docs if doc.id]
+        if len(ids) < 2:
+            return docs
+
+        stored = self.vector_store.get(ids=ids, include=["embeddings"])
+        vectors_by_id = dict(zip(stored["ids"], stored["embeddings"]))
+        with_vectors = [i for i, doc in enumerate(docs) if doc.id in vectors_by_id]
+        kept = {with_vectors[j] for j in select_distinct([vectors_by_id[docs[i].id] for i in with_vectors], self.threshold)}
+        return [doc for i, doc in enumerate(docs) if i in kept or doc.id not in vectors_by_id]
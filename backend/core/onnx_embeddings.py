@@ -0,0 +1,152 @@
+"""
+Sentence-transformer embeddings served by ONNX Runtime on CPU, optionally int8 quantized
+"""
+
+import json
+import os
+import threading
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import EMBEDDING_BATCH_SIZE, EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZE, EMBEDDING_THREADS
+
+ONNX_OPSET = 14
+
+def pool(hidden: np.ndarray, attention_mask: np.ndarray, mode: str = "mean") -> np.ndarray:
+    """Sentence vectors from token vectors the way sentence-transformers pools them, L2 normalized"""
+    if mode == "cls":
+        vectors = hidden[:, 0]
+    else:
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def read_sentence_transformer_config(model_name: str):
+    """Pooling mode and max sequence length from the sentence-transformers files of a hub model"""
+    mode, max_length = "mean", None
+    try:
+        from huggingface_hub import hf_hub_download
+        with open(hf_hub_download(model_name, "1_Pooling/config.json")) as f:
+            if json.load(f).get("pooling_mode_cls_token"):
+                mode = "cls"
+        with open(hf_hub_download(model_name, "sentence_bert_config.json")) as f:
+            max_length = json.load(f).get("max_seq_length")
+    except Exception as e:
+        print(f"Using mean pooling for {model_name}, no sentence-transformers config: {e}")
+    return mode, max_length
+
+def export_onnx(model_name: str, path: str):
+    """Export the transformer to ONNX with dynamic batch and sequence axes (needs torch once)"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+        )
+    os.replace(tmp_path, path)
+
+def quantize_onnx(path: str, quantized_path: str):
+    """Dynamic int8 quantization of the weights, activations stay float"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = f"{quantized_path}.{os.getpid()}.tmp"
+    quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, quantized_path)
+
+
+class OnnxEmbeddings(Embeddings):
+    """The same model as the sentence-transformers backend, run through ONNX Runtime.
+
+    The model is exported once into model_dir (and quantized to int8 if asked), later starts
+    only load the .onnx file. Texts are sorted by length before batching so each batch pads to
+    similar lengths, then returned in input order.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        model_dir: str = EMBEDDING_ONNX_DIR,
+        quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+    ):
+        self.model_name = model_name
+        self.model_dir = os.path.join(model_dir, model_name.replace("/", "__"))
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.threads = threads
+        self._session = None
+        self._tokenizer = None
+        self._input_names = None
+        self._pooling = "mean"
+        self._max_length = 512
+        self._lock = threading.Lock()
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, "model.int8.onnx" if self.quantize else "model.onnx")
+
+    def load(self):
+        """Export if needed and open the inference session, once"""
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from transformers import AutoTokenizer
+
+            fp32_path = os.path.join(self.model_dir, "model.onnx")
+            if not os.path.exists(fp32_path):
+                print(f"Exporting {self.model_name} to ONNX")
+                export_onnx(self.model_name, fp32_path)
+            if self.quantize and not os.path.exists(self.model_path):
+                quantize_onnx(fp32_path, self.model_path)
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.threads:
+                options.intra_op_num_threads = self.threads
+            session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self._pooling, max_length = read_sentence_transformer_config(self.model_name)
+            self._max_length = max_length or min(self._tokenizer.model_max_length, 512)
+            self._input_names = [node.name for node in session.get_inputs()]
+            self._session = session
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self._tokenizer(texts, padding=True, truncation=True, max_length=self._max_length, return_tensors="np")
+        inputs = {name: encoded[name].astype(np.int64) for name in self._input_names}
+        hidden = self._session.run(None, inputs)[0]
+        return pool(hidden, encoded["attention_mask"], self._pooling)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self.load()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
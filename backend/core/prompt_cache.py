@@ -0,0 +1,31 @@
+"""
+Reuse of llama.cpp evaluated prompt state across requests
+"""
+
+def enable_prompt_cache(llm, capacity_bytes: int):
+    """Attach an LRU cache of saved llama.cpp states to a LlamaCpp instance.
+
+    llama.cpp saves the state after every completion and restores the entry sharing the longest
+    token prefix with the next prompt, so only the tokens after that prefix are evaluated.
+    """
+    from llama_cpp import LlamaRAMCache
+
+    llm.client.set_cache(LlamaRAMCache(capacity_bytes=capacity_bytes))
+
+def warm_prompt_cache(llm, prefix: str):
+    """Evaluate a static prompt prefix once so its state is cached before the first request"""
+    if llm.client.cache is None:
+        return
+    llm.client.create_completion(prefix, max_tokens=1)
+
+def prompt_cache_stats(llms: list) -> list:
+    stats = []
+    for llm in llms:
+        cache = llm.client.cache
+        stats.append({
+            "enabled": cache is not None,
+            "entries": len(cache.cache_state) if cache is not None else 0,
+            "bytes": cache.cache_size if cache is not None else 0,
+            "capacity_bytes": cache.capacity_bytes if cache is not None else 0,
+        })
+    return stats
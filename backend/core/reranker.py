@@ -0,0 +1,111 @@
+"""
+Cross-encoder reranking of retrieved chunks before they are packed into the prompt
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    RERANK_MODEL,
+    RERANK_BATCH_SIZE,
+    RERANK_MAX_SECONDS,
+    RERANK_TOP_N,
+    RERANK_CACHE_ENTRIES,
+)
+
+
+class Reranker:
+    """Scores (query, chunk) pairs with a small cross-encoder, batched on CPU.
+
+    Scores are cached by (query, chunk digest), so a follow-up over the same chunks only scores
+    the new ones. Scoring stops once max_seconds is spent; candidates left unscored keep their
+    retrieval order behind the scored ones.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_seconds: float = RERANK_MAX_SECONDS,
+        cache_entries: int = RERANK_CACHE_ENTRIES,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seconds = max_seconds
+        self.cache_entries = cache_entries
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.scored = 0
+        self.truncated = 0
+
+    def _get_model(self):
+        # Loaded on first use so the model costs nothing unless reranking is turned on
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def _key(self, query: str, content: str) -> tuple:
+        return query, hashlib.sha256(content.encode("utf-8")).digest()
+
+    def score(self, query: str, contents: list[str]) -> list:
+        """Relevance score per content, None for candidates the time budget did not reach"""
+        keys = [self._key(query, content) for content in contents]
+        scores = [None] * len(contents)
+        pending = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    pending.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+                    self.cache_hits += 1
+
+        deadline = time.monotonic() + self.max_seconds
+        for start in range(0, len(pending), self.batch_size):
+            if start and time.monotonic() > deadline:
+                self.truncated += 1
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = self._get_model().predict([(query, contents[i]) for i in batch], batch_size=self.batch_size)
+            with self._lock:
+                for i, value in zip(batch, predicted):
+                    scores[i] = float(value)
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+                self.scored += len(batch)
+        return scores
+
+    def rerank(self, query: str, docs: list, top_n: int = RERANK_TOP_N) -> list:
+        """The top_n docs by cross-encoder score, ties and unscored docs in retrieval order"""
+        if not docs:
+            return []
+        scores = self.score(query, [doc.page_content for doc in docs])
+        order = sorted(
+            range(len(docs)),
+            key=lambda i: (scores[i] is None, -(scores[i] or 0.0), i),
+        )
+        return [docs[i] for i in order[:top_n]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "cache_entries": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "scored": self.scored,
+                "truncated_queries": self.truncated,
+            }
+
+reranker = Reranker()
@@ -0,0 +1,158 @@
+"""
+Admission control and fair queueing in front of the LLM instances
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from config import LLM_MAX_CONCURRENT, LLM_MAX_QUEUED, LLM_QUEUE_TIMEOUT, LLM_DEFAULT_PRIORITY
+
+# Number of recent queue wait times kept for percentiles
+WAIT_SAMPLES = 1000
+
+
+class InferenceScheduler:
+    """Hands out model instances one generation at a time.
+
+    Requests beyond max_concurrent wait in a bounded priority queue (FIFO within a priority),
+    and are rejected when the queue is full or they wait longer than the queue timeout.
+    """
+
+    def __init__(self, instances, max_concurrent: int = LLM_MAX_CONCURRENT, max_queued: int = LLM_MAX_QUEUED, size: int = None, warm=None):
+        """instances is a list, or a lazy pool of the given size that is loaded by the first acquire.
+
+        warm, if given, is called with each instance while it is loaded, before any request can hold it.
+        """
+        # A llama.cpp context serves one generation at a time, so concurrency is capped by the pool
+        self.max_concurrent = max(1, min(max_concurrent, len(instances) if size is None else size))
+        self.max_queued = max_queued
+        self._instances = instances
+        self._warm = warm
+        self._prepared = None
+        self._prepare_lock = threading.Lock()
+        self._idle = list(instances[:self.max_concurrent]) if isinstance(instances, list) and warm is None else None
+        self._loading = None
+        self._waiters = []
+        self._counter = itertools.count()
+        self._wait_times = deque(maxlen=WAIT_SAMPLES)
+        self.active = 0
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.cancelled = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def prepare(self) -> list:
+        """Load and warm the instances, once; blocking, so it can also run on the startup warm-up thread.
+
+        Instances only reach the idle pool through load(), after this returns, so warming never
+        shares an instance with a generation.
+        """
+        with self._prepare_lock:
+            if self._prepared is None:
+                instances = list(self._instances[:self.max_concurrent])
+                if self._warm is not None:
+                    for instance in instances:
+                        self._warm(instance)
+                self._prepared = instances
+            return self._prepared
+
+    async def load(self):
+        """Load the model instances off the event loop, once; concurrent callers share the load"""
+        if self._idle is not None:
+            return
+        if self._loading is None:
+            loop = asyncio.get_running_loop()
+            self._loading = loop.run_in_executor(None, self.prepare)
+        loading = self._loading
+        try:
+            instances = await asyncio.shield(loading)
+        except Exception as e:
+            if self._loading is loading:
+                self._loading = None   # Let the next request try again
+            raise HTTPException(status_code=503, detail=f"Model is not available: {e}")
+        if self._idle is None:
+            self._idle = list(instances)
+
+    @property
+    def loaded(self) -> bool:
+        return self._idle is not None
+
+    @asynccontextmanager
+    async def acquire(self, priority: int = LLM_DEFAULT_PRIORITY, timeout: float = LLM_QUEUE_TIMEOUT):
+        """Wait for a free model instance and hold it for the duration of the block"""
+        await self.load()
+        enqueued_at = time.monotonic()
+        if self._idle and not self.queue_depth:
+            instance = self._idle.pop()
+        else:
+            if self.queue_depth >= self.max_queued:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Too many requests waiting for the model, try again later")
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), future))
+            try:
+                instance = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise HTTPException(status_code=503, detail="Timed out waiting for the model")
+            except BaseException:
+                # Client went away while queued; hand back an instance we were given in the meantime
+                self.cancelled += 1
+                if future.done() and not future.cancelled():
+                    self._release(future.result())
+                future.cancel()
+                raise
+
+        self._wait_times.append(time.monotonic() - enqueued_at)
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield instance
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._release(instance)
+
+    def _release(self, instance):
+        """Give the instance to the best waiting request, or return it to the idle pool"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(instance)
+                return
+        self._idle.append(instance)
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "loaded": self.loaded,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": self.active,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "wait_seconds": {
+                "avg": sum(waits) / len(waits) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
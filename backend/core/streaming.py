@@ -0,0 +1,102 @@
+"""
+Server-sent event framing and token coalescing for chat streams
+"""
+
+import asyncio
+import json
+import time
+from config import STREAM_FLUSH_BYTES, STREAM_FLUSH_SECONDS
+
+# Seconds between checks for a client that went away
+DISCONNECT_CHECK_INTERVAL = 0.5
+
+def format_event(event: str, data: dict) -> str:
+    """One SSE frame; data is JSON so newlines in tokens cannot break the framing"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def as_event(item):
+    """Map a chat_stream item to (event, data): strings are tokens, dicts carry their own type"""
+    if isinstance(item, str):
+        return "token", {"text": item}
+    item = dict(item)
+    return item.pop("type"), item
+
+async def coalesce_events(
+    source,
+    is_disconnected=None,
+    flush_seconds: float = STREAM_FLUSH_SECONDS,
+    flush_bytes: int = STREAM_FLUSH_BYTES,
+    check_seconds: float = DISCONNECT_CHECK_INTERVAL,
+):
+    """Typed (event, data) pairs from a chat_stream, with tokens merged into fewer, larger events.
+
+    The first token goes out at once; later tokens are held until flush_bytes have collected or
+    the oldest has waited flush_seconds, and any other event flushes them first. The source is
+    awaited in a task so a stalled generation still flushes on time and a client that went away
+    (is_disconnected returns True) is noticed while waiting. The source is closed on exit, which
+    cancels generation and frees the model.
+    """
+    buffer = []
+    buffered_bytes = 0
+    oldest = None
+    sent_token = False
+    pending = None
+    last_check = time.monotonic()
+
+    def flush():
+        nonlocal buffer, buffered_bytes, oldest
+        text = "".join(buffer)
+        buffer, buffered_bytes, oldest = [], 0, None
+        return "token", {"text": text}
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(source.__anext__())
+            now = time.monotonic()
+            timeout = max(0.0, last_check + check_seconds - now) if is_disconnected else None
+            if buffer:
+                flush_in = max(0.0, oldest + flush_seconds - now)
+                timeout = flush_in if timeout is None else min(timeout, flush_in)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if is_disconnected and time.monotonic() - last_check >= check_seconds:
+                last_check = time.monotonic()
+                if await is_disconnected():
+                    print("Client disconnected, stopping generation")
+                    return
+
+            if done:
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+                event, data = as_event(item)
+                if event == "token":
+                    if not data["text"]:
+                        continue
+                    if not sent_token:
+                        sent_token = True
+                        yield event, data
+                        continue
+                    buffer.append(data["text"])
+                    buffered_bytes += len(data["text"].encode("utf-8"))
+                    oldest = oldest or time.monotonic()
+                else:
+                    if buffer:
+                        yield flush()
+                    yield event, data
+                    continue
+
+            if buffer and (buffered_bytes >= flush_bytes or time.monotonic() - oldest >= flush_seconds):
+                yield flush()
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            # Let the cancelled step unwind before closing, a running generator cannot be closed
+            await asyncio.gather(pending, return_exceptions=True)
+        await source.aclose()
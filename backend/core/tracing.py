@@ -0,0 +1,212 @@
+"""
+Sampled, structured request tracing written off the request path
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from config import TRACE_EXPORTERS, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_SAMPLE_RATE, TRACE_SERVICE_NAME
+
+# Finished traces are put on a queue by the request and written by a listener thread
+trace_logger = logging.getLogger("second_brain.trace")
+trace_logger.setLevel(logging.INFO)
+trace_logger.propagate = False
+
+_listener = None
+_sample_rate = 0.0
+
+
+class Trace:
+    """Timed spans of one sampled request, emitted as a single record when it finishes"""
+
+    sampled = True
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.spans = []
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._finished = False
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a stage; the yielded dict collects attributes found along the way"""
+        start = time.perf_counter()
+        try:
+            yield attributes
+        finally:
+            self.add_span(name, start, **attributes)
+
+    def add_span(self, name: str, start: float, end: float = None, **attributes):
+        """Record a stage from perf_counter timestamps, for stages that end outside a with block"""
+        end = time.perf_counter() if end is None else end
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "attributes": attributes,
+        })
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, status: str = "ok"):
+        if self._finished:
+            return
+        self._finished = True
+        trace_logger.info(self.name, extra={"trace": {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "status": status,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }})
+
+
+class NoopTrace:
+    """Stand-in for requests that are not sampled, every call does nothing"""
+
+    sampled = False
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        yield attributes
+
+    def add_span(self, name: str, start: float, end: float = None, **attributes):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def finish(self, status: str = "ok"):
+        pass
+
+NOOP_TRACE = NoopTrace()
+
+def start_trace(name: str, **attributes):
+    """A new trace for a sampled request, otherwise the no-op trace"""
+    if _listener is None or random.random() >= _sample_rate:
+        return NOOP_TRACE
+    return Trace(name, **attributes)
+
+
+class JsonlFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.trace, default=str)
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+def to_otlp(trace: dict, service_name: str = TRACE_SERVICE_NAME) -> dict:
+    """An OTLP/JSON export request with the trace as a root span and its stages as children"""
+    start_ns = int(trace["start_time"] * 1e9)
+    root_id = uuid.uuid4().hex[:16]
+    error = trace["status"] == "error"
+    spans = [{
+        "traceId": trace["trace_id"],
+        "spanId": root_id,
+        "name": trace["name"],
+        "kind": 2,  # SERVER
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(trace["duration_ms"] * 1e6)),
+        "attributes": otlp_attributes({**trace["attributes"], "status": trace["status"]}),
+        "status": {"code": 2 if error else 1},
+    }]
+    for span in trace["spans"]:
+        span_start = start_ns + int(span["start_ms"] * 1e6)
+        spans.append({
+            "traceId": trace["trace_id"],
+            "spanId": uuid.uuid4().hex[:16],
+            "parentSpanId": root_id,
+            "name": span["name"],
+            "kind": 1,  # INTERNAL
+            "startTimeUnixNano": str(span_start),
+            "endTimeUnixNano": str(span_start + int(span["duration_ms"] * 1e6)),
+            "attributes": otlp_attributes(span["attributes"]),
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": otlp_attributes({"service.name": service_name})},
+        "scopeSpans": [{"scope": {"name": "second_brain.trace"}, "spans": spans}],
+    }]}
+
+class OtlpHandler(logging.Handler):
+    """Posts each trace to an OpenTelemetry collector's OTLP/HTTP JSON endpoint"""
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, timeout: float = 2.0):
+        super().__init__()
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.failures = 0
+
+    def emit(self, record):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(to_otlp(record.trace)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+        except Exception as e:
+            # One line for the first failure, a collector that is down must not flood the console
+            if self.failures == 0:
+                print(f"Error exporting traces to {self.endpoint}: {e}")
+            self.failures += 1
+
+def exporter_handlers(exporters=TRACE_EXPORTERS) -> list:
+    handlers = []
+    for exporter in exporters:
+        if exporter == "jsonl":
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            handler = logging.FileHandler(TRACE_FILE, encoding="utf-8")
+            handler.setFormatter(JsonlFormatter())
+        elif exporter == "otlp":
+            handler = OtlpHandler()
+        else:
+            raise ValueError(f"Unknown trace exporter: {exporter}")
+        handlers.append(handler)
+    return handlers
+
+def start_tracing(handlers: list = None, sample_rate: float = TRACE_SAMPLE_RATE):
+    """Start the background writer; without handlers (no exporters configured) tracing stays off"""
+    global _listener, _sample_rate
+    handlers = exporter_handlers() if handlers is None else handlers
+    if _listener is not None or not handlers or sample_rate <= 0:
+        return
+    records = queue.SimpleQueue()
+    trace_logger.addHandler(logging.handlers.QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    _listener.start()
+    _sample_rate = sample_rate
+
+def stop_tracing():
+    """Write out queued traces and stop the writer"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    for handler in list(trace_logger.handlers):
+        trace_logger.removeHandler(handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -1,75 +1,736 @@
-from langchain_chroma import Chroma
+from core.ann_store import LocalANNStore, INDEX_TYPES
 from core.embeddings import embeddings
-from core.document_loader import load_pdf, load_txt, load_csv, split_docs
-from core.knowledge_base import save_file
-from typing import List
+from core.lazy import LazyComponent
+from core.document_loader import iter_documents, iter_split_docs, batched, parse_file, is_markdown, SEPARATORS, LAZY_LOADERS
+from core.knowledge_base import save_file, delete_file, get_file, get_file_name, get_files, mark_file_deleted, get_deleted_files, purge_file
+from core.chunk_index import (
+    init_chunk_index,
+    hash_chunk,
+    get_file_chunks,
+    add_file_chunks,
+    remove_file_chunks,
+    delete_file_chunks,
+    get_vector_files,
+    get_indexed_file_ids,
+    vacuum_chunk_index,
+)
+from core import bm25_index
+from core.hybrid_retriever import HybridRetriever
+from core.near_duplicates import NearDuplicateFilter
+from core.answer_cache import answer_cache
+from core.jobs import JobCancelled
+from core.ingest_lock import ingest_gate, file_locks
+from core.metrics import ingest_chunks, ingest_chunks_per_second
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List
+import itertools
+import multiprocessing
 import os
+import time
 import uuid
-from config import CHROMA_DB_FILE
-
-vector_store = Chroma(
-    collection_name="second_brain",
-    persist_directory=CHROMA_DB_FILE,
-    embedding_function=embeddings
+from config import (
+    CHROMA_DB_FILE,
+    CHUNK_INDEX_FILE,
+    UPLOAD_DIR,
+    INGEST_BATCH_SIZE,
+    INGEST_BULK_BATCH_SIZE,
+    INGEST_BULK_MAX_FILE_MB,
+    INGEST_PARSE_PROCESSES,
+    INGEST_DEDUP_THRESHOLD,
+    NEAR_DUPLICATE_THRESHOLD,
+    RETRIEVER_MODE,
+    HYBRID_K,
+    HYBRID_FETCH_K,
+    RRF_K,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_DIR,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
 )
 
-# Function to add document to the knowledge base
-def ingest_file_to_knowledge_base(file_path: str) -> bool:
-    """Add a document to the vector store"""
-    if not os.path.exists(file_path):
-        print(f"File not found: {file_path}")
-        return False
+def create_vector_store(backend: str = VECTOR_BACKEND):
+    """Chroma with explicit HNSW settings, or a local hnswlib / FAISS / exact index"""
+    if backend == "chroma":
+        from core.chroma_store import ChromaStore
+        return ChromaStore(
+            collection_name="second_brain",
+            persist_directory=CHROMA_DB_FILE,
+            embedding_function=embeddings,
+            # M and construction_ef are fixed when the collection is created, search_ef can change later
+            collection_metadata={
+                "hnsw:M": HNSW_M,
+                "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+                "hnsw:search_ef": HNSW_EF_SEARCH,
+            },
+        )
+    if backend in INDEX_TYPES:
+        return LocalANNStore(embeddings, LOCAL_INDEX_DIR, backend)
+    raise ValueError(f"Unknown vector backend: {backend}")
 
-    file_ext = os.path.splitext(file_path)[1].lower()
-    if file_ext == '.pdf':
-        docs = load_pdf(file_path)
-    elif file_ext == '.txt':
-        docs = load_txt(file_path)
-    elif file_ext == '.csv':
-        docs = load_csv(file_path)
-    else:
-        print(f"Unsupported file type: {file_ext}")
+def backfill_bm25_index(store, page_size: int = 1000):
+    """Index chunks that were stored before the BM25 index existed"""
+    offset = 0
+    while True:
+        stored = store.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not stored["ids"]:
+            break
+        by_file = {}
+        for vector_id, content, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            by_file.setdefault((metadata or {}).get("id", ""), []).append((vector_id, content))
+        for file_id, chunks in by_file.items():
+            bm25_index.add_chunks(file_id, chunks)
+        offset += len(stored["ids"])
+    if offset:
+        print(f"Indexed {offset} existing chunks for keyword search")
+
+def open_vector_store():
+    """Open the configured store and bring the keyword index up to date with it"""
+    store = create_vector_store()
+    if bm25_index.is_empty():
+        backfill_bm25_index(store)
+    return store
+
+init_chunk_index()
+bm25_index.init_bm25_index()
+# Opened on first use (or during startup warm up), importing this module does not touch the index
+vector_store = LazyComponent("vector_store", open_vector_store)
+
+# Splitter settings are part of every chunk hash, changing them re-embeds everything once
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+SPLITTER_PARAMS = {
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "separators": SEPARATORS,
+}
+# Markdown has its own splitter and so its own hash parameters
+MARKDOWN_SPLITTER_PARAMS = {**SPLITTER_PARAMS, "splitter": "markdown_sections"}
+
+def splitter_params(path: str) -> dict:
+    return MARKDOWN_SPLITTER_PARAMS if is_markdown(path) else SPLITTER_PARAMS
+
+def ref_key(file_id: str) -> str:
+    """Metadata flag set on a vector shared with a file other than its owner"""
+    return f"ref_{file_id}"
+
+def file_filter(file_ids: List[str]) -> dict:
+    """Chroma where clause matching the chunks owned by or shared with any of the files"""
+    conditions = [{"id": {"$in": file_ids}}] + [{ref_key(file_id): {"$eq": True}} for file_id in file_ids]
+    return {"$or": conditions}
+
+def find_shared_vectors(vectors: list, file_id: str) -> list:
+    """For each vector, the id of a near-identical chunk stored for another file, or None"""
+    if not INGEST_DEDUP_THRESHOLD:
+        return [None] * len(vectors)
+    return [
+        match[0] if match and match[1] >= INGEST_DEDUP_THRESHOLD else None
+        for match in vector_store.nearest(vectors, where={"id": {"$ne": file_id}})
+    ]
+
+def release_vectors(file_id: str, vector_ids: List[str]):
+    """Drop a file's claim on vectors after its chunk index rows are gone.
+
+    A vector nobody references any more is deleted. A shared vector stays: the file's reference
+    flag is cleared, or if the file owned it, ownership passes to a file still referencing it.
+    """
+    if not vector_ids:
+        return
+    referencing = get_vector_files(vector_ids)
+    unused = [vector_id for vector_id in vector_ids if not referencing[vector_id]]
+    if unused:
+        vector_store.delete(ids=unused)
+        bm25_index.remove_chunks(unused)
+
+    shared = [vector_id for vector_id in vector_ids if referencing[vector_id] and file_id not in referencing[vector_id]]
+    if not shared:
+        return
+    stored = vector_store.get(ids=shared, include=["metadatas"])
+    updates = []
+    owner_names = {}
+    for vector_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        if (metadata or {}).get("id") == file_id:
+            owner = referencing[vector_id][0]
+            update = {"id": owner, ref_key(file_id): None, ref_key(owner): None}
+            # Sources shown for the chunk now name the file that owns it
+            if owner not in owner_names:
+                owner_names[owner] = get_file_name(owner)
+            if owner_names[owner]:
+                update.update(name=owner_names[owner], file_type=os.path.splitext(owner_names[owner])[1].lower())
+            updates.append((vector_id, update))
+            bm25_index.set_owner(vector_id, owner)
+        else:
+            updates.append((vector_id, {ref_key(file_id): None}))
+    vector_store.update_metadatas(
+        [vector_id for vector_id, _ in updates],
+        [metadata for _, metadata in updates],
+    )
+
+class FileSync:
+    """One file being synced: its id, the chunks it already has and what this run changed"""
+
+    def __init__(self, file_path: str):
+        self.path = file_path
+        self.name = os.path.basename(file_path)
+        self.file_type = os.path.splitext(file_path)[1].lower()
+        self.started = time.perf_counter()
+
+        # Re-ingesting a known file keeps its id so existing chunks stay valid
+        self.id = get_file(self.name)
+        self.is_new = self.id is None
+        if self.is_new:
+            # Finish an interrupted delete of a file by this name, keeping the copy just uploaded
+            for deleted_id, _, deleted_path in get_deleted_files(self.name):
+                purge_file_data(deleted_id, deleted_path, remove_copy=False)
+            self.id = str(uuid.uuid4())
+            save_file(self.id, self.name, file_path)
+
+        self.existing = get_file_chunks(self.id)
+        self.legacy_ids = []
+        if not self.is_new and not self.existing:
+            # File was ingested before chunks were content-addressed, replace its random-id chunks
+            self.legacy_ids = vector_store.get(where={"id": self.id}, include=[])["ids"]
+
+        self.metadata = {
+            "id": self.id,
+            "name": self.name,
+            "file_type": self.file_type
+        }
+        # Only chunk hashes are kept for the whole file, identical chunks within a file are stored once
+        self.seen = set()
+        self.added = []
+        self.shared = []
+        # Unchanged chunks waiting to have their stored metadata checked, a batch at a time
+        self.unchanged = []
+        self.refreshed = 0
+
+    def is_new_chunk(self, chunk_hash: str, metadata: dict = None) -> bool:
+        """Record a chunk of the current version, True if it still has to be stored.
+
+        The hash covers only the content, so an unchanged chunk may have moved: its metadata
+        (page, headings, source) is refreshed on the stored vector.
+        """
+        if chunk_hash in self.seen:
+            return False
+        self.seen.add(chunk_hash)
+        if chunk_hash not in self.existing:
+            return True
+        if metadata is not None:
+            self.unchanged.append((self.existing[chunk_hash], metadata))
+            if len(self.unchanged) >= INGEST_BATCH_SIZE:
+                self.refresh_metadata()
         return False
 
-    # Save file to knowledge database
-    id = str(uuid.uuid4())
-    name = os.path.basename(file_path)
-    save_file(id, name, file_path)
+    def refresh_metadata(self):
+        """Rewrite the metadata of unchanged chunks that moved, on the vectors this file owns"""
+        pending, self.unchanged = self.unchanged, []
+        if not pending:
+            return
+        stored = vector_store.get(ids=[vector_id for vector_id, _ in pending], include=["metadatas"])
+        current = dict(zip(stored["ids"], stored["metadatas"]))
+        updates = []
+        for vector_id, metadata in pending:
+            old = current.get(vector_id) or {}
+            # A vector shared from another file keeps its owner's metadata
+            if old.get("id") != self.id:
+                continue
+            update = {key: value for key, value in metadata.items() if old.get(key) != value}
+            update.update({key: None for key in old if key not in metadata and not key.startswith("ref_")})
+            if update:
+                updates.append((vector_id, update))
+        if updates:
+            vector_store.update_metadatas([vector_id for vector_id, _ in updates], [update for _, update in updates])
+            self.refreshed += len(updates)
+
+    def rollback(self):
+        """Leave no partially ingested chunks behind"""
+        stored = self.added + self.shared
+        if stored:
+            remove_file_chunks(self.id, [chunk_hash for chunk_hash, _ in stored])
+            release_vectors(self.id, list(dict.fromkeys(vector_id for _, vector_id in stored)))
+        if self.is_new:
+            delete_file(self.name)
+        answer_cache.invalidate_files([self.id])
+
+    def finish(self):
+        """Drop chunks the current version no longer has and return the sync counts, or False if
+        the file turned out to be empty"""
+        if not self.seen:
+            print(f"No documents were added to the knowledge base from {self.name}")
+            if self.is_new:
+                delete_file(self.name)
+            return False
+
+        self.refresh_metadata()
+        stale_hashes = [chunk_hash for chunk_hash in self.existing if chunk_hash not in self.seen]
+        stale_ids = [self.existing[chunk_hash] for chunk_hash in stale_hashes] + self.legacy_ids
+        if stale_ids:
+            remove_file_chunks(self.id, stale_hashes)
+            release_vectors(self.id, list(dict.fromkeys(stale_ids)))
+        if self.added or self.shared or stale_ids or self.refreshed:
+            # Answers drawn from the old version of the file are no longer trustworthy
+            answer_cache.invalidate_files([self.id])
+
+        result = {
+            "file_id": self.id,
+            "added": len(self.added),
+            "shared": len(self.shared),
+            "unchanged": len(self.seen) - len(self.added) - len(self.shared),
+            "removed": len(stale_ids),
+        }
+        for outcome in ("added", "shared", "unchanged", "removed"):
+            ingest_chunks.labels(outcome).inc(result[outcome])
+        stored = result["added"] + result["shared"]
+        if stored:
+            ingest_chunks_per_second.observe(stored / max(time.perf_counter() - self.started, 1e-9))
+        print(f"Synced {self.name}: {result['added']} added, {result['shared']} shared, {result['unchanged']} unchanged, {result['removed']} removed")
+        return result
+
+def store_chunks(chunks: list):
+    """Embed and store (sync, chunk hash, content, metadata) tuples, which may span many files.
+
+    Everything is embedded in one call and written with one add_vectors call; a chunk that is a
+    near-duplicate of another file's chunk references that vector instead of being stored.
+    """
+    # Embed once, the vectors serve both the duplicate lookup and the insert
+    vectors = embeddings.embed_documents([content for _, _, content, _ in chunks])
+
+    by_file = {}
+    for chunk, vector in zip(chunks, vectors):
+        by_file.setdefault(chunk[0].id, []).append((chunk, vector))
+
+    owned = []
+    for file_chunks in by_file.values():
+        sync = file_chunks[0][0][0]
+        file_vectors = [vector for _, vector in file_chunks]
+        file_shared = []
+        for ((_, chunk_hash, content, metadata), vector), shared_id in zip(file_chunks, find_shared_vectors(file_vectors, sync.id)):
+            if shared_id:
+                file_shared.append((chunk_hash, shared_id))
+            else:
+                owned.append((sync, chunk_hash, f"{sync.id}:{chunk_hash}", content, metadata, vector))
+        if file_shared:
+            shared_ids = list(dict.fromkeys(vector_id for _, vector_id in file_shared))
+            vector_store.update_metadatas(shared_ids, [{ref_key(sync.id): True} for _ in shared_ids])
+            add_file_chunks(sync.id, file_shared)
+            sync.shared.extend(file_shared)
+
+    if not owned:
+        return
+    vector_store.add_vectors(
+        [vector_id for _, _, vector_id, _, _, _ in owned],
+        [vector for _, _, _, _, _, vector in owned],
+        [content for _, _, _, content, _, _ in owned],
+        [metadata for _, _, _, _, metadata, _ in owned],
+    )
+    stored = {}
+    for sync, chunk_hash, vector_id, content, _, _ in owned:
+        sync.added.append((chunk_hash, vector_id))
+        stored.setdefault(sync.id, []).append((chunk_hash, vector_id, content))
+    for file_id, entries in stored.items():
+        add_file_chunks(file_id, [(chunk_hash, vector_id) for chunk_hash, vector_id, _ in entries])
+        bm25_index.add_chunks(file_id, [(vector_id, content) for _, vector_id, content in entries])
+
+# Function to add document to the knowledge base
+def ingest_file_to_knowledge_base(file_path: str, job=None):
+    """Sync a document into the vector store, embedding only chunks that are new or changed.
+
+    The file is streamed: pages are loaded lazily, split as they arrive and embedded in
+    INGEST_BATCH_SIZE batches, so memory stays bounded and chunks are searchable as soon as
+    their batch lands. A new chunk that is a near-duplicate of another file's chunk is not
+    stored again, the file references the existing vector instead.
+    Returns a dict of added/shared/unchanged/removed chunk counts, or False if nothing could be
+    ingested. Progress is reported to the job if one is given.
+    """
+    with ingest_gate.shared():
+        return sync_file(file_path, job)
+
+def sync_file(file_path: str, job=None):
+    """The body of ingest_file_to_knowledge_base, for callers already holding the ingest gate"""
+    # Uploads, batch jobs and the folder watcher may all reach the same file at once
+    with file_locks.hold(os.path.basename(file_path)):
+        if not os.path.exists(file_path):
+            print(f"File not found: {file_path}")
+            return False
+
+        file_ext = os.path.splitext(file_path)[1].lower()
+        docs = iter_documents(file_path)
+        if docs is None:
+            print(f"Unsupported file type: {file_ext}")
+            return False
+
+        sync = FileSync(file_path)
+
+        pages = 0
+        def count_pages(docs):
+            nonlocal pages
+            for doc in docs:
+                pages += 1
+                if job:
+                    job.update(pages_parsed=pages)
+                yield doc
 
-    split_docs_list = split_docs(docs, chunk_size=500, chunk_overlap=100)
-    metadata = {
-        "id": id,
-        "name": name,
-        "file_type": file_ext
+        discovered = 0
+        params = splitter_params(file_path)
+        def new_chunks():
+            nonlocal discovered
+            for doc in iter_split_docs(count_pages(docs), chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, markdown=is_markdown(file_path)):
+                chunk_hash = hash_chunk(doc.page_content, params)
+                metadata = {**doc.metadata, **sync.metadata}
+                if sync.is_new_chunk(chunk_hash, metadata):
+                    discovered += 1
+                    yield sync, chunk_hash, doc.page_content, metadata
+
+        # Embed in batches so progress is visible and a cancel takes effect between batches
+        try:
+            for batch in batched(new_chunks(), INGEST_BATCH_SIZE):
+                if job:
+                    job.check_cancelled()
+                store_chunks(batch)
+                if job:
+                    # The total grows as the file is read, it is final once the job completes
+                    job.update(chunks_total=discovered, chunks_embedded=len(sync.added) + len(sync.shared))
+            if job:
+                job.check_cancelled()
+        except Exception:
+            sync.rollback()
+            raise
+
+        return sync.finish()
+
+def collect_files(paths: List[str], recursive: bool = True) -> List[str]:
+    """Expand directories into the supported files they contain, keeping the given order"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            walker = os.walk(path) if recursive else [(path, [], os.listdir(path))]
+            for root, _, names in walker:
+                files.extend(
+                    os.path.join(root, name) for name in sorted(names)
+                    if os.path.splitext(name)[1].lower() in LAZY_LOADERS and os.path.isfile(os.path.join(root, name))
+                )
+        elif os.path.isfile(path):
+            files.append(path)
+    return list(dict.fromkeys(files))
+
+def parse_pool():
+    """Processes for parsing files, threads where processes cannot be started.
+
+    Workers come from a fork server (spawned where that is unavailable), never forked from the
+    server itself: forking a process that runs executor, job and model threads copies locks
+    that other threads may be holding at that moment.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    try:
+        return ProcessPoolExecutor(INGEST_PARSE_PROCESSES, mp_context=multiprocessing.get_context(method))
+    except (OSError, ValueError, NotImplementedError) as e:
+        print(f"Parsing files in threads, worker processes are unavailable: {e}")
+        return ThreadPoolExecutor(INGEST_PARSE_PROCESSES)
+
+def ingest_files_to_knowledge_base(paths: List[str], job=None, recursive: bool = True) -> dict:
+    """Sync many files (or directories of files) at once.
+
+    Files are parsed, split and hashed in parallel processes; their new chunks are pooled and
+    embedded and written INGEST_BULK_BATCH_SIZE at a time regardless of which file they came
+    from, so thousands of small notes make a few large batches instead of thousands of small
+    ones. Files over INGEST_BULK_MAX_FILE_MB go through the streaming single-file path.
+    Returns per-file results and the throughput in chunks per second.
+    """
+    with ingest_gate.shared():
+        return sync_files(paths, job, recursive)
+
+def sync_files(paths: List[str], job=None, recursive: bool = True) -> dict:
+    """The body of ingest_files_to_knowledge_base, for callers already holding the ingest gate"""
+    files = collect_files(paths, recursive)
+    results = {}
+    # Files are keyed by name, so a second file with the same name would overwrite the first
+    names = {}
+    for path in files:
+        name = os.path.basename(path)
+        if name in names:
+            results[path] = {"error": f"Another file named {name} is already in this batch ({names[name]})"}
+        else:
+            names[name] = path
+    # Files can disappear between collection and now, a watched folder changes under us
+    large_bytes = INGEST_BULK_MAX_FILE_MB * 1024 * 1024
+    files, large, small = [], [], []
+    for path in names.values():
+        try:
+            size = os.stat(path).st_size
+        except OSError as e:
+            print(f"Error reading {path}: {e}")
+            results[path] = {"error": f"File could not be read: {e.strerror or e}"}
+            continue
+        files.append(path)
+        (large if size > large_bytes else small).append(path)
+
+    start = time.perf_counter()
+    syncs = []
+    pending = []
+    progress = {"files_total": len(files) + len(results), "files_parsed": 0, "chunks_total": 0, "chunks_embedded": 0}
+
+    def report():
+        if job:
+            elapsed = time.perf_counter() - start
+            job.update(**progress, chunks_per_second=round(progress["chunks_embedded"] / elapsed, 1) if elapsed else 0.0)
+
+    def flush(size: int):
+        while len(pending) >= size and pending:
+            if job:
+                job.check_cancelled()
+            batch = pending[:INGEST_BULK_BATCH_SIZE]
+            del pending[:INGEST_BULK_BATCH_SIZE]
+            store_chunks(batch)
+            progress["chunks_embedded"] += len(batch)
+            report()
+
+    # Several files are locked at once, always in one order, and released before the large files
+    with file_locks.hold(*(os.path.basename(path) for path in small)):
+        pool = parse_pool()
+        try:
+            # A bounded window of files in flight keeps parsed-but-unstored chunks in check
+            queued = iter(small)
+            in_flight = {}
+            def refill():
+                for path in itertools.islice(queued, INGEST_PARSE_PROCESSES * 4 - len(in_flight)):
+                    in_flight[pool.submit(parse_file, path, CHUNK_SIZE, CHUNK_OVERLAP, splitter_params(path))] = path
+            refill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                if job:
+                    job.check_cancelled()
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        _, chunks = future.result()
+                    except Exception as e:
+                        print(f"Error parsing {path}: {e}")
+                        results[path] = {"error": str(e)}
+                        continue
+                    sync = FileSync(path)
+                    syncs.append(sync)
+                    for chunk_hash, content, metadata in chunks:
+                        metadata = {**metadata, **sync.metadata}
+                        if sync.is_new_chunk(chunk_hash, metadata):
+                            pending.append((sync, chunk_hash, content, metadata))
+                            progress["chunks_total"] += 1
+                    progress["files_parsed"] += 1
+                refill()
+                flush(INGEST_BULK_BATCH_SIZE)
+            flush(1)
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            for sync in syncs:
+                sync.rollback()
+            raise
+        pool.shutdown()
+
+        for sync in syncs:
+            results[sync.path] = sync.finish() or {"error": "No documents were added to the knowledge base"}
+
+    for path in large:
+        if job:
+            job.check_cancelled()
+        try:
+            result = sync_file(path, job=job)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            print(f"Error ingesting {path}: {e}")
+            result = False
+            results[path] = {"error": str(e)}
+        else:
+            results[path] = result or {"error": "No documents were added to the knowledge base"}
+        if result:
+            progress["chunks_total"] += result["added"] + result["shared"]
+            progress["chunks_embedded"] += result["added"] + result["shared"]
+        progress["files_parsed"] += 1
+        report()
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results.values() if "error" in result)
+    summary = {
+        "files": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "chunks_embedded": progress["chunks_embedded"],
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": round(progress["chunks_embedded"] / elapsed, 1) if elapsed else 0.0,
+        "results": results,
     }
+    print(f"Batch ingested {summary['succeeded']}/{summary['files']} files, {summary['chunks_embedded']} chunks at {summary['chunks_per_second']} chunks/s")
+    return summary
 
-    if split_docs_list:
-        # Add metadata to each document chunk
-        for doc in split_docs_list:
-            doc.metadata.update(metadata)
-        
-        vector_store.add_documents(split_docs_list)
-        print(f"Added {len(split_docs_list)} document chunks to knowledge base")
-    else:
-        print("No documents were added to the knowledge base")
-        return False
-    return True
+def is_upload(path: str) -> bool:
+    """Only copies made by the upload endpoint are ours to delete, not files ingested in place"""
+    upload_dir = os.path.realpath(UPLOAD_DIR)
+    return os.path.commonpath([upload_dir, os.path.realpath(path)]) == upload_dir
+
+def purge_file_data(file_id: str, path: str, remove_copy: bool = True) -> dict:
+    """Remove a file's chunk index rows, vectors, keyword entries and uploaded copy, then its row.
+
+    Every step is idempotent, so a purge interrupted part way is simply run again.
+    """
+    chunk_ids = list(get_file_chunks(file_id).values())
+    owned_ids = vector_store.get(where={"id": file_id}, include=[])["ids"]
+    delete_file_chunks(file_id)
+    vector_ids = list(dict.fromkeys(chunk_ids + owned_ids))
+    release_vectors(file_id, vector_ids)
+    bm25_index.delete_file_index(file_id)
+    answer_cache.invalidate_files([file_id])
 
-def create_retriever(file_ids: List[str] = None):
-    """Create a retriever from the files referenced"""
-    if file_ids:
+    removed_bytes = 0
+    if remove_copy and path and os.path.isfile(path) and is_upload(path):
+        removed_bytes = os.path.getsize(path)
+        os.remove(path)
+
+    purge_file(file_id)
+    return {"file_id": file_id, "chunks_released": len(vector_ids), "bytes_removed": removed_bytes}
+
+def delete_file_from_knowledge_base(file_name: str):
+    """Delete a file from the files table, the vector store, the indexes and disk.
+
+    The row is tombstoned first, so the file disappears from listings and file-scoped retrieval
+    at once. If a later step fails the tombstone stays behind and compact_knowledge_base (or
+    re-ingesting the same name) finishes the job. Returns None if there is no such file.
+    """
+    with ingest_gate.shared(), file_locks.hold(file_name):
+        record = mark_file_deleted(file_name)
+        if record is None:
+            return None
+        id, path = record
+        result = purge_file_data(id, path)
+    print(f"Deleted {file_name}: {result['chunks_released']} chunks released, {result['bytes_removed']} bytes removed")
+    return result
+
+def directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def storage_usage() -> int:
+    index_files = [CHUNK_INDEX_FILE + suffix for suffix in ("", "-wal", "-shm")]
+    return sum(directory_size(path) for path in [CHROMA_DB_FILE, UPLOAD_DIR] + index_files if os.path.exists(path))
+
+def compact_knowledge_base(keep_paths: Callable[[], Iterable[str]] = tuple, page_size: int = 1000) -> dict:
+    """Garbage-collect everything left behind by past deletes and report what was reclaimed.
+
+    Finishes tombstoned deletes, then removes chunk index rows of unknown files, vectors that no
+    live file owns or references, keyword entries without a vector and uploaded copies without a
+    file row. keep_paths returns the uploads still queued for ingestion; it is called when the
+    upload directory is swept, and files written after compaction started are never removed.
+    Ingests and deletes wait while it runs, and it waits for those already running.
+    """
+    with ingest_gate.exclusive():
+        return compact(keep_paths, page_size)
+
+def compact(keep_paths: Callable[[], Iterable[str]] = tuple, page_size: int = 1000) -> dict:
+    """The body of compact_knowledge_base, for callers already holding the ingest gate alone"""
+    started = time.time()
+    bytes_before = storage_usage()
+    vectors_before = vector_store.count()
+
+    deleted = get_deleted_files()
+    for file_id, _, path in deleted:
+        purge_file_data(file_id, path)
+
+    live = {file_id: path for file_id, _, path in get_files()}
+
+    orphan_files = get_indexed_file_ids() - live.keys()
+    for file_id in orphan_files:
+        vector_ids = list(get_file_chunks(file_id).values())
+        delete_file_chunks(file_id)
+        release_vectors(file_id, vector_ids)
+
+    # Collect first, deleting while paging would shift the offsets
+    stored_ids = set()
+    orphan_vectors = []
+    offset = 0
+    while True:
+        stored = vector_store.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not stored["ids"]:
+            break
+        for vector_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            stored_ids.add(vector_id)
+            if (metadata or {}).get("id") not in live:
+                orphan_vectors.append(vector_id)
+        offset += len(stored["ids"])
+    referencing = get_vector_files(orphan_vectors) if orphan_vectors else {}
+    orphan_vectors = [vector_id for vector_id in orphan_vectors if not referencing[vector_id]]
+    for start in range(0, len(orphan_vectors), page_size):
+        vector_store.delete(ids=orphan_vectors[start:start + page_size])
+    stored_ids.difference_update(orphan_vectors)
+
+    # Local ANN indexes are rebuilt once deleted entries make up a large share of them
+    vector_store.optimize()
+
+    orphan_entries = list(bm25_index.get_vector_ids() - stored_ids)
+    bm25_index.remove_chunks(orphan_entries)
+
+    uploads_removed = 0
+    if os.path.isdir(UPLOAD_DIR):
+        # Read again now, uploads queued or ingested since compaction started are kept
+        known = {os.path.realpath(path) for _, _, path in get_files()}
+        known.update(os.path.realpath(path) for path in keep_paths())
+        for name in os.listdir(UPLOAD_DIR):
+            path = os.path.join(UPLOAD_DIR, name)
+            if not os.path.isfile(path) or os.path.realpath(path) in known:
+                continue
+            # Written after compaction started, possibly not queued yet
+            if os.path.getmtime(path) >= started:
+                continue
+            os.remove(path)
+            uploads_removed += 1
+
+    vacuum_chunk_index()
+    bytes_after = storage_usage()
+    result = {
+        "deletes_finished": len(deleted),
+        "orphan_files": len(orphan_files),
+        "vectors_removed": len(orphan_vectors),
+        "keyword_entries_removed": len(orphan_entries),
+        "uploads_removed": uploads_removed,
+        "index_size_before": vectors_before,
+        "index_size_after": vector_store.count(),
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": max(0, bytes_before - bytes_after),
+    }
+    print(f"Compacted knowledge base: {result}")
+    return result
+
+def create_retriever(file_ids: List[str] = None, mode: str = RETRIEVER_MODE, k: int = None):
+    """Create a retriever from the files referenced, k overrides the number of chunks returned"""
+    where = file_filter(file_ids) if file_ids else None
+    if mode == "hybrid":
+        retriever = HybridRetriever(
+            vector_store=vector_store,
+            file_ids=file_ids or None,
+            where=where,
+            k=k or HYBRID_K,
+            fetch_k=max(HYBRID_FETCH_K, k or 0),
+            rrf_k=RRF_K,
+        )
+    elif file_ids:
         retriever = vector_store.as_retriever(
             search_type="similarity",
             search_kwargs={
-                "k": 2 * len(file_ids),
-                "filter": {
-                    "id": {"$in": file_ids}
-                }
+                "k": k or 2 * len(file_ids),
+                "filter": where
             }
         )
     else:
         retriever = vector_store.as_retriever(
             search_type="similarity",
-            search_kwargs={"k": 2}
+            search_kwargs={"k": k or 2}
         )
-    return retriever
\ No newline at end of file
+    if NEAR_DUPLICATE_THRESHOLD:
+        retriever = NearDuplicateFilter(retriever=retriever, vector_store=vector_store, threshold=NEAR_DUPLICATE_THRESHOLD)
+    return retriever
@@ -0,0 +1,293 @@
+"""
+Watch-folder sync: keeps the knowledge base in step with files in configured directories
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from fastapi import HTTPException
+from config import WATCH_DIRS, WATCH_STATE_FILE, WATCH_DEBOUNCE_SECONDS, WATCH_POLL_SECONDS, WATCH_USE_EVENTS
+from core.db import get_connection
+
+CREATE_WATCHED_FILES = """
+    CREATE TABLE IF NOT EXISTS watched_files (
+        path TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        hash TEXT NOT NULL,
+        synced_at TIMESTAMP NOT NULL
+    )
+"""
+SELECT_WATCHED_FILES = "SELECT path, mtime_ns, size FROM watched_files"
+SELECT_WATCHED_FILE = "SELECT mtime_ns, size, hash FROM watched_files WHERE path = ?"
+SELECT_PATH_BY_NAME = "SELECT path FROM watched_files WHERE name = ? AND path != ?"
+UPSERT_WATCHED_FILE = """
+    INSERT INTO watched_files (path, name, mtime_ns, size, hash, synced_at) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(path) DO UPDATE SET
+        mtime_ns = excluded.mtime_ns,
+        size = excluded.size,
+        hash = excluded.hash,
+        synced_at = excluded.synced_at
+"""
+DELETE_WATCHED_FILE = "DELETE FROM watched_files WHERE path = ?"
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def is_temporary(name: str) -> bool:
+    """Editor swap files, lock files and partial downloads are never synced"""
+    return name.startswith((".", "~$")) or name.endswith(("~", ".tmp", ".part", ".crdownload"))
+
+class FolderWatcher:
+    """Syncs changed files in the watched directories through the normal ingestion path.
+
+    Changes are reported by file system events (watchdog, inotify on Linux) or, when that is not
+    installed or WATCH_USE_EVENTS is off, by rescanning every WATCH_POLL_SECONDS. A changed path
+    waits until it has been quiet for WATCH_DEBOUNCE_SECONDS so a burst of writes is synced once.
+    The mtime, size and content hash of every synced file are checkpointed in SQLite: a file whose
+    stat is unchanged is skipped without being read, one that was only touched is skipped after
+    hashing, so a restart only re-ingests what changed while the server was down.
+    """
+
+    def __init__(self, directories: list, state_file: str = WATCH_STATE_FILE,
+                 debounce_seconds: float = WATCH_DEBOUNCE_SECONDS, poll_seconds: float = WATCH_POLL_SECONDS,
+                 use_events: bool = WATCH_USE_EVENTS, extensions=None, ingest=None, delete=None):
+        self.directories = [os.path.abspath(directory) for directory in directories]
+        self.state_file = state_file
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self.use_events = use_events
+        self.extensions = extensions
+        self.ingest = ingest
+        self.delete = delete
+        self.mode = None
+        self._pending = {}           # path -> time of its latest change
+        self._rescan = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._counts = {"ingested": 0, "unchanged": 0, "deleted": 0, "skipped": 0, "failed": 0}
+        self._last_error = None
+
+    def connect(self):
+        return get_connection(self.state_file)
+
+    def init_state(self):
+        try:
+            with self.connect() as conn:
+                conn.execute(CREATE_WATCHED_FILES)
+        except Exception as e:
+            print(f"Error in init_state: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    def _resolve_defaults(self):
+        # Imported here so that importing this module does not load the embedding model
+        if self.extensions is None:
+            from core.document_loader import LAZY_LOADERS
+            self.extensions = set(LAZY_LOADERS)
+        if self.ingest is None:
+            from core.vector_store import ingest_file_to_knowledge_base
+            self.ingest = ingest_file_to_knowledge_base
+        if self.delete is None:
+            from core.vector_store import delete_file_from_knowledge_base
+            self.delete = delete_file_from_knowledge_base
+
+    def is_watched(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return not is_temporary(name) and os.path.splitext(name)[1].lower() in self.extensions
+
+    def start(self):
+        """Sync whatever changed since the last checkpoint, then keep watching in the background"""
+        if self._thread is not None:
+            return
+        self.init_state()
+        self._resolve_defaults()
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+        self._stop.clear()
+        self.mode = self._start_observer() if self.use_events else "polling"
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+        print(f"Watching {', '.join(self.directories)} ({self.mode})")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _start_observer(self) -> str:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return "polling"
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    # A moved or removed directory does not report its files, rescan instead
+                    if event.event_type in ("moved", "deleted"):
+                        watcher.request_rescan()
+                    return
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path and event.event_type != "opened":
+                        watcher.notify(os.fsdecode(path))
+
+        self._observer = Observer()
+        for directory in self.directories:
+            self._observer.schedule(Handler(), directory, recursive=True)
+        self._observer.start()
+        return "events"
+
+    def notify(self, path: str):
+        """Record a change, the path is synced once it has been quiet for the debounce period"""
+        path = os.path.abspath(path)
+        if not self.is_watched(path):
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic()
+        self._wakeup.set()
+
+    def request_rescan(self):
+        with self._lock:
+            self._rescan = True
+        self._wakeup.set()
+
+    def scan(self) -> int:
+        """Queue every file whose stat differs from the checkpoint, and every checkpointed file
+        that is gone. Returns the number of paths queued."""
+        checkpoint = {path: (mtime_ns, size) for path, mtime_ns, size in self.connect().execute(SELECT_WATCHED_FILES)}
+        changed = []
+        for directory in self.directories:
+            for root, dirs, names in os.walk(directory):
+                dirs[:] = [name for name in dirs if not name.startswith(".")]
+                for name in names:
+                    path = os.path.join(root, name)
+                    if not self.is_watched(path):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if checkpoint.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                        changed.append(path)
+        # What is left in the checkpoint was not found on disk
+        changed.extend(path for path in checkpoint if any(
+            path.startswith(os.path.join(directory, "")) for directory in self.directories))
+
+        now = time.monotonic()
+        with self._lock:
+            for path in changed:
+                self._pending.setdefault(path, now)
+        return len(changed)
+
+    def process_due(self, now: float = None) -> int:
+        """Sync the pending paths that have been quiet long enough, returning how many were synced"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [path for path, changed_at in self._pending.items() if now - changed_at >= self.debounce_seconds]
+            for path in due:
+                del self._pending[path]
+        for path in due:
+            self.sync_path(path)
+        return len(due)
+
+    def sync_path(self, path: str) -> str:
+        """Bring one path's knowledge base entry in line with the file on disk"""
+        name = os.path.basename(path)
+        try:
+            record = self.connect().execute(SELECT_WATCHED_FILE, (path,)).fetchone()
+            if not os.path.isfile(path):
+                if record is None:
+                    return self._count("skipped")
+                self.delete(name)
+                with self.connect() as conn:
+                    conn.execute(DELETE_WATCHED_FILE, (path,))
+                print(f"Watcher removed {name}")
+                return self._count("deleted")
+
+            stat = os.stat(path)
+            if record and (record[0], record[1]) == (stat.st_mtime_ns, stat.st_size):
+                return self._count("unchanged")
+            digest = hash_file(path)
+            if record is None or record[2] != digest:
+                # File names are unique in the knowledge base, the first watched path keeps the name
+                other = self.connect().execute(SELECT_PATH_BY_NAME, (name, path)).fetchone()
+                if other and os.path.exists(other[0]):
+                    print(f"Watcher skipped {path}: {name} is already synced from {other[0]}")
+                    return self._count("skipped")
+                # An empty or unreadable file is checkpointed as well, so it is not retried until it changes.
+                # Ingests and deletes lock the file by name, so an upload or batch job syncing the
+                # same file at the same time waits for this one
+                self.ingest(path)
+                status = "ingested"
+            else:
+                status = "unchanged"
+            with self.connect() as conn:
+                conn.execute(UPSERT_WATCHED_FILE, (
+                    path, name, stat.st_mtime_ns, stat.st_size, digest, datetime.now().isoformat()))
+            return self._count(status)
+        except Exception as e:
+            # Not checkpointed, the next change or restart tries again
+            print(f"Error in sync_path {path}: {e}")
+            self._last_error = f"{path}: {e}"
+            return self._count("failed")
+
+    def _count(self, status: str) -> str:
+        self._counts[status] += 1
+        return status
+
+    def _run(self):
+        self.scan()
+        last_scan = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                rescan, self._rescan = self._rescan, False
+            if rescan or (self.mode == "polling" and now - last_scan >= self.poll_seconds):
+                self.scan()
+                last_scan = now
+            self.process_due()
+
+            with self._lock:
+                oldest = min(self._pending.values(), default=None)
+            timeout = self.poll_seconds if self.mode == "polling" else None
+            if oldest is not None:
+                due_in = max(0.0, oldest + self.debounce_seconds - time.monotonic())
+                timeout = due_in if timeout is None else min(timeout, due_in)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        tracked = self.connect().execute("SELECT COUNT(*) FROM watched_files").fetchone()[0] if self.mode else 0
+        return {
+            "directories": self.directories,
+            "mode": self.mode,
+            "running": self._thread is not None,
+            "tracked_files": tracked,
+            "pending": pending,
+            **self._counts,
+            "last_error": self._last_error,
+        }
+
+
+folder_watcher = FolderWatcher(WATCH_DIRS)
@@ -0,0 +1,44 @@
+"""
+Command line batch ingestion, for importing folders of notes without going through the server
+
+Usage: python ingest.py PATH [PATH ...] [--no-recursive] [--processes N] [--batch-size N]
+"""
+
+import argparse
+import json
+import os
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest files and directories into the knowledge base")
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subdirectories")
+    parser.add_argument("--processes", type=int, help="parallel file parsers (INGEST_PARSE_PROCESSES)")
+    parser.add_argument("--batch-size", type=int, help="chunks embedded per batch (INGEST_BULK_BATCH_SIZE)")
+    parser.add_argument("--json", action="store_true", help="print the full per-file result as JSON")
+    args = parser.parse_args()
+
+    # Settings are read from the environment when config is first imported
+    if args.processes:
+        os.environ["INGEST_PARSE_PROCESSES"] = str(args.processes)
+    if args.batch_size:
+        os.environ["INGEST_BULK_BATCH_SIZE"] = str(args.batch_size)
+
+    from core.knowledge_base import init_db
+    from core.vector_store import ingest_files_to_knowledge_base
+
+    init_db()
+    summary = ingest_files_to_knowledge_base(args.paths, recursive=not args.no_recursive)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    for path, result in summary["results"].items():
+        if "error" in result:
+            print(f"  failed  {path}: {result['error']}")
+    print(
+        f"{summary['succeeded']}/{summary['files']} files, {summary['chunks_embedded']} chunks "
+        f"in {summary['seconds']}s ({summary['chunks_per_second']} chunks/s)"
+    )
+
+# ---------- Main Entrypoint ----------
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,25 @@
 FastAPI route definitions
 """
 
-from fastapi import APIRouter, HTTPException, Body, UploadFile, File
-from fastapi.responses import StreamingResponse
-import sqlite3
-from config import CHAT_HISTORY_DB_FILE
-import uuid
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, Response
+from typing import Optional
 import json
-from core.knowledge_base import save_message, delete_file, get_files, get_file
+import os
+from core import knowledge_base
 from core.chain import chat_stream
-from core.vector_store import create_retriever, ingest_file_to_knowledge_base
+from core.llm import inference_scheduler, llm_pool
+from core.prompt_cache import prompt_cache_stats
+from core.reranker import reranker
+from core.answer_cache import answer_cache
+from core.streaming import coalesce_events, format_event
+from core.metrics import Gauge, render_metrics, CONTENT_TYPE
+from core.executor import run_in_executor, db_executor, retrieval_executor
+from core.lazy import component_status, FAILED, READY
+from core.vector_store import vector_store, create_retriever, delete_file_from_knowledge_base, compact_knowledge_base, collect_files
+from core.jobs import job_manager, FINISHED_STATES
+from core.watcher import folder_watcher
+from config import INGEST_DEFAULT_PRIORITY, LLM_DEFAULT_PRIORITY, HISTORY_PAGE_MAX, RETRIEVER_MODE, RERANK_ENABLED, RERANK_CANDIDATES, UPLOAD_DIR
 
 router = APIRouter()
 
@@ -22,50 +31,91 @@ def ping():
 
 @router.get("/health")
 def health():
-    """Health check endpoint"""
-    return {"ok": True, "status": "healthy"}
+    """Health check endpoint. The server is up as soon as this answers; status is "starting"
+    until the models and vector store have loaded, and "degraded" if one of them failed"""
+    components = component_status()
+    states = {component["state"] for component in components.values()}
+    if FAILED in states:
+        status = "degraded"
+    elif states <= {READY}:
+        status = "healthy"
+    else:
+        status = "starting"
+    return {"ok": True, "status": status, "components": components}
 
 @router.post("/chat/{chat_id}")
-async def chat_endpoint(chat_id: str, request: dict = Body(...)):
+async def chat_endpoint(chat_id: str, http_request: Request, request: dict = Body(...)):
     """Chat endpoint"""
     try:
         message = request.get("message")
         files = request.get("files", [])
+        priority = request.get("priority", LLM_DEFAULT_PRIORITY)
+        retriever_mode = request.get("retriever_mode", RETRIEVER_MODE)
+        rerank = request.get("rerank", RERANK_ENABLED)
 
-        files_referenced = [get_file(file) for file in files] if files else []
+        files_referenced = [await run_in_executor(db_executor, knowledge_base.get_file, file) for file in files] if files else []
 
         retriever = None
         if files_referenced:
-            retriever = create_retriever(files_referenced)
+            # Reranking over-fetches candidates and keeps the best few
+            # Off the event loop, the first retriever opens the vector store
+            retriever = await run_in_executor(
+                retrieval_executor, create_retriever, files_referenced, retriever_mode, RERANK_CANDIDATES if rerank else None
+            )
 
-        # Invoke the graph
+        # Typed server-sent events: context, token (coalesced), then final, or error
         async def generate_stream():
-                try:
-                    async for chunk in chat_stream(chat_id, message, retriever):
-                        if isinstance(chunk, str):
-                            yield chunk
-                    # End of stream
-                except Exception as e:
-                    print(f"Error in chat stream: {e}")
-                    yield f"Error: {str(e)}"
-                yield "\n[END]"
+            events = coalesce_events(chat_stream(chat_id, message, retriever, priority, rerank), http_request.is_disconnected)
+            try:
+                async for event, data in events:
+                    yield format_event(event, data)
+            except Exception as e:
+                print(f"Error in chat stream: {e}")
+                yield format_event("error", {"message": str(e)})
+            finally:
+                await events.aclose()
         return StreamingResponse(
-            generate_stream(), 
+            generate_stream(),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
+                # Proxies must not buffer the stream
+                "X-Accel-Buffering": "no",
             }
         )
     except Exception as e:
         print(f"Error in chat stream endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Read at scrape time; an unopened vector store is left out rather than opened
+Gauge("vector_store_chunks", "Chunk vectors in the vector store", lambda: vector_store.count() if vector_store.is_ready else None)
+Gauge("llm_queue_depth", "Chat and summary requests waiting for a model", lambda: inference_scheduler.queue_depth)
+Gauge("llm_active_generations", "Generations running now", lambda: inference_scheduler.active)
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus metrics for requests, retrieval, generation, embeddings, ingestion and SQLite"""
+    # Counting vectors queries the store, keep it off the event loop
+    body = await run_in_executor(db_executor, render_metrics)
+    return Response(content=body, media_type=CONTENT_TYPE)
+
+@router.get("/llm/stats")
+async def llm_stats():
+    """Inference queue depth, concurrency, wait-time, prompt cache, reranker and answer cache metrics"""
+    return {
+        **inference_scheduler.stats(),
+        # Not loaded yet means no cache to report, asking must not load the model
+        "prompt_cache": prompt_cache_stats(llm_pool) if llm_pool.is_ready else [],
+        "reranker": reranker.stats(),
+        "answer_cache": answer_cache.stats(),
+    }
+
 # Chat History Routes
 @router.post("/chats/{chat_id}/messages")
 async def add_message(chat_id: str, message_data: dict = Body(...)):
     """Add a message to a chat"""
     try: 
-        save_message(chat_id, message_data["role"], message_data["content"])
+        await run_in_executor(db_executor, knowledge_base.save_message, chat_id, message_data["role"], message_data["content"])
         return {"message_id": message_data["id"]}
     except Exception as e:
         print(f"Error in add_message endpoint: {e}")
@@ -75,77 +125,90 @@ async def add_message(chat_id: str, message_data: dict = Body(...)):
 async def create_chat(chat_title: str):
     """Create a new chat"""
     try:
-        chat_id = str(uuid.uuid4())
-        now = datetime.now().isoformat()
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO chats (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
-                (chat_id, chat_title, now, now)
-            )
-            conn.commit()
-        return {
-            "id": chat_id, 
-            "title": chat_title,
-            "created_at": now,
-            "updated_at": now
-        }
+        return await run_in_executor(db_executor, knowledge_base.create_chat, chat_title)
     except Exception as e:
         print(f"Error in create_chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
+def chat_to_dict(row):
+    return {
+        "id": row[0],
+        "title": row[1],
+        "created_at": row[2],
+        "updated_at": row[3]
+    }
+
+def message_to_dict(row):
+    return {
+        "id": row[0],
+        "chat_id": row[1],
+        "role": row[2],
+        "content": row[3],
+        "timestamp": row[4],
+        "user_id": "user" if row[2] == "user" else "assistant"
+    }
+
+def paginated_response(items, oldest_row, newest_row, key_index):
+    """JSON list plus cursors for the neighbouring pages: pass X-Before-Cursor as `before` for
+    older rows and X-After-Cursor as `after` for newer ones"""
+    headers = {}
+    if items:
+        headers["X-Before-Cursor"] = knowledge_base.encode_cursor(oldest_row[key_index], oldest_row[0])
+        headers["X-After-Cursor"] = knowledge_base.encode_cursor(newest_row[key_index], newest_row[0])
+    return JSONResponse(content=items, headers=headers)
+
+def ndjson_response(rows, to_dict):
+    """Stream rows as newline-delimited JSON without materializing them"""
+    return StreamingResponse(
+        (json.dumps(to_dict(row)) + "\n" for row in rows),
+        media_type="application/x-ndjson",
+    )
+
 @router.get("/chats")
-async def get_chats():
-    """Get all chats"""
+async def get_chats(
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Get chats, most recently updated first. Pass limit/before/after for keyset pagination,
+    or format=ndjson to stream every chat"""
     try:
-        conn = sqlite3.connect(CHAT_HISTORY_DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, title, created_at, updated_at FROM chats ORDER BY updated_at DESC")
-        rows = cursor.fetchall()
-        conn.close()
-        
-        # Convert database rows to proper Chat objects
-        chats = []
-        for row in rows:
-            chat = {
-                "id": row[0],
-                "title": row[1], 
-                "created_at": row[2],
-                "updated_at": row[3]
-            }
-            chats.append(chat)
-        
-        return chats
+        if format == "ndjson":
+            return ndjson_response(knowledge_base.iter_chats(before, after), chat_to_dict)
+
+        rows = await run_in_executor(db_executor, knowledge_base.get_chats, limit, before, after)
+        chats = [chat_to_dict(row) for row in rows]
+        if limit is None:
+            return chats
+        return paginated_response(chats, rows[-1] if rows else None, rows[0] if rows else None, 3)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_chats endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/chats/{chat_id}")
-async def get_chat(chat_id: str):
-    """Get specific chat with messages"""
+async def get_chat(
+    chat_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_PAGE_MAX),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    """Get a chat's messages, oldest first. With a limit the newest page is returned; pass
+    before/after for keyset pagination, or format=ndjson to stream the whole history"""
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-            "SELECT id, chat_id, role, content, timestamp FROM chat_messages WHERE chat_id = ? ORDER BY timestamp ASC",
-            (chat_id,)
-            )
-            rows = cursor.fetchall()
-        
-        # Convert database rows to proper Message objects
-        messages = []
-        for row in rows:
-            message = {
-                "id": row[0],
-                "chat_id": row[1],
-                "role": row[2],
-                "content": row[3],
-                "timestamp": row[4],
-                "user_id": "user" if row[2] == "user" else "assistant"
-            }
-            messages.append(message)
-        
-        return messages
+        if format == "ndjson":
+            return ndjson_response(knowledge_base.iter_chat_messages(chat_id, before, after), message_to_dict)
+
+        rows = await run_in_executor(db_executor, knowledge_base.get_chat_messages, chat_id, limit, before, after)
+        messages = [message_to_dict(row) for row in rows]
+        if limit is None:
+            return messages
+        return paginated_response(messages, rows[0] if rows else None, rows[-1] if rows else None, 4)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -154,11 +217,7 @@ async def get_chat(chat_id: str):
 async def delete_chat(chat_id: str):
     """Delete a chat and all its messages"""
     try:
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
-            cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
-            conn.commit()
+        await run_in_executor(db_executor, knowledge_base.delete_chat, chat_id)
         return {"message": "Chat deleted successfully"}
     except Exception as e:
         print(f"Error in delete_chat endpoint: {e}")
@@ -169,10 +228,7 @@ async def update_chat_title(chat_id: str, request: dict = Body(...)):
     """Update the title of a chat"""
     try:
         new_title = request.get("title")
-        with sqlite3.connect(CHAT_HISTORY_DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE chats SET title = ? WHERE id = ?", (new_title, chat_id))
-            conn.commit()
+        await run_in_executor(db_executor, knowledge_base.update_chat_title, chat_id, new_title)
         return {"message": "Chat title updated successfully"}
     except Exception as e:
         print(f"Error in update_chat_title endpoint: {e}")
@@ -180,11 +236,11 @@ async def update_chat_title(chat_id: str, request: dict = Body(...)):
 
 # Knowledge Base Routes
 @router.post("/files/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file and add it to the knowledge base"""
+async def upload_file(file: UploadFile = File(...), priority: int = INGEST_DEFAULT_PRIORITY):
+    """Upload a file and queue it for ingestion into the knowledge base"""
     try:
         # Check file type
-        allowed_types = ['.pdf', '.txt', '.csv', '.md']
+        allowed_types = ['.pdf', '.txt', '.csv', '.md', '.markdown']
         file_extension = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
         
         if file_extension not in allowed_types:
@@ -197,32 +253,87 @@ async def upload_file(file: UploadFile = File(...)):
         content = await file.read()
         
         # Save file to files directory
-        import os
-        files_dir = os.path.join(os.path.dirname(__file__), "files")
-        os.makedirs(files_dir, exist_ok=True)
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
         
-        file_path = os.path.join(files_dir, file.filename)
+        file_path = os.path.join(UPLOAD_DIR, file.filename)
         with open(file_path, "wb") as f:
             f.write(content)
         
-        # Ingest file into knowledge base
-        ingest_file_to_knowledge_base(file_path)
+        # Queue ingestion into the knowledge base
+        job = job_manager.submit(file_path, priority)
         
         return {
-            "message": "File uploaded and added to knowledge base successfully",
+            "message": "File uploaded and queued for ingestion",
             "filename": file.filename,
-            "file_path": file_path
+            "file_path": file_path,
+            "job_id": job.id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in upload_file endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/files/batch")
+async def ingest_files(request: dict = Body(...)):
+    """Queue many files and directories for ingestion as one batch job.
+
+    Body: {"paths": [...], "recursive": true, "priority": 10}. Chunks from all files are embedded
+    and written together; the job's progress includes the throughput in chunks per second.
+    """
+    try:
+        paths = request.get("paths") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        recursive = request.get("recursive", True)
+        priority = request.get("priority", INGEST_DEFAULT_PRIORITY)
+
+        files = await run_in_executor(db_executor, collect_files, paths, recursive)
+        if not files:
+            raise HTTPException(status_code=400, detail="No supported files found in the given paths")
+
+        job = job_manager.submit(", ".join(paths), priority, file_paths=files)
+        return {"message": "Files queued for ingestion", "job_id": job.id, "file_count": len(files)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in ingest_files endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def pending_paths() -> list:
+    """Files of unfinished jobs; uploads waiting for ingestion have no file row yet and must survive compaction"""
+    pending = []
+    for job in job_manager.list():
+        if job.status not in FINISHED_STATES:
+            pending += job.file_paths if job.file_paths is not None else [job.file_path]
+    return pending
+
+@router.post("/files/compact")
+async def compact_files():
+    """Purge vectors, index entries and stored copies left behind by deleted files"""
+    try:
+        return await run_in_executor(db_executor, compact_knowledge_base, pending_paths)
+    except Exception as e:
+        print(f"Error in compact_files endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/files/watch")
+async def watch_status():
+    """Watched directories, files tracked by the sync checkpoint and sync counts"""
+    try:
+        return await run_in_executor(db_executor, folder_watcher.stats)
+    except Exception as e:
+        print(f"Error in watch_status endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/files/{file_path}")
-async def ingest_file(file_path: str):
-    """Add a file to the knowledge base"""
+async def ingest_file(file_path: str, priority: int = INGEST_DEFAULT_PRIORITY):
+    """Queue a file for ingestion into the knowledge base"""
     try:
-        ingest_file_to_knowledge_base(file_path)
-        return {"message": "File added to knowledge base successfully"}
+        job = job_manager.submit(file_path, priority)
+        return {"message": "File queued for ingestion", "job_id": job.id}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in add_file endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -231,7 +342,7 @@ async def ingest_file(file_path: str):
 async def get_files_endpoint():
     """Get all files in the knowledge base"""
     try:
-        files = get_files()
+        files = await run_in_executor(db_executor, knowledge_base.get_files)
         # Convert tuples to dictionaries for better JSON serialization
         file_list = []
         for file_tuple in files:
@@ -246,12 +357,40 @@ async def get_files_endpoint():
         print(f"Error in get_files endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Ingestion Job Routes
+@router.get("/jobs")
+async def get_jobs():
+    """List queued, running and recently finished ingestion jobs"""
+    return [job.to_dict() for job in job_manager.list()]
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and progress of an ingestion job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running ingestion job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return {"message": "Job cancellation requested", "job": job.to_dict()}
+
 @router.delete("/files/{file_name}")
 async def delete_file(file_name: str):
-    """Delete a file from the knowledge base"""
+    """Delete a file from the knowledge base along with its vectors and stored copy"""
     try:
-        delete_file(file_name)
-        return {"message": "File deleted from knowledge base successfully"}
+        result = await run_in_executor(db_executor, delete_file_from_knowledge_base, file_name)
+        if result is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        return {"message": "File deleted from knowledge base successfully", **result}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in delete_file endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
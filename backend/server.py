@@ -5,8 +5,15 @@ FastAPI server for LLM
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router
-from config import HOST, PORT, CORS_ORIGINS
+from config import HOST, PORT, CORS_ORIGINS, WATCH_DIRS, WARM_UP_ON_STARTUP
 from core.knowledge_base import init_db
+from core.watcher import folder_watcher
+from core.embeddings import embeddings
+from core.vector_store import vector_store
+from core.llm import inference_scheduler
+from core.lazy import start_warm_up
+from core.tracing import start_tracing, stop_tracing
+from core.metrics import RequestMetricsMiddleware
 
 # Initialize FastAPI app
 app = FastAPI(title="Second Brain Server", version="0.1.0")
@@ -17,11 +24,29 @@ app.add_middleware(
     allow_origins=CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Before-Cursor", "X-After-Cursor"],
 )
 
+# Latency per route for /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Include routes
 app.include_router(router)
 
+@app.on_event("startup")
+def warm_up():
+    start_tracing()
+    # Requests are served while this runs; /health reports each component as it becomes ready
+    if WARM_UP_ON_STARTUP:
+        start_warm_up([embeddings.resolve, vector_store.resolve, inference_scheduler.prepare])
+    if WATCH_DIRS:
+        folder_watcher.start()
+
+@app.on_event("shutdown")
+def shut_down():
+    folder_watcher.stop()
+    stop_tracing()
+
 # ---------- Main Entrypoint ----------
 if __name__ == "__main__":
     import uvicorn
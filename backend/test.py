@@ -66,6 +66,8 @@ async def test_vector_store():
         
         async for chunk in chat_stream("rag_test", query, retriever):
             if isinstance(chunk, dict):
+                if chunk["type"] != "final":
+                    continue
                 # Final response received
                 end_time = time.time()
                 total_time = end_time - start_time
@@ -90,6 +92,8 @@ async def test_vector_store():
     print(f"📝 Final response: \n")
     async for chunk in chat_stream("no_rag_test", non_retrieval_query, None):
         if isinstance(chunk, dict):
+            if chunk["type"] != "final":
+                continue
             # Final response received
             end_time = time.time()
             total_time = end_time - start_time
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the local ANN vector store with the exact index: filters, metadata updates, deletes and reload
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from core.ann_store import LocalANNStore, matches_where, merge_metadata
+
+WORDS = ["billing", "deploy", "search", "backup"]
+
+class BagOfWordsEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.count(word)) + 0.01 for word in WORDS]
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalANNStore(BagOfWordsEmbeddings(), str(tmp_path / "ann"), "flat")
+    store.add_texts(
+        ["billing billing", "deploy steps", "search tuning", "deploy and search"],
+        metadatas=[{"id": "f1"}, {"id": "f1"}, {"id": "f2"}, {"id": "f2"}],
+        ids=["f1:a", "f1:b", "f2:a", "f2:b"],
+    )
+    return store
+
+def test_matches_where():
+    metadata = {"id": "f1", "ref_f2": True}
+    assert matches_where(metadata, {"id": "f1"})
+    assert matches_where(metadata, {"$or": [{"id": {"$in": ["f3"]}}, {"ref_f2": {"$eq": True}}]})
+    assert not matches_where(metadata, {"id": {"$ne": "f1"}})
+    assert merge_metadata(metadata, {"ref_f2": None, "ref_f3": True}) == {"id": "f1", "ref_f3": True}
+
+def test_similarity_search_with_filter(store):
+    assert [doc.id for doc in store.similarity_search("deploy", k=1)] in (["f1:b"], ["f2:b"])
+    docs = store.similarity_search("deploy", k=2, filter={"id": {"$in": ["f2"]}})
+    assert [doc.id for doc in docs] == ["f2:b", "f2:a"]
+    assert docs[0].metadata == {"id": "f2"}
+
+def test_nearest_excludes_the_file_being_ingested(store):
+    vectors = BagOfWordsEmbeddings().embed_documents(["billing billing"])
+    match = store.nearest(vectors, where={"id": {"$ne": "f2"}})[0]
+    assert match[0] == "f1:a" and match[1] > 0.99
+    assert store.nearest(vectors, where={"id": "missing"}) == [None]
+
+def test_get_update_delete_and_reload(store, tmp_path):
+    assert store.get(where={"id": "f1"}, include=[])["ids"] == ["f1:a", "f1:b"]
+    store.update_metadatas(["f1:a"], [{"ref_f2": True}])
+    assert store.get(ids=["f1:a"])["metadatas"] == [{"id": "f1", "ref_f2": True}]
+
+    store.delete(["f2:a"])
+    assert store.count() == 3
+    assert "f2:a" not in [doc.id for doc in store.similarity_search("search", k=4)]
+
+    # Nothing has been saved yet, every row is replayed from SQLite
+    reloaded = LocalANNStore(BagOfWordsEmbeddings(), str(tmp_path / "ann"), "flat")
+    assert [doc.id for doc in reloaded.similarity_search("billing", k=1)] == ["f1:a"]
+    assert reloaded.get(limit=2, offset=1, include=[])["ids"] == ["f1:b", "f2:b"]
+
+def test_filtered_get_pages_through_the_matches(store):
+    store.add_texts(
+        ["backup one", "billing two", "backup three", "backup four"],
+        metadatas=[{"id": "f3"}, {"id": "f1"}, {"id": "f3"}, {"id": "f3"}],
+        ids=["f3:a", "f1:c", "f3:b", "f3:c"],
+    )
+    # The f2 rows sit between the matches, so a page cut before filtering would come back empty
+    where = {"id": {"$in": ["f1", "f3"]}}
+    pages = [store.get(where=where, include=[], limit=2, offset=offset)["ids"] for offset in range(0, 8, 2)]
+    assert pages == [["f1:a", "f1:b"], ["f3:a", "f1:c"], ["f3:b", "f3:c"], []]
+    assert store.get(where={"id": "f3"}, include=[], offset=1)["ids"] == ["f3:b", "f3:c"]
+
+def test_optimize_rebuilds_after_many_deletes(store):
+    store.delete(["f1:a", "f1:b"])
+    store.optimize()
+    assert len(store._index) == 2
+    assert [doc.id for doc in store.similarity_search("deploy", k=4)] == ["f2:b", "f2:a"]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test answer cache matching, invalidation and eviction
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from core.answer_cache import AnswerCache
+
+def test_hit_needs_similar_query_and_same_chunks():
+    cache = AnswerCache(threshold=0.95, max_entries=10, ttl_seconds=60, enabled=True)
+    cache.put([1.0, 0.0], ["a", "b"], ["file-1"], "Deploy with make release", now=0)
+
+    assert cache.get([0.99, 0.05], ["b", "a"], now=1) == "Deploy with make release"
+    assert cache.get([0.0, 1.0], ["a", "b"], now=1) is None
+    assert cache.get([1.0, 0.0], ["a", "c"], now=1) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 2, 0.3333)
+
+def test_changed_file_drops_its_answers():
+    cache = AnswerCache(threshold=0.95, max_entries=10, ttl_seconds=60, enabled=True)
+    cache.put([1.0, 0.0], ["a"], ["file-1"], "one", now=0)
+    cache.put([0.0, 1.0], ["b"], ["file-2"], "two", now=0)
+    version = cache.version
+
+    assert cache.invalidate_files(["file-1"]) == 1
+    assert cache.get([1.0, 0.0], ["a"], now=1) is None
+    assert cache.get([0.0, 1.0], ["b"], now=1) == "two"
+
+    # An answer generated while a file changed is not stored
+    cache.put([1.0, 0.0], ["a"], ["file-1"], "stale", version=version, now=1)
+    assert cache.get([1.0, 0.0], ["a"], now=1) is None
+
+def test_expired_and_least_recently_used_entries_go():
+    cache = AnswerCache(threshold=0.95, max_entries=2, ttl_seconds=10, enabled=True)
+    cache.put([1.0, 0.0], ["a"], ["f"], "a", now=0)
+    cache.put([1.0, 0.0], ["b"], ["f"], "b", now=0)
+    assert cache.get([1.0, 0.0], ["a"], now=1) == "a"
+    cache.put([1.0, 0.0], ["c"], ["f"], "c", now=1)
+
+    assert cache.get([1.0, 0.0], ["b"], now=2) is None
+    assert cache.get([1.0, 0.0], ["a"], now=20) is None
+    assert cache.get([1.0, 0.0], ["c"], now=5) == "c"
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"], stats["entries"]) == (1, 1, 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test batch ingestion: collecting files, per-file failures and cancellation on both ingestion paths
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+import core.chunk_index as chunk_index
+import core.knowledge_base as knowledge_base
+import core.vector_store as vs
+from core.jobs import Job, JobCancelled
+from test_file_sync import owners, store, write
+
+def test_collect_files_filters_and_recurses(tmp_path):
+    notes = tmp_path / "notes"
+    (notes / "deep").mkdir(parents=True)
+    (notes / "folder.txt").mkdir()
+    a = write(notes, "a.txt", "alpha")
+    b = write(notes, "b.MD", "beta")
+    write(notes, "image.png", "gamma")
+    c = write(notes / "deep", "c.csv", "delta")
+    loose = write(tmp_path, "loose.pdf", "epsilon")
+
+    assert vs.collect_files([str(notes)]) == [a, b, c]
+    assert vs.collect_files([str(notes)], recursive=False) == [a, b]
+    # Files given by name are kept whatever their type, and repeats collapse
+    assert vs.collect_files([a, str(notes), loose, str(tmp_path / "missing.txt")]) == [a, b, c, loose]
+
+def test_failures_are_counted_per_file(store, tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    good = write(first, "good.txt", "alpha", "beta")
+    duplicate = write(second, "good.txt", "gamma")
+    empty = write(first, "empty.txt")
+    unsupported = write(first, "notes.png", "delta")
+
+    summary = vs.ingest_files_to_knowledge_base([str(first), duplicate, unsupported])
+    assert (summary["files"], summary["succeeded"], summary["failed"]) == (4, 1, 3)
+    results = summary["results"]
+    assert results[good]["added"] == 2
+    assert "already in this batch" in results[duplicate]["error"]
+    assert results[empty] == {"error": "No documents were added to the knowledge base"}
+    assert "Unsupported file type" in results[unsupported]["error"]
+    assert set(owners(store)) == {"alpha", "beta"}
+    assert knowledge_base.get_file("empty.txt") is None
+
+def test_a_file_removed_after_collection_fails_alone(store, tmp_path, monkeypatch):
+    kept = write(tmp_path, "kept.txt", "alpha")
+    gone = write(tmp_path, "gone.txt", "beta")
+    collect_files = vs.collect_files
+    def collect_then_remove(paths, recursive=True):
+        files = collect_files(paths, recursive)
+        os.remove(gone)
+        return files
+    monkeypatch.setattr(vs, "collect_files", collect_then_remove)
+
+    summary = vs.ingest_files_to_knowledge_base([kept, gone])
+    assert (summary["files"], summary["succeeded"], summary["failed"]) == (2, 1, 1)
+    assert summary["results"][gone]["error"].startswith("File could not be read")
+    assert set(owners(store)) == {"alpha"}
+
+def cancel_after_first_store(monkeypatch, job):
+    store_chunks = vs.store_chunks
+    def store_then_cancel(batch):
+        store_chunks(batch)
+        job._cancel_event.set()
+    monkeypatch.setattr(vs, "store_chunks", store_then_cancel)
+
+def test_cancelling_a_batch_rolls_it_back(store, tmp_path, monkeypatch):
+    paths = [write(tmp_path, f"note{i}.txt", f"tag{i}a", f"tag{i}b") for i in range(4)]
+    monkeypatch.setattr(vs, "INGEST_BULK_BATCH_SIZE", 2)
+    job = Job("notes", 10, file_paths=paths)
+    cancel_after_first_store(monkeypatch, job)
+
+    with pytest.raises(JobCancelled):
+        vs.ingest_files_to_knowledge_base(paths, job=job)
+    assert owners(store) == {}
+    assert chunk_index.get_indexed_file_ids() == set()
+    assert all(knowledge_base.get_file(f"note{i}.txt") is None for i in range(4))
+
+def test_cancelling_during_a_large_file_stops_it(store, tmp_path, monkeypatch):
+    small = write(tmp_path, "small.txt", "alpha")
+    large = write(tmp_path, "large.txt", *(f"tag{i}" for i in range(6)))
+    # Only the large file takes the streaming single-file path, embedding one chunk per batch
+    monkeypatch.setattr(vs, "INGEST_BULK_MAX_FILE_MB", 1 / 1024)
+    monkeypatch.setattr(vs, "INGEST_BATCH_SIZE", 1)
+    job = Job("notes", 10, file_paths=[small, large])
+    calls = []
+    store_chunks = vs.store_chunks
+    def cancel_on_second_batch(batch):
+        store_chunks(batch)
+        calls.append(len(batch))
+        if len(calls) == 2:
+            job._cancel_event.set()
+    monkeypatch.setattr(vs, "store_chunks", cancel_on_second_batch)
+
+    # The cancel lands inside the large file, which rolls back instead of being recorded as failed
+    with pytest.raises(JobCancelled):
+        vs.ingest_files_to_knowledge_base([small, large], job=job)
+    assert calls == [1, 1]
+    assert knowledge_base.get_file("large.txt") is None
+    assert set(owners(store)) == {"alpha"}
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test the BM25 keyword index and reciprocal-rank fusion used by the hybrid retriever
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+import core.bm25_index as bm25_index
+import core.chunk_index as chunk_index
+from core.hybrid_retriever import reciprocal_rank_fusion
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "CHUNK_INDEX_FILE", str(tmp_path / "chunk_index.db"))
+    monkeypatch.setattr(chunk_index, "CHUNK_INDEX_FILE", str(tmp_path / "chunk_index.db"))
+    chunk_index.init_chunk_index()
+    bm25_index.init_bm25_index()
+    bm25_index.add_chunks("file-a", [
+        ("a:1", "The deployment failed with error ERR-4012 after the upgrade."),
+        ("a:2", "Machine learning is a subset of artificial intelligence."),
+    ])
+    bm25_index.add_chunks("file-b", [
+        ("b:1", "Error handling in the deployment pipeline retries three times."),
+        ("b:2", "Neural networks learn representations from data."),
+    ])
+    return bm25_index
+
+def test_tokenize_keeps_identifiers_and_drops_stopwords():
+    assert bm25_index.tokenize("The error ERR-4012 in v2.3.1 of user_id") == ["error", "err-4012", "v2.3.1", "user_id"]
+
+def test_exact_term_ranks_first(index):
+    """A rare identifier outranks chunks that only share common words"""
+    hits = index.search("what does ERR-4012 mean for the deployment", k=3)
+    assert hits[0][0] == "a:1"
+    assert {vector_id for vector_id, _ in hits} == {"a:1", "b:1"}
+
+def test_search_filters_by_file(index):
+    hits = index.search("deployment error", k=5, file_ids=["file-b"])
+    assert [vector_id for vector_id, _ in hits] == ["b:1"]
+
+def test_search_includes_chunks_shared_with_a_file(index):
+    """A file referencing another file's chunk finds it when searching only its own files"""
+    chunk_index.add_file_chunks("file-c", [("h", "a:1")])
+    hits = index.search("ERR-4012", k=5, file_ids=["file-c"])
+    assert [vector_id for vector_id, _ in hits] == ["a:1"]
+
+def test_remove_and_delete(index):
+    index.remove_chunks(["a:1"])
+    assert index.search("ERR-4012", k=5) == []
+
+    index.delete_file_index("file-b")
+    assert index.search("neural deployment", k=5) == []
+    assert not index.is_empty()
+
+def test_reindexing_a_chunk_replaces_its_postings(index):
+    index.add_chunks("file-a", [("a:2", "Gradient descent")])
+    assert index.search("machine learning", k=5) == []
+    assert index.search("gradient", k=5)[0][0] == "a:2"
+
+def actual_stats():
+    with bm25_index.get_connection(bm25_index.CHUNK_INDEX_FILE) as conn:
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs").fetchone()
+
+def test_stats_follow_every_change(index):
+    assert index.get_stats() == actual_stats() == (4, 23)
+    index.add_chunks("file-a", [("a:2", "Gradient descent"), ("a:3", "Learning rate schedules")])
+    assert index.get_stats() == actual_stats()
+    index.remove_chunks(["a:1", "a:1", "missing"])
+    assert index.get_stats() == actual_stats()
+    index.delete_file_index("file-b")
+    assert index.get_stats() == actual_stats()
+    index.delete_file_index("file-a")
+    assert index.get_stats() == (0, 0)
+    assert index.search("gradient", k=5) == []
+
+def test_stats_are_backfilled_for_an_existing_index(index):
+    with bm25_index.get_connection(bm25_index.CHUNK_INDEX_FILE) as conn:
+        conn.execute("DROP TABLE bm25_stats")
+    index.init_bm25_index()
+    assert index.get_stats() == actual_stats() == (4, 23)
+    assert index.search("ERR-4012", k=1)[0][0] == "a:1"
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """An id ranked well by both lists beats one ranked first by only one"""
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]], rrf_k=60)
+    assert fused[0] == "y"
+    assert set(fused) == {"x", "y", "z", "w"}
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Load test: concurrent chat streams must not serialize on retrieval or history I/O
+"""
+
+import asyncio
+import os
+import sys
+import time
+import types
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from core.scheduler import InferenceScheduler
+
+# Stand in for the GGUF model so the chain can be imported without it
+if "core.llm" not in sys.modules:
+    fake_llm_module = types.ModuleType("core.llm")
+    fake_llm_module.llm = FakeStreamingListLLM(responses=["ok"])
+    fake_llm_module.llm_pool = [fake_llm_module.llm]
+    fake_llm_module.inference_scheduler = InferenceScheduler(fake_llm_module.llm_pool)
+    sys.modules["core.llm"] = fake_llm_module
+
+import core.chain as chain
+import core.context_builder as context_builder
+
+RETRIEVAL_SECONDS = 0.2
+DB_SECONDS = 0.02
+CONCURRENT_STREAMS = 8
+
+class SlowRetriever:
+    """Blocks the calling thread like query embedding plus a Chroma search does"""
+
+    def invoke(self, query):
+        time.sleep(RETRIEVAL_SECONDS)
+        return []
+
+def slow_load_messages(chat_id, offset=0):
+    time.sleep(DB_SECONDS)
+    return []
+
+def slow_save_message(chat_id, role, content):
+    time.sleep(DB_SECONDS)
+
+def slow_get_summary(chat_id):
+    time.sleep(DB_SECONDS)
+    return "", 0
+
+async def consume(chat_id):
+    async for _ in chain.chat_stream(chat_id, "What is machine learning?", SlowRetriever()):
+        pass
+
+async def run_load():
+    """Run the streams concurrently while measuring the largest event loop stall"""
+    stalls = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            stalls.append(now - last - 0.01)
+            last = now
+
+    ticker = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*(consume(f"load-test-{i}") for i in range(CONCURRENT_STREAMS)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker
+    return elapsed, max(stalls)
+
+def test_concurrent_streams_do_not_serialize_on_retrieval(monkeypatch):
+    monkeypatch.setattr(chain, "inference_scheduler", InferenceScheduler([FakeStreamingListLLM(responses=["ok"])]))
+    monkeypatch.setattr(chain, "load_messages", slow_load_messages)
+    monkeypatch.setattr(chain, "save_message", slow_save_message)
+    monkeypatch.setattr(chain, "get_summary", slow_get_summary)
+    monkeypatch.setattr(chain, "schedule_summary_update", lambda chat_id: None)
+    monkeypatch.setattr(context_builder, "count_tokens", lambda text: len(text.split()))
+
+    elapsed, max_stall = asyncio.run(run_load())
+    serialized = CONCURRENT_STREAMS * RETRIEVAL_SECONDS
+    print(f"{CONCURRENT_STREAMS} streams in {elapsed:.2f}s (serialized: {serialized:.2f}s), max loop stall {max_stall * 1000:.0f}ms")
+
+    assert elapsed < serialized / 2
+    assert max_stall < RETRIEVAL_SECONDS / 2
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test that generation is bounded by its deadline and always closed before the model is released
+"""
+
+import asyncio
+import os
+import sys
+import types
+from typing import Any, AsyncIterator, Optional
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from core.scheduler import InferenceScheduler
+
+# Stand in for the GGUF model so the chain can be imported without it
+if "core.llm" not in sys.modules:
+    fake_llm_module = types.ModuleType("core.llm")
+    fake_llm_module.llm = FakeStreamingListLLM(responses=["ok"])
+    fake_llm_module.llm_pool = [fake_llm_module.llm]
+    fake_llm_module.inference_scheduler = InferenceScheduler(fake_llm_module.llm_pool)
+    sys.modules["core.llm"] = fake_llm_module
+
+import core.chain as chain
+import core.context_builder as context_builder
+
+class StallingLLM(LLM):
+    """Streams a few tokens and then hangs, recording whether its stream was closed and when"""
+
+    tokens: int = 2
+    events: list = []
+    scheduler: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "stalling"
+
+    def _call(self, prompt: str, stop: Optional[list] = None, run_manager=None, **kwargs) -> str:
+        raise NotImplementedError
+
+    async def _astream(self, prompt: str, stop: Optional[list] = None, run_manager=None, **kwargs) -> AsyncIterator[GenerationChunk]:
+        try:
+            for i in range(self.tokens):
+                yield GenerationChunk(text=f"token{i} ")
+            await asyncio.sleep(3600)
+        finally:
+            # Still held by this request while its stream is being closed
+            self.events.append(("closed", self.scheduler.stats()["active"]))
+
+@pytest.fixture
+def model(monkeypatch):
+    llm = StallingLLM(events=[])
+    scheduler = InferenceScheduler([llm])
+    llm.scheduler = scheduler
+    monkeypatch.setattr(chain, "inference_scheduler", scheduler)
+    monkeypatch.setattr(chain, "load_messages", lambda chat_id, offset=0: [])
+    monkeypatch.setattr(chain, "save_message", lambda chat_id, role, content: None)
+    monkeypatch.setattr(chain, "get_summary", lambda chat_id: ("", 0))
+    monkeypatch.setattr(chain, "schedule_summary_update", lambda chat_id: None)
+    monkeypatch.setattr(context_builder, "count_tokens", lambda text: len(text.split()))
+    return llm
+
+def test_stalled_generation_times_out(model, monkeypatch):
+    monkeypatch.setattr(chain, "LLM_GENERATION_TIMEOUT", 0.2)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        items = [item async for item in chain.chat_stream("chat", "What is machine learning?")]
+        return items, loop.time() - start
+
+    items, elapsed = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert elapsed < 2
+    assert items[-1] == {"type": "final", "response": "token0 token1 "}
+    assert model.events == [("closed", 1)]
+    assert model.scheduler.stats()["active"] == 0
+
+def test_closing_the_chat_stream_closes_generation_before_release(model):
+    async def scenario():
+        stream = chain.chat_stream("chat", "What is machine learning?")
+        async for item in stream:
+            if isinstance(item, str):
+                break
+        await stream.aclose()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert model.events == [("closed", 1)]
+    assert model.scheduler.stats()["active"] == 0
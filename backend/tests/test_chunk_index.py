@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed chunk index used for incremental re-ingestion
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import core.chunk_index as chunk_index
+
+PARAMS = {"chunk_size": 500, "chunk_overlap": 100}
+
+def test_hash_depends_on_content_and_splitter_params():
+    """Same text with the same splitter hashes the same, anything else differs"""
+    base = chunk_index.hash_chunk("machine learning", PARAMS)
+    assert base == chunk_index.hash_chunk("machine learning", dict(PARAMS))
+    assert base != chunk_index.hash_chunk("machine learning!", PARAMS)
+    assert base != chunk_index.hash_chunk("machine learning", {**PARAMS, "chunk_size": 400})
+
+def test_file_chunks_round_trip(tmp_path, monkeypatch):
+    """Chunks are recorded, diffed and removed per file"""
+    monkeypatch.setattr(chunk_index, "CHUNK_INDEX_FILE", str(tmp_path / "chunk_index.db"))
+    chunk_index.init_chunk_index()
+
+    chunk_index.add_file_chunks("file-a", [("h1", "file-a:h1"), ("h2", "file-a:h2")])
+    chunk_index.add_file_chunks("file-b", [("h1", "file-b:h1")])
+    assert chunk_index.get_file_chunks("file-a") == {"h1": "file-a:h1", "h2": "file-a:h2"}
+
+    chunk_index.remove_file_chunks("file-a", ["h1"])
+    assert chunk_index.get_file_chunks("file-a") == {"h2": "file-a:h2"}
+
+    chunk_index.delete_file_chunks("file-a")
+    assert chunk_index.get_file_chunks("file-a") == {}
+    assert chunk_index.get_file_chunks("file-b") == {"h1": "file-b:h1"}
+
+def test_vector_references_across_files(tmp_path, monkeypatch):
+    """A shared vector lists every file pointing at it, which decides whether it can be deleted"""
+    monkeypatch.setattr(chunk_index, "CHUNK_INDEX_FILE", str(tmp_path / "chunk_index.db"))
+    chunk_index.init_chunk_index()
+
+    chunk_index.add_file_chunks("file-a", [("h1", "file-a:h1")])
+    chunk_index.add_file_chunks("file-b", [("h9", "file-a:h1")])
+    assert chunk_index.get_vector_files(["file-a:h1", "gone"]) == {"file-a:h1": ["file-a", "file-b"], "gone": []}
+    assert chunk_index.get_indexed_file_ids() == {"file-a", "file-b"}
+
+    chunk_index.delete_file_chunks("file-a")
+    assert chunk_index.get_vector_files(["file-a:h1"]) == {"file-a:h1": ["file-b"]}
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test token budgeting of chat history and retrieved context
+"""
+
+import os
+import sys
+import types
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.language_models.fake import FakeStreamingListLLM
+from core.scheduler import InferenceScheduler
+
+# The builder only needs a tokenizer, which these tests replace with a word count
+if "core.llm" not in sys.modules:
+    fake_llm_module = types.ModuleType("core.llm")
+    fake_llm_module.llm = FakeStreamingListLLM(responses=["ok"])
+    fake_llm_module.llm_pool = [fake_llm_module.llm]
+    fake_llm_module.inference_scheduler = InferenceScheduler(fake_llm_module.llm_pool)
+    sys.modules["core.llm"] = fake_llm_module
+
+from langchain_core.messages import HumanMessage, AIMessage
+import core.context_builder as context_builder
+
+TEMPLATE = "History: {history} Context: {retrieved_context} Question: {user_query}"
+
+def words(text):
+    return len(text.split())
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append(HumanMessage(content=f"question {i} " + "word " * 20))
+        history.append(AIMessage(content=f"answer {i} " + "word " * 20))
+    return history
+
+def test_fit_history_keeps_the_newest_messages():
+    history = make_history(5)
+    per_message = words(context_builder.format_message(history[0])) + 1
+    start = context_builder.fit_history(history, per_message * 3, words)
+    assert start == len(history) - 3
+    assert context_builder.fit_history(history, 10_000, words) == 0
+    assert context_builder.fit_history(history, 0, words) == len(history)
+
+def test_fit_documents_skips_what_does_not_fit():
+    docs = ["short doc", "word " * 50, "another short doc"]
+    assert context_builder.fit_documents(docs, 10, words) == ["short doc", "another short doc"]
+
+def test_long_history_is_trimmed_to_its_share_of_the_budget(monkeypatch):
+    monkeypatch.setattr(context_builder, "LLM_N_CTX", 600)
+    monkeypatch.setattr(context_builder, "LLM_MAX_TOKENS", 100)
+    monkeypatch.setattr(context_builder, "HISTORY_BUDGET_RATIO", 0.5)
+    history = make_history(50)
+    docs = ["word " * 40 for _ in range(10)]
+
+    history_text, context_docs, dropped = context_builder.build_context(
+        TEMPLATE, "what now?", "we talked about words", history, docs, words
+    )
+
+    budget = 600 - 100 - words(TEMPLATE.format(retrieved_context="", history="", user_query="")) - 2
+    assert dropped > 0
+    assert history_text.startswith("Summary of earlier conversation: we talked about words")
+    assert "answer 49" in history_text
+    assert words(history_text) <= budget * 0.5 + 5
+    assert 0 < len(context_docs) < len(docs)
+    assert words(history_text) + sum(words(doc) + 2 for doc in context_docs) <= budget + 5
+
+def test_short_history_leaves_budget_to_context(monkeypatch):
+    monkeypatch.setattr(context_builder, "LLM_N_CTX", 600)
+    monkeypatch.setattr(context_builder, "LLM_MAX_TOKENS", 100)
+    docs = ["word " * 40 for _ in range(10)]
+    history_text, context_docs, dropped = context_builder.build_context(TEMPLATE, "hi", "", [], docs, words)
+    assert history_text == "None"
+    assert dropped == 0
+    assert len(context_docs) == 10
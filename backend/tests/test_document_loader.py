@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test that text and Markdown files are read in blocks and split as they stream in
+"""
+
+import os
+import sys
+import tracemalloc
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.documents import Document
+from core.document_loader import LAZY_LOADERS, TextBlockLoader, iter_documents, iter_split_docs, make_splitter
+
+def paragraphs(count):
+    return "\n\n".join(f"Paragraph {i} covers deployment step {i} and its rollback plan in some detail." * 3 for i in range(count))
+
+def test_text_and_markdown_use_the_block_loader():
+    assert all(LAZY_LOADERS[ext] is TextBlockLoader for ext in (".txt", ".md", ".markdown"))
+
+def test_chunks_stream_before_the_file_is_read(tmp_path):
+    path = tmp_path / "large.txt"
+    path.write_text(paragraphs(20_000))
+    blocks_read = 0
+    def counted(docs):
+        nonlocal blocks_read
+        for doc in docs:
+            blocks_read += 1
+            yield doc
+
+    chunks = iter_split_docs(counted(TextBlockLoader(str(path), block_chars=16_384).lazy_load()), chunk_size=500, chunk_overlap=100)
+    first = next(chunks)
+    assert first.page_content.startswith("Paragraph 0 ") and first.metadata == {"source": str(path)}
+    assert blocks_read == 2
+    assert os.path.getsize(path) > 100 * 16_384
+
+def test_peak_memory_is_bounded_by_the_block_size(tmp_path):
+    path = tmp_path / "large.txt"
+    path.write_text(paragraphs(40_000))
+    size = os.path.getsize(path)
+
+    tracemalloc.start()
+    try:
+        count = sum(1 for _ in iter_split_docs(TextBlockLoader(str(path), block_chars=65_536).lazy_load(), chunk_size=500, chunk_overlap=100))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert count > 10_000
+    assert peak < size / 8
+
+def test_a_text_within_one_block_splits_exactly_as_a_whole(tmp_path):
+    text = paragraphs(50)
+    path = tmp_path / "note.txt"
+    path.write_text(text)
+    whole = make_splitter(500, 100).split_documents([Document(page_content=text, metadata={"source": str(path)})])
+    assert list(iter_split_docs(iter_documents(str(path)), 500, 100)) == whole
+
+def test_blocks_rejoin_at_chunk_boundaries(tmp_path):
+    text = paragraphs(400)
+    path = tmp_path / "note.txt"
+    path.write_text(text)
+    chunks = [doc.page_content for doc in iter_split_docs(TextBlockLoader(str(path), block_chars=4096).lazy_load(), 500, 100)]
+    whole = make_splitter(500, 100).split_text(text)
+    # Only chunks next to a block boundary may come out differently
+    assert len(set(chunks) & set(whole)) >= 0.9 * len(whole)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(f"Paragraph {i} " in "".join(chunks) for i in range(400))
+
+def test_markdown_blocks_keep_their_heading_paths(tmp_path):
+    sections = []
+    for i in range(60):
+        sections.append(f"# Chapter {i}\n\n## Setup\n\n{paragraphs(2)}\n\n```bash\nmake step-{i}\n```\n\n## Notes\n\n{paragraphs(1)}")
+    path = tmp_path / "book.md"
+    path.write_text("\n\n".join(sections))
+
+    chunks = list(iter_split_docs(TextBlockLoader(str(path), block_chars=2048).lazy_load(), 500, 100, markdown=True))
+    for i in range(60):
+        code = [chunk for chunk in chunks if f"make step-{i}\n" in chunk.page_content]
+        assert len(code) == 1 and code[0].metadata["headings"] == f"Chapter {i} > Setup"
+        assert code[0].page_content.count("```") == 2
+    assert {chunk.metadata["headings"] for chunk in chunks} == {
+        f"Chapter {i} > {section}" for i in range(60) for section in ("Setup", "Notes")}
+
+def test_blocks_without_a_boundary_are_cut_as_they_stream(tmp_path):
+    code = "\n".join(f"deploy --step {i} --target production" for i in range(2000))
+    line = " ".join(f"word{i}" for i in range(10_000))
+    path = tmp_path / "dump.md"
+    path.write_text(f"# Dump\n\n```bash\n{code}\n```\n\n{line}\n")
+    blocks_read = 0
+    def counted(docs):
+        nonlocal blocks_read
+        for doc in docs:
+            blocks_read += 1
+            yield doc
+
+    # A chunk's position in the stream shows how much was read before it, and so how much was held
+    read_before = []
+    chunks = []
+    for chunk in iter_split_docs(counted(TextBlockLoader(str(path), block_chars=2048).lazy_load()), 500, 100, markdown=True):
+        read_before.append(blocks_read)
+        chunks.append(chunk.page_content)
+    assert blocks_read > 60
+    assert all(later - earlier <= 2 for earlier, later in zip([0] + read_before, read_before) if later < blocks_read)
+    code_chunks = [chunk for chunk in chunks if "deploy" in chunk]
+    assert all(chunk.startswith("```bash\n") and chunk.endswith("\n```") for chunk in code_chunks)
+    assert "\n".join(chunk[len("```bash\n"):-len("\n```")] for chunk in code_chunks) == code
+    # Hard cuts fall inside words and chunks are stripped, so compare with the spaces taken out
+    joined = "".join("".join(chunks).split())
+    assert all(f"word{i}word{i + 1}" in joined for i in range(9999))
+    assert all(len(chunk) <= 600 for chunk in chunks)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test the persistent embedding cache without loading a real model
+"""
+
+import os
+import sys
+import threading
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.embeddings import Embeddings
+from core.embedding_cache import CachedEmbeddings
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic embeddings that record how many texts were actually embedded"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(text)), 0.5, -1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def test_repeated_texts_are_embedded_once(tmp_path):
+    """Duplicates within a batch and across calls hit the cache"""
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, "test-model", path=str(tmp_path / "cache.db"))
+
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    second = cache.embed_documents(["beta", "gamma"])
+    query = cache.embed_query("alpha")
+
+    assert model.embedded == 3
+    assert first[0] == first[2] == query == [5.0, 0.5, -1.0]
+    assert second[0] == first[1]
+    stats = cache.stats()
+    assert stats["misses"] == 3
+    assert stats["memory_hits"] == 2
+
+def test_vectors_persist_across_instances(tmp_path):
+    """A new process reads vectors back from disk instead of re-embedding"""
+    path = str(tmp_path / "cache.db")
+    CachedEmbeddings(CountingEmbeddings(), "test-model", path=path).embed_documents(["alpha", "beta"])
+
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, "test-model", path=path)
+    assert cache.embed_documents(["alpha", "beta"]) == [[5.0, 0.5, -1.0], [4.0, 0.5, -1.0]]
+    assert model.embedded == 0
+    assert cache.stats()["disk_hits"] == 2
+
+    other_model = CountingEmbeddings()
+    CachedEmbeddings(other_model, "other-model", path=path).embed_documents(["alpha"])
+    assert other_model.embedded == 1
+
+def test_disk_tier_is_bounded(tmp_path):
+    """Least recently used vectors are evicted once max_entries is exceeded"""
+    cache = CachedEmbeddings(
+        CountingEmbeddings(), "test-model", path=str(tmp_path / "cache.db"), max_entries=10, memory_entries=2
+    )
+    cache.embed_documents([f"text {i}" for i in range(25)])
+
+    stats = cache.stats()
+    assert stats["disk_entries"] <= 10
+    assert stats["memory_entries"] == 2
+    assert stats["evictions"] > 0
+
+def test_threads_share_the_cache_through_their_own_connections(tmp_path):
+    """Every thread reads and writes through a tuned per-thread connection"""
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, "test-model", path=str(tmp_path / "cache.db"), memory_entries=1)
+    cache.embed_documents([f"text {i}" for i in range(50)])
+
+    results = []
+    def worker():
+        results.append(cache.embed_documents([f"text {i}" for i in range(50)]))
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert model.embedded == 50
+    assert all(result == results[0] for result in results)
+    assert cache.stats()["disk_hits"] >= 4 * 49
+    assert cache._conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert cache._conn().execute("PRAGMA user_version").fetchone()[0] == 1
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Test incremental file sync, near-duplicate sharing across files and deletes, on the exact local index
+"""
+
+import os
+import sys
+import threading
+import time
+import zlib
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from langchain_core.embeddings import Embeddings
+import core.bm25_index as bm25_index
+import core.chunk_index as chunk_index
+import core.knowledge_base as knowledge_base
+import core.vector_store as vs
+from core.ann_store import LocalANNStore
+
+class HashedWordEmbeddings(Embeddings):
+    """Bag of words hashed into a fixed number of dimensions; identical texts get identical vectors"""
+
+    def __init__(self, fail_on: str = None):
+        self.fail_on = fail_on
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        if self.fail_on and self.fail_on in text:
+            raise RuntimeError("embedding model failed")
+        vector = [0.0] * 256
+        for word in text.split():
+            vector[zlib.crc32(word.encode()) % 256] += 1.0
+        return vector
+
+def paragraph(tag: str) -> str:
+    """About 300 characters, one chunk with the default splitter, sharing no words with other tags"""
+    return " ".join(f"{tag}{i}" for i in range(60))[:300]
+
+def write(folder, name, *tags):
+    path = folder / name
+    path.write_text("\n\n".join(paragraph(tag) for tag in tags))
+    return str(path)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    index_file = str(tmp_path / "chunk_index.db")
+    monkeypatch.setattr(chunk_index, "CHUNK_INDEX_FILE", index_file)
+    monkeypatch.setattr(bm25_index, "CHUNK_INDEX_FILE", index_file)
+    monkeypatch.setattr(knowledge_base, "CHAT_HISTORY_DB_FILE", str(tmp_path / "chat_history.db"))
+    knowledge_base.init_db()
+    chunk_index.init_chunk_index()
+    bm25_index.init_bm25_index()
+
+    embeddings = HashedWordEmbeddings()
+    store = LocalANNStore(embeddings, str(tmp_path / "ann"), "flat")
+    monkeypatch.setattr(vs, "embeddings", embeddings)
+    monkeypatch.setattr(vs, "vector_store", store)
+    monkeypatch.setattr(vs, "UPLOAD_DIR", str(tmp_path / "files"))
+    os.makedirs(tmp_path / "files")
+    return store
+
+def owners(store):
+    """{document tag: metadata} of the stored vectors"""
+    stored = store.get(include=["documents", "metadatas"])
+    return {document.split("0 ")[0]: metadata for document, metadata in zip(stored["documents"], stored["metadatas"])}
+
+def test_reingest_only_embeds_changed_chunks(store, tmp_path):
+    path = write(tmp_path, "notes.txt", "alpha", "beta", "gamma")
+    first = vs.ingest_file_to_knowledge_base(path)
+    assert (first["added"], first["unchanged"], first["removed"]) == (3, 0, 0)
+
+    unchanged = vs.ingest_file_to_knowledge_base(path)
+    assert (unchanged["added"], unchanged["unchanged"], unchanged["removed"]) == (0, 3, 0)
+    assert unchanged["file_id"] == first["file_id"]
+
+    write(tmp_path, "notes.txt", "alpha", "delta", "gamma")
+    changed = vs.ingest_file_to_knowledge_base(path)
+    assert (changed["added"], changed["unchanged"], changed["removed"]) == (1, 2, 1)
+    assert set(owners(store)) == {"alpha", "delta", "gamma"}
+    assert len(chunk_index.get_file_chunks(first["file_id"])) == 3
+    assert bm25_index.get_vector_ids() == set(store.get(include=[])["ids"])
+
+def test_moved_chunks_keep_their_vectors_and_get_fresh_metadata(store, tmp_path):
+    path = tmp_path / "guide.md"
+    setup = f"## Setup\n\n{paragraph('setup')}"
+    path.write_text(f"# Install\n\n{paragraph('install')}\n\n{setup}\n\n# Upgrade\n\n{paragraph('upgrade')}")
+    first = vs.ingest_file_to_knowledge_base(str(path))
+    assert owners(store)["## Setup\n\nsetup"]["headings"] == "Install > Setup"
+
+    # The Setup section moves, word for word, under another chapter
+    path.write_text(f"# Install\n\n{paragraph('install')}\n\n# Upgrade\n\n{paragraph('upgrade')}\n\n{setup}")
+    moved = vs.ingest_file_to_knowledge_base(str(path))
+    assert (moved["added"], moved["removed"]) == (0, 0)
+    stored = owners(store)
+    assert stored["## Setup\n\nsetup"]["headings"] == "Upgrade > Setup"
+    assert stored["# Install\n\ninstall"]["headings"] == "Install"
+    assert len(chunk_index.get_file_chunks(first["file_id"])) == 3
+
+def test_failed_ingest_rolls_back(store, tmp_path, monkeypatch):
+    path = write(tmp_path, "notes.txt", "alpha", "beta")
+    file_id = vs.ingest_file_to_knowledge_base(path)["file_id"]
+
+    # The first batch (one new chunk) is stored, the second fails to embed
+    monkeypatch.setattr(vs, "INGEST_BATCH_SIZE", 1)
+    monkeypatch.setattr(vs, "embeddings", HashedWordEmbeddings(fail_on="zeta"))
+    write(tmp_path, "notes.txt", "alpha", "beta", "epsilon", "zeta")
+    with pytest.raises(RuntimeError):
+        vs.ingest_file_to_knowledge_base(path)
+    assert set(owners(store)) == {"alpha", "beta"}
+    assert len(chunk_index.get_file_chunks(file_id)) == 2
+    assert knowledge_base.get_file("notes.txt") == file_id
+
+    # A new file that fails leaves nothing behind, not even its row
+    new_path = write(tmp_path, "other.txt", "eta", "zeta")
+    with pytest.raises(RuntimeError):
+        vs.ingest_file_to_knowledge_base(new_path)
+    assert knowledge_base.get_file("other.txt") is None
+    assert set(owners(store)) == {"alpha", "beta"}
+    assert chunk_index.get_indexed_file_ids() == {file_id}
+
+def test_near_duplicate_chunks_are_shared(store, tmp_path):
+    a = vs.ingest_file_to_knowledge_base(write(tmp_path, "a.txt", "shared", "alpha"))
+    b = vs.ingest_file_to_knowledge_base(write(tmp_path, "b.txt", "shared", "beta"))
+    assert (b["added"], b["shared"]) == (1, 1)
+
+    stored = owners(store)
+    assert len(stored) == 3
+    assert stored["shared"]["id"] == a["file_id"] and stored["shared"][vs.ref_key(b["file_id"])] is True
+    # File-scoped retrieval for b sees the vector it shares
+    hits = store.similarity_search(paragraph("shared"), k=1, filter=vs.file_filter([b["file_id"]]))
+    assert hits[0].page_content == paragraph("shared")
+
+def test_deleting_the_owner_hands_shared_vectors_over(store, tmp_path):
+    a = vs.ingest_file_to_knowledge_base(write(tmp_path, "a.txt", "shared", "alpha"))
+    b = vs.ingest_file_to_knowledge_base(write(tmp_path, "b.md", "shared", "beta"))
+
+    result = vs.delete_file_from_knowledge_base("a.txt")
+    assert result["file_id"] == a["file_id"]
+    stored = owners(store)
+    assert set(stored) == {"shared", "beta"}
+    assert stored["shared"]["id"] == b["file_id"]
+    assert (stored["shared"]["name"], stored["shared"]["file_type"]) == ("b.md", ".md")
+    assert not any(key.startswith("ref_") for key in stored["shared"])
+    assert knowledge_base.get_file("a.txt") is None and knowledge_base.get_deleted_files() == []
+    assert chunk_index.get_indexed_file_ids() == {b["file_id"]}
+    # Keyword search now attributes the shared chunk to b
+    assert len(bm25_index.search("shared1", k=5, file_ids=[b["file_id"]])) == 1
+
+    # Re-ingesting b leaves the vector it now owns unchanged
+    again = vs.ingest_file_to_knowledge_base(os.path.join(tmp_path, "b.md"))
+    assert (again["added"], again["unchanged"], again["removed"]) == (0, 2, 0)
+
+def test_deleting_a_referencing_file_keeps_the_owner_intact(store, tmp_path):
+    a = vs.ingest_file_to_knowledge_base(write(tmp_path, "a.txt", "shared", "alpha"))
+    b = vs.ingest_file_to_knowledge_base(write(tmp_path, "b.txt", "shared", "beta"))
+
+    vs.delete_file_from_knowledge_base("b.txt")
+    stored = owners(store)
+    assert set(stored) == {"shared", "alpha"}
+    assert stored["shared"]["id"] == a["file_id"]
+    assert vs.ref_key(b["file_id"]) not in stored["shared"]
+    assert chunk_index.get_indexed_file_ids() == {a["file_id"]}
+    assert len(bm25_index.search("shared1", k=5, file_ids=[a["file_id"]])) == 1
+
+def test_interrupted_delete_is_finished_by_compaction(store, tmp_path, monkeypatch):
+    upload = write(tmp_path / "files", "a.txt", "alpha")
+    a = vs.ingest_file_to_knowledge_base(upload)
+    vs.ingest_file_to_knowledge_base(write(tmp_path, "b.txt", "beta"))
+
+    # The tombstone is written, then the purge fails part way
+    release_vectors = vs.release_vectors
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk went away")
+    monkeypatch.setattr(vs, "release_vectors", fail)
+    with pytest.raises(RuntimeError):
+        vs.delete_file_from_knowledge_base("a.txt")
+    monkeypatch.setattr(vs, "release_vectors", release_vectors)
+    assert knowledge_base.get_file("a.txt") is None
+    assert [name for _, name, _ in knowledge_base.get_deleted_files()] == ["a.txt"]
+    assert "alpha" in owners(store)
+
+    result = vs.compact_knowledge_base()
+    assert result["deletes_finished"] == 1
+    assert set(owners(store)) == {"beta"}
+    assert knowledge_base.get_deleted_files() == []
+    assert chunk_index.get_indexed_file_ids() == {knowledge_base.get_file("b.txt")}
+    assert not os.path.exists(upload)
+    assert a["file_id"] not in {metadata["id"] for metadata in owners(store).values()}
+
+def test_uploads_arriving_during_compaction_survive(store, tmp_path, monkeypatch):
+    files = tmp_path / "files"
+    stale = write(files, "stale.txt", "alpha")
+    os.utime(stale, (0, 0))
+    queued = []
+
+    # Two uploads land while compaction is running: one already queued, one not yet
+    optimize = store.optimize
+    def upload_during_compaction():
+        path = write(files, "queued.txt", "beta")
+        os.utime(path, (0, 0))
+        queued.append(path)
+        write(files, "unqueued.txt", "gamma")
+        optimize()
+    monkeypatch.setattr(store, "optimize", upload_during_compaction)
+
+    result = vs.compact_knowledge_base(lambda: list(queued))
+    assert result["uploads_removed"] == 1
+    assert sorted(os.listdir(files)) == ["queued.txt", "unqueued.txt"]
+
+def test_compaction_waits_for_a_running_ingest(store, tmp_path, monkeypatch):
+    path = write(tmp_path, "notes.txt", "alpha", "beta")
+    monkeypatch.setattr(vs, "INGEST_BATCH_SIZE", 1)
+
+    # The ingest stops between writing its first vectors and recording them in the chunk index
+    stored, resume = threading.Event(), threading.Event()
+    add_vectors = store.add_vectors
+    def add_then_pause(*args, **kwargs):
+        add_vectors(*args, **kwargs)
+        stored.set()
+        assert resume.wait(5)
+    monkeypatch.setattr(store, "add_vectors", add_then_pause)
+
+    results = {}
+    ingest = threading.Thread(target=lambda: results.update(ingest=vs.ingest_file_to_knowledge_base(path)))
+    compaction = threading.Thread(target=lambda: results.update(compaction=vs.compact_knowledge_base()))
+    ingest.start()
+    assert stored.wait(5)
+    compaction.start()
+    time.sleep(0.2)
+    assert compaction.is_alive() and "compaction" not in results
+    resume.set()
+    ingest.join(5)
+    compaction.join(5)
+
+    assert results["ingest"]["added"] == 2
+    assert results["compaction"]["vectors_removed"] == 0 and results["compaction"]["orphan_files"] == 0
+    assert set(owners(store)) == {"alpha", "beta"}
+    assert len(chunk_index.get_file_chunks(results["ingest"]["file_id"])) == 2
+
+def test_concurrent_syncs_of_one_file_run_one_at_a_time(store, tmp_path, monkeypatch):
+    path = write(tmp_path, "notes.txt", "alpha", "beta")
+    stored, resume = threading.Event(), threading.Event()
+    add_vectors = store.add_vectors
+    calls = []
+    def add_then_pause(*args, **kwargs):
+        add_vectors(*args, **kwargs)
+        calls.append(threading.current_thread().name)
+        stored.set()
+        assert resume.wait(5)
+    monkeypatch.setattr(store, "add_vectors", add_then_pause)
+
+    # An upload job and a folder watcher sync of the same file
+    results = {}
+    threads = [threading.Thread(target=lambda name=name: results.update({name: vs.ingest_file_to_knowledge_base(path)}), name=name)
+               for name in ("job", "watcher")]
+    threads[0].start()
+    assert stored.wait(5)
+    threads[1].start()
+    time.sleep(0.2)
+    assert "watcher" not in results and calls == ["job"]
+    resume.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results["job"]["added"] == 2
+    assert (results["watcher"]["added"], results["watcher"]["unchanged"]) == (0, 2)
+    assert calls == ["job"] and set(owners(store)) == {"alpha", "beta"}
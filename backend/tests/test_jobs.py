@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test the ingestion job queue: priority order, capacity, cancellation and status transitions
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from fastapi import HTTPException
+from core.jobs import JobManager, QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED
+
+class Ingester:
+    """Records the files it ingests; "block" waits for the gate, "slow" polls for a cancel"""
+
+    def __init__(self):
+        self.order = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def ingest(self, file_path, job=None):
+        self.order.append(file_path)
+        if file_path == "block":
+            self.started.set()
+            assert self.gate.wait(5)
+        elif file_path == "slow":
+            self.started.set()
+            for _ in range(500):
+                job.check_cancelled()
+                time.sleep(0.01)
+        elif file_path == "empty":
+            return None
+        elif file_path == "broken":
+            raise ValueError("unreadable file")
+        return {"added": 1}
+
+    def ingest_batch(self, file_paths, job=None):
+        self.order.append(tuple(file_paths))
+        return {"added": len(file_paths)}
+
+def make_manager(ingester, max_queued=10):
+    return JobManager(max_workers=1, max_queued=max_queued,
+                      ingest_file=ingester.ingest, ingest_files=ingester.ingest_batch)
+
+def wait_for(job, *states):
+    deadline = time.monotonic() + 5
+    while job.status not in states:
+        assert time.monotonic() < deadline, f"job stuck in {job.status}"
+        time.sleep(0.01)
+
+def test_jobs_run_by_priority_then_arrival():
+    ingester = Ingester()
+    manager = make_manager(ingester)
+    blocker = manager.submit("block")
+    assert ingester.started.wait(5)
+    assert blocker.status == RUNNING and blocker.started_at
+
+    jobs = [manager.submit("low-a", 20), manager.submit("high", 1), manager.submit("low-b", 20),
+            manager.submit("batch", 5, file_paths=["x", "y"])]
+    assert all(job.status == QUEUED for job in jobs)
+    ingester.gate.set()
+    for job in jobs:
+        wait_for(job, COMPLETED)
+
+    assert ingester.order == ["block", "high", ("x", "y"), "low-a", "low-b"]
+    assert blocker.status == COMPLETED and blocker.result == {"added": 1} and blocker.finished_at
+    assert jobs[3].to_dict()["file_count"] == 2
+
+def test_failures_are_recorded():
+    ingester = Ingester()
+    manager = make_manager(ingester)
+    empty, broken = manager.submit("empty"), manager.submit("broken")
+    wait_for(broken, FAILED)
+    wait_for(empty, FAILED)
+    assert empty.error == "No documents were added to the knowledge base"
+    assert broken.error == "unreadable file"
+
+def test_full_queue_is_rejected_and_cancelled_jobs_free_their_slot():
+    ingester = Ingester()
+    manager = make_manager(ingester, max_queued=2)
+    blocker = manager.submit("block")
+    assert ingester.started.wait(5)
+    first = manager.submit("a")
+    manager.submit("b")
+    with pytest.raises(HTTPException) as rejected:
+        manager.submit("c")
+    assert rejected.value.status_code == 503
+
+    assert manager.cancel(first.id)
+    assert first.status == CANCELLED and first.finished_at
+    third = manager.submit("c")
+
+    ingester.gate.set()
+    wait_for(third, COMPLETED)
+    # The cancelled job was skipped, never started
+    assert ingester.order == ["block", "b", "c"]
+    assert first.started_at is None and first.status == CANCELLED
+    assert blocker.status == COMPLETED
+
+def test_cancelling_a_running_job_stops_it():
+    ingester = Ingester()
+    manager = make_manager(ingester)
+    job = manager.submit("slow")
+    assert ingester.started.wait(5)
+    assert manager.cancel(job.id)
+    wait_for(job, CANCELLED)
+    assert job.error is None and job.result is None
+
+def test_finished_or_unknown_jobs_cannot_be_cancelled():
+    ingester = Ingester()
+    manager = make_manager(ingester)
+    job = manager.submit("a")
+    wait_for(job, COMPLETED)
+    assert not manager.cancel(job.id)
+    assert job.status == COMPLETED
+    assert not manager.cancel("missing")
+
+def test_cancel_racing_the_dequeue_never_revives_the_job():
+    ingester = Ingester()
+    manager = make_manager(ingester, max_queued=1000)
+    jobs = [manager.submit(f"file-{i}") for i in range(200)]
+    cancelled = [job for job in jobs if manager.cancel(job.id)]
+    for job in jobs:
+        wait_for(job, COMPLETED, CANCELLED)
+    # A job is either cancelled before it started or ran to completion, never both
+    assert all(job.status == CANCELLED and job.started_at is None for job in jobs if job.status != COMPLETED)
+    assert len(ingester.order) == sum(job.status == COMPLETED for job in jobs)
+    assert len(cancelled) >= sum(job.status == CANCELLED for job in jobs)
+    assert manager._queued == 0
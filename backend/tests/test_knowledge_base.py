@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test the chat history store: migrations, indexes and chat bookkeeping
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import core.knowledge_base as knowledge_base
+
+def use_temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(knowledge_base, "CHAT_HISTORY_DB_FILE", str(tmp_path / "chat_history.db"))
+    knowledge_base.init_db()
+    return knowledge_base.connect()
+
+def test_init_db_migrates_once_and_uses_wal(tmp_path, monkeypatch):
+    conn = use_temp_db(tmp_path, monkeypatch)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(knowledge_base.MIGRATIONS)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    knowledge_base.init_db()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(knowledge_base.MIGRATIONS)
+
+def test_history_reads_use_the_chat_index(tmp_path, monkeypatch):
+    conn = use_temp_db(tmp_path, monkeypatch)
+    plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + knowledge_base.SELECT_MESSAGES, ("chat", 0)))
+    assert "idx_chat_messages_chat_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_messages_are_ordered_and_touch_the_chat(tmp_path, monkeypatch):
+    use_temp_db(tmp_path, monkeypatch)
+    chat = knowledge_base.create_chat("Notes")
+    knowledge_base.save_message(chat["id"], "user", "first")
+    knowledge_base.save_message(chat["id"], "assistant", "second")
+    knowledge_base.save_message(chat["id"], "user", "third")
+
+    assert [m.content for m in knowledge_base.load_messages(chat["id"])] == ["first", "second", "third"]
+    assert [m.content for m in knowledge_base.load_messages(chat["id"], offset=2)] == ["third"]
+
+    (row,) = knowledge_base.get_chats()
+    assert row[3] > chat["updated_at"]
+
+    knowledge_base.delete_chat(chat["id"])
+    assert knowledge_base.get_chats() == []
+    assert knowledge_base.get_chat_messages(chat["id"]) == []
+
+def test_keyset_pages_walk_the_whole_history(tmp_path, monkeypatch):
+    use_temp_db(tmp_path, monkeypatch)
+    chat_id = knowledge_base.create_chat("Long chat")["id"]
+    for i in range(25):
+        knowledge_base.save_message(chat_id, "user", f"message {i}")
+
+    newest = knowledge_base.get_chat_messages(chat_id, limit=10)
+    assert [row[3] for row in newest] == [f"message {i}" for i in range(15, 25)]
+
+    # Walk backwards with `before` until the start of the chat
+    pages = [newest]
+    while True:
+        oldest = pages[-1][0]
+        page = knowledge_base.get_chat_messages(chat_id, limit=10, before=knowledge_base.encode_cursor(oldest[4], oldest[0]))
+        if not page:
+            break
+        pages.append(page)
+    walked = [row[3] for page in reversed(pages) for row in page]
+    assert walked == [f"message {i}" for i in range(25)]
+
+    first = pages[-1][0]
+    after = knowledge_base.get_chat_messages(chat_id, limit=3, after=knowledge_base.encode_cursor(first[4], first[0]))
+    assert [row[3] for row in after] == ["message 1", "message 2", "message 3"]
+
+def test_streamed_rows_match_the_full_listing(tmp_path, monkeypatch):
+    use_temp_db(tmp_path, monkeypatch)
+    chat_ids = [knowledge_base.create_chat(f"Chat {i}")["id"] for i in range(7)]
+    for chat_id in chat_ids[:3]:
+        knowledge_base.save_message(chat_id, "user", "bump")
+
+    assert list(knowledge_base.iter_chats(batch_size=2)) == knowledge_base.get_chats()
+    assert list(knowledge_base.iter_chat_messages(chat_ids[0], batch_size=2)) == knowledge_base.get_chat_messages(chat_ids[0])
+
+    page = knowledge_base.get_chats(limit=4)
+    last = page[-1]
+    rest = knowledge_base.get_chats(limit=4, before=knowledge_base.encode_cursor(last[3], last[0]))
+    assert page + rest == knowledge_base.get_chats()
+
+def test_deleted_files_are_hidden_until_purged(tmp_path, monkeypatch):
+    use_temp_db(tmp_path, monkeypatch)
+    knowledge_base.save_file("f1", "notes.txt", "/files/notes.txt")
+    knowledge_base.save_file("f2", "todo.txt", "/files/todo.txt")
+
+    assert knowledge_base.mark_file_deleted("notes.txt") == ("f1", "/files/notes.txt")
+    assert knowledge_base.mark_file_deleted("notes.txt") is None
+    assert knowledge_base.get_file("notes.txt") is None
+    assert [row[0] for row in knowledge_base.get_files()] == ["f2"]
+    assert knowledge_base.get_deleted_files() == [("f1", "notes.txt", "/files/notes.txt")]
+
+    knowledge_base.purge_file("f1")
+    assert knowledge_base.get_deleted_files("notes.txt") == []
+
+def test_older_timestamp_formats_are_migrated(tmp_path, monkeypatch):
+    import re
+    from datetime import datetime, timezone
+    from core.db import migrate
+    monkeypatch.setattr(knowledge_base, "CHAT_HISTORY_DB_FILE", str(tmp_path / "chat_history.db"))
+    conn = knowledge_base.connect()
+    migrate(conn, knowledge_base.MIGRATIONS[:3])
+
+    # Rows as older code wrote them: chats left to CURRENT_TIMESTAMP (UTC), chats and
+    # deletes stamped with isoformat(), messages through sqlite3's datetime adapter
+    with conn:
+        conn.execute("INSERT INTO chats (id, title) VALUES ('old', 'Old chat')")
+        conn.execute("INSERT INTO chats VALUES ('iso', 'Iso chat', '2024-05-01T10:00:00.250000', '2024-05-01T10:00:00')")
+        conn.execute("INSERT INTO chat_messages VALUES ('m1', 'iso', 'user', 'first', '2024-05-01 10:00:00')")
+        conn.execute("INSERT INTO chat_messages VALUES ('m2', 'iso', 'assistant', 'second', '2024-05-01 10:00:00.500000')")
+        conn.execute("INSERT INTO files VALUES ('f', 'a.txt', '/a.txt', '2024-05-01T11:00:00.100000')")
+    (utc_created,) = conn.execute("SELECT created_at FROM chats WHERE id = 'old'").fetchone()
+    knowledge_base.init_db()
+
+    pattern = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{6}$")
+    stamps = [value for row in conn.execute(
+        "SELECT created_at, updated_at FROM chats UNION ALL SELECT timestamp, NULL FROM chat_messages"
+        " UNION ALL SELECT deleted_at, NULL FROM files") for value in row if value is not None]
+    assert len(stamps) == 7 and all(pattern.match(stamp) for stamp in stamps)
+    local = datetime.strptime(utc_created, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).astimezone()
+    assert conn.execute("SELECT created_at FROM chats WHERE id = 'old'").fetchone()[0] == local.strftime(knowledge_base.TIMESTAMP_FORMAT)
+    assert conn.execute("SELECT updated_at FROM chats WHERE id = 'iso'").fetchone()[0] == "2024-05-01 10:00:00.000000"
+
+    # New messages page after the migrated ones, whichever way the cursor walks
+    knowledge_base.save_message("iso", "user", "third")
+    assert [row[3] for row in knowledge_base.get_chat_messages("iso")] == ["first", "second", "third"]
+    assert [row[3] for row in knowledge_base.get_chat_messages("iso", limit=2)] == ["second", "third"]
+    after = knowledge_base.encode_cursor("2024-05-01 10:00:00.000000", "m1")
+    assert [row[3] for row in knowledge_base.get_chat_messages("iso", limit=5, after=after)] == ["second", "third"]
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test lazily built components: one build under concurrent first use, status and delegation
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from core.lazy import LazyComponent, component_status
+
+class Store:
+    def __init__(self):
+        self.items = ["a", "b"]
+
+    def get(self, ids=None):
+        return {"ids": ids or self.items}
+
+def test_concurrent_first_use_builds_once():
+    builds = []
+
+    def build():
+        builds.append(threading.current_thread().name)
+        time.sleep(0.05)
+        return Store()
+
+    store = LazyComponent("test-store", build)
+    assert component_status()["test-store"]["state"] == "not_loaded"
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: store.get()["ids"], range(8)))
+
+    assert len(builds) == 1
+    assert results == [["a", "b"]] * 8
+    assert store.is_ready and store.status()["state"] == "ready"
+    assert store.status()["load_seconds"] >= 0.05
+
+def test_failed_build_is_reported_and_retried():
+    attempts = []
+
+    def build():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no model file")
+        return [1, 2, 3]
+
+    pool = LazyComponent("test-pool", build)
+    with pytest.raises(RuntimeError):
+        pool.resolve()
+    assert pool.status() == {"state": "failed", "load_seconds": None, "error": "no model file"}
+    assert not pool.is_ready
+
+    assert len(pool) == 3 and pool[0] == 1 and list(pool) == [1, 2, 3]
+    assert pool.status()["state"] == "ready" and pool.status()["error"] is None
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test structure-aware Markdown chunking
+"""
+
+import os
+import re
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.documents import Document
+from core.markdown_splitter import MarkdownSectionSplitter, parse_blocks
+
+NOTE = """# Runbook
+
+## Deploy
+
+Build the image first.
+
+```bash
+make image
+
+# push it
+make push
+```
+
+## Rollback
+
+| step | command |
+| ---- | ------- |
+| 1 | make rollback |
+| 2 | make verify |
+"""
+
+def test_parse_blocks_tracks_heading_paths_and_keeps_fences_whole():
+    blocks = list(parse_blocks(NOTE))
+    assert [kind for kind, _, _ in blocks] == ["heading", "heading", "paragraph", "code", "heading", "table"]
+    code = blocks[3]
+    assert code[1].startswith("```bash") and "# push it" in code[1] and code[1].endswith("```")
+    assert code[2] == ("Runbook", "Deploy")
+    assert blocks[5][2] == ("Runbook", "Rollback")
+
+def test_sibling_sections_are_separate_chunks_with_heading_metadata():
+    chunks = MarkdownSectionSplitter(chunk_size=120, chunk_overlap=20).split_documents([Document(page_content=NOTE, metadata={"source": "runbook.md"})])
+    assert [chunk.metadata["headings"] for chunk in chunks] == ["Runbook > Deploy", "Runbook > Rollback"]
+    assert chunks[0].page_content.startswith("# Runbook\n\n## Deploy") and "make push\n```" in chunks[0].page_content
+    assert chunks[1].page_content.endswith("| ---- | ------- |\n| 1 | make rollback |\n| 2 | make verify |")
+    assert all(chunk.metadata["source"] == "runbook.md" for chunk in chunks)
+
+def test_small_subsections_join_their_parent():
+    note = NOTE.replace("# Runbook\n", "# Runbook\n\nHow we ship.\n")
+    chunks = MarkdownSectionSplitter(chunk_size=1000).split_sections(note)
+    assert len(chunks) == 1 and chunks[0][1] == ("Runbook",)
+    # Without text of its own the parent does not hold its subsections together
+    assert [path for _, path in MarkdownSectionSplitter(chunk_size=1000).split_sections(NOTE)] == [
+        ("Runbook", "Deploy"), ("Runbook", "Rollback")]
+
+def test_oversized_tables_repeat_their_header():
+    rows = "\n".join(f"| {i} | value {i} |" for i in range(40))
+    table = f"# Data\n\n| id | value |\n| -- | ----- |\n{rows}\n"
+    chunks = MarkdownSectionSplitter(chunk_size=200, chunk_overlap=20, max_block_size=200).split_text(table)
+    assert len(chunks) > 2
+    assert all("| id | value |\n| -- | ----- |" in chunk and len(chunk) <= 220 for chunk in chunks)
+    assert sum(len(re.findall(r"\| value \d+ \|", chunk)) for chunk in chunks) == 40
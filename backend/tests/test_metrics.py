@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus exposition and request latency middleware
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from core import metrics
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_wait_seconds", "Test histogram", ("queue",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.labels("chat").observe(value)
+    counter = metrics.Counter("test_jobs", "Test counter")
+    counter.inc(3)
+
+    text = metrics.render_metrics()
+    assert '# TYPE test_wait_seconds histogram' in text
+    assert 'test_wait_seconds_bucket{queue="chat",le="0.1"} 1' in text
+    assert 'test_wait_seconds_bucket{queue="chat",le="1"} 3' in text
+    assert 'test_wait_seconds_bucket{queue="chat",le="+Inf"} 4' in text
+    assert 'test_wait_seconds_sum{queue="chat"} 6.05' in text
+    assert 'test_wait_seconds_count{queue="chat"} 4' in text
+    assert '# TYPE test_jobs_total counter\ntest_jobs_total 3' in text
+
+def test_gauges_are_read_at_scrape_time():
+    values = iter([None, 7])
+    metrics.Gauge("test_size", "Test gauge", lambda: next(values))
+    assert "\ntest_size " not in metrics.render_metrics()
+    assert "\ntest_size 7\n" in metrics.render_metrics()
+
+def test_request_latency_is_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/missing")
+
+    text = metrics.render_metrics()
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 1' in text
+
+def test_sqlite_statements_are_timed_through_cursors_too(tmp_path):
+    from core.db import get_connection
+    conn = get_connection(str(tmp_path / "timed.db"))
+    observed = lambda: sum(conn.query_duration.counts)
+    before = observed()
+    conn.execute("CREATE TABLE items (id INTEGER)")
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO items VALUES (1)")
+    cursor.executemany("INSERT INTO items VALUES (?)", [(2,), (3,)])
+    assert cursor.execute("SELECT COUNT(*) FROM items").fetchone() == (3,)
+    # One observation per statement, a connection-level execute is not counted twice
+    assert observed() - before == 4
+
+def test_embedding_cache_lookups_are_exported(tmp_path):
+    from core.embedding_cache import CachedEmbeddings
+    from test_embedding_cache import CountingEmbeddings
+    lookups = lambda result: metrics.embedding_cache_lookups.labels(result).value
+    before = {result: lookups(result) for result in ("memory", "disk", "miss")}
+
+    cache = CachedEmbeddings(CountingEmbeddings(), "test-model", path=str(tmp_path / "cache.db"))
+    cache.embed_documents(["alpha", "beta"])
+    cache.embed_documents(["alpha"])
+    CachedEmbeddings(CountingEmbeddings(), "test-model", path=str(tmp_path / "cache.db")).embed_query("beta")
+
+    assert {result: lookups(result) - before[result] for result in before} == {"memory": 1, "disk": 1, "miss": 2}
+    text = metrics.render_metrics()
+    assert '# TYPE embedding_cache_lookups_total counter' in text
+    assert 'embedding_cache_lookups_total{result="miss"}' in text
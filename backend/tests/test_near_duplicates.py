@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test near-duplicate suppression over stored chunk vectors
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from core.near_duplicates import NearDuplicateFilter, distance_to_similarity, select_distinct
+
+def test_select_distinct_keeps_the_first_of_each_group():
+    vectors = [[1, 0], [0.99, 0.14], [0, 1], [0.1, 0.99], [0.7, 0.7]]
+    assert select_distinct(vectors, threshold=0.95) == [0, 2, 4]
+    assert select_distinct(vectors, threshold=1.01) == [0, 1, 2, 3, 4]
+    assert select_distinct([], threshold=0.9) == []
+
+def test_distance_to_similarity():
+    assert distance_to_similarity(0.0) == 1.0
+    assert distance_to_similarity(2.0) == 0.0            # squared L2 of opposite unit vectors
+    assert distance_to_similarity(0.25, "cosine") == 0.75
+
+class FixedRetriever(BaseRetriever):
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return self.docs
+
+class FakeStore:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.requested = []
+
+    def get(self, ids, include):
+        self.requested.append(list(ids))
+        found = [vector_id for vector_id in ids if vector_id in self.vectors]
+        return {"ids": found, "embeddings": [self.vectors[vector_id] for vector_id in found]}
+
+def test_filter_drops_overlapping_chunks_using_stored_vectors():
+    """Chunks are compared by the vectors already in the store; chunks without one are kept"""
+    docs = [
+        Document(id="a", page_content="first half of a paragraph"),
+        Document(id="b", page_content="half of a paragraph, overlapping"),
+        Document(id="c", page_content="something else"),
+        Document(page_content="no stored id"),
+    ]
+    store = FakeStore({"a": [1, 0], "b": [0.98, 0.2], "c": [0, 1]})
+    retriever = NearDuplicateFilter(retriever=FixedRetriever(docs=docs), vector_store=store, threshold=0.95)
+
+    kept = retriever.invoke("paragraph")
+    assert [doc.page_content for doc in kept] == ["first half of a paragraph", "something else", "no stored id"]
+    assert store.requested == [["a", "b", "c"]]
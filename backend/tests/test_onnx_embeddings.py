@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the ONNX embeddings backend's pooling and batching without a model
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import numpy as np
+from core.onnx_embeddings import OnnxEmbeddings, pool
+
+def test_mean_pooling_ignores_padding_and_normalizes():
+    hidden = np.array([[[1.0, 0.0], [3.0, 0.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool(hidden, mask), [[1.0, 0.0]])
+    assert np.allclose(pool(hidden, mask, "cls"), [[1.0, 0.0]])
+    assert np.allclose(np.linalg.norm(pool(np.random.rand(4, 5, 8), np.ones((4, 5))), axis=1), 1.0)
+
+class FakeTokenizer:
+    """One token per character, the token id is the character code"""
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        width = min(max(len(text) for text in texts), max_length)
+        ids = np.zeros((len(texts), width), dtype=np.int64)
+        mask = np.zeros((len(texts), width), dtype=np.int64)
+        for row, text in enumerate(texts):
+            codes = [ord(c) for c in text[:width]]
+            ids[row, :len(codes)] = codes
+            mask[row, :len(codes)] = 1
+        return {"input_ids": ids, "attention_mask": mask}
+
+class FakeSession:
+    def __init__(self):
+        self.batch_widths = []
+
+    def run(self, outputs, inputs):
+        ids = inputs["input_ids"]
+        self.batch_widths.append(ids.shape[1])
+        # A token's vector is (1, code): the pooled direction depends on the text's characters
+        return [np.stack([np.ones_like(ids), ids], axis=-1).astype(np.float32)]
+
+def test_batches_are_length_sorted_and_returned_in_input_order():
+    embeddings = OnnxEmbeddings("fake-model", batch_size=2)
+    embeddings._session, embeddings._tokenizer = FakeSession(), FakeTokenizer()
+    embeddings._input_names = ["input_ids", "attention_mask"]
+
+    texts = ["a" * 30, "b", "c" * 29, "d" * 2]
+    vectors = embeddings.embed_documents(texts)
+
+    # Short texts are batched together, so only the long batch pads to 30 tokens
+    assert embeddings._session.batch_widths == [2, 30]
+    for text, vector in zip(texts, vectors):
+        expected = np.array([1.0, ord(text[0])])
+        assert np.allclose(vector, expected / np.linalg.norm(expected))
+    assert embeddings.embed_query("b") == vectors[1]
+    assert embeddings.embed_documents([]) == []
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test cross-encoder reranking: ordering, the score cache and the per-query time budget
+"""
+
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from langchain_core.documents import Document
+from core.reranker import Reranker
+
+class FakeCrossEncoder:
+    """Scores a pair by how many query words the chunk contains"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs_scored = 0
+
+    def predict(self, pairs, batch_size=32):
+        time.sleep(self.delay)
+        self.pairs_scored += len(pairs)
+        return [sum(word in text for word in query.split()) for query, text in pairs]
+
+def make_reranker(model, **kwargs):
+    reranker = Reranker(model_name="fake", **kwargs)
+    reranker._model = model
+    return reranker
+
+DOCS = [
+    Document(page_content="billing invoices are sent monthly"),
+    Document(page_content="restart the search worker after ERR-4012"),
+    Document(page_content="search worker logs live in /var/log"),
+]
+
+def test_rerank_orders_by_score_and_keeps_top_n():
+    reranker = make_reranker(FakeCrossEncoder(), batch_size=2)
+    ranked = reranker.rerank("restart search worker ERR-4012", DOCS, top_n=2)
+    assert [doc.page_content for doc in ranked] == [DOCS[1].page_content, DOCS[2].page_content]
+
+def test_scores_are_cached_per_query_and_chunk():
+    model = FakeCrossEncoder()
+    reranker = make_reranker(model)
+    reranker.rerank("search worker", DOCS)
+    reranker.rerank("search worker", DOCS[:2] + [Document(page_content="new chunk")])
+    assert model.pairs_scored == 4
+    assert reranker.stats()["cache_hits"] == 2
+
+    reranker.rerank("billing", DOCS)
+    assert model.pairs_scored == 7
+
+def test_time_budget_leaves_the_rest_in_retrieval_order():
+    """Once the budget is spent, unscored candidates follow the scored ones in their original order"""
+    reranker = make_reranker(FakeCrossEncoder(delay=0.05), batch_size=1, max_seconds=0.01)
+    ranked = reranker.rerank("search worker", DOCS, top_n=3)
+    assert ranked == DOCS
+    assert reranker.stats()["truncated_queries"] == 1
+    assert reranker.stats()["scored"] == 1
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Test admission control and queueing in the inference scheduler
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from fastapi import HTTPException
+from core.scheduler import InferenceScheduler
+from core.lazy import LazyComponent
+
+async def hold(scheduler, name, order, priority=10, seconds=0.05):
+    async with scheduler.acquire(priority) as instance:
+        order.append((name, instance))
+        await asyncio.sleep(seconds)
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def scenario():
+        scheduler = InferenceScheduler(["model-0"], max_concurrent=1, max_queued=10)
+        order = []
+        first = asyncio.create_task(hold(scheduler, "first", order))
+        await asyncio.sleep(0.01)
+        waiters = [
+            asyncio.create_task(hold(scheduler, "low-a", order, priority=20)),
+            asyncio.create_task(hold(scheduler, "high", order, priority=1)),
+            asyncio.create_task(hold(scheduler, "low-b", order, priority=20)),
+        ]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()["queue_depth"] == 3
+        await asyncio.gather(first, *waiters)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert [name for name, _ in order] == ["first", "high", "low-a", "low-b"]
+    stats = scheduler.stats()
+    assert stats["completed"] == 4
+    assert stats["active"] == 0
+    assert stats["wait_seconds"]["max"] > 0
+
+def test_concurrency_is_capped_by_pool_size():
+    async def scenario():
+        scheduler = InferenceScheduler(["model-0", "model-1"], max_concurrent=8)
+        order = []
+        await asyncio.gather(*(hold(scheduler, f"request-{i}", order) for i in range(4)))
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert scheduler.max_concurrent == 2
+    assert {instance for _, instance in order} == {"model-0", "model-1"}
+
+def test_full_queue_and_queue_timeout_are_rejected():
+    async def scenario():
+        scheduler = InferenceScheduler(["model-0"], max_queued=1)
+        busy = asyncio.create_task(hold(scheduler, "busy", [], seconds=0.2))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(hold(scheduler, "queued", []))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(HTTPException) as full:
+            async with scheduler.acquire():
+                pass
+        assert full.value.status_code == 503
+
+        await asyncio.gather(busy, queued)
+        busy = asyncio.create_task(hold(scheduler, "busy", [], seconds=0.2))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException):
+            async with scheduler.acquire(timeout=0.01):
+                pass
+        await busy
+        return scheduler
+
+    stats = asyncio.run(scenario()).stats()
+    assert stats["rejected"] == 1
+    assert stats["timed_out"] == 1
+
+def test_cancelled_waiter_does_not_leak_the_instance():
+    async def scenario():
+        scheduler = InferenceScheduler(["model-0"])
+        busy = asyncio.create_task(hold(scheduler, "busy", [], seconds=0.05))
+        await asyncio.sleep(0.01)
+        abandoned = asyncio.create_task(hold(scheduler, "abandoned", []))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        await busy
+        order = []
+        await asyncio.wait_for(hold(scheduler, "after", order), timeout=1)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert order == [("after", "model-0")]
+    assert scheduler.stats()["cancelled"] == 1
+
+def test_lazy_pool_is_loaded_once_off_the_event_loop():
+    loads = []
+
+    def build():
+        loads.append(threading.current_thread().name)
+        if len(loads) == 1:
+            raise RuntimeError("model file missing")
+        return ["model-0", "model-1"]
+
+    pool = LazyComponent("test-llm", build)
+
+    async def scenario():
+        scheduler = InferenceScheduler(pool, max_concurrent=2, size=2)
+        assert not scheduler.loaded and not loads
+        with pytest.raises(HTTPException) as error:
+            await hold(scheduler, "failed", [])
+        assert error.value.status_code == 503
+        order = []
+        await asyncio.gather(*(hold(scheduler, f"request-{i}", order) for i in range(4)))
+        return scheduler, order
+
+    scheduler, order = asyncio.run(scenario())
+    assert len(loads) == 2 and threading.main_thread().name not in loads
+    assert scheduler.max_concurrent == 2 and scheduler.loaded
+    assert {instance for _, instance in order} == {"model-0", "model-1"}
+    assert pool.status()["state"] == "ready"
+
+def test_instances_are_warmed_before_any_request_holds_them():
+    warming = threading.Event()
+    finish_warming = threading.Event()
+    events = []
+
+    def warm(instance):
+        events.append(("warm", instance))
+        warming.set()
+        assert finish_warming.wait(5)
+
+    async def scenario():
+        scheduler = InferenceScheduler(["model-0", "model-1"], max_concurrent=2, warm=warm)
+        assert not scheduler.loaded
+        order = []
+        requests = [asyncio.create_task(hold(scheduler, f"request-{i}", order)) for i in range(3)]
+        await asyncio.get_running_loop().run_in_executor(None, warming.wait, 5)
+        await asyncio.sleep(0.05)
+        # Requests wait for warming, however long it takes
+        assert not order and scheduler.stats()["active"] == 0
+        finish_warming.set()
+        await asyncio.gather(*requests)
+        events.extend(("request", instance) for _, instance in order)
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+    assert events[:2] == [("warm", "model-0"), ("warm", "model-1")]
+    assert len(events) == 5 and scheduler.loaded
+
+def test_warm_up_thread_and_first_request_share_one_prepare():
+    warmed = []
+    pool = LazyComponent("test-llm-warm", lambda: ["model-0"])
+    scheduler = InferenceScheduler(pool, max_concurrent=1, size=1, warm=warmed.append)
+    thread = threading.Thread(target=scheduler.prepare)
+    thread.start()
+
+    async def scenario():
+        order = []
+        await hold(scheduler, "first", order)
+        return order
+
+    order = asyncio.run(scenario())
+    thread.join(5)
+    assert warmed == ["model-0"]
+    assert order == [("first", "model-0")]
+
+def test_pool_is_never_larger_than_the_concurrency_limit():
+    import subprocess
+    script = "from config import LLM_POOL_SIZE, LLM_MAX_CONCURRENT; print(LLM_POOL_SIZE, LLM_MAX_CONCURRENT)"
+    def sizes(**env):
+        output = subprocess.run([sys.executable, "-c", script], cwd=backend_dir, env={**os.environ, **env},
+                                check=True, capture_output=True, text=True).stdout
+        return tuple(int(value) for value in output.split())
+    assert sizes(LLM_POOL_SIZE="4", LLM_MAX_CONCURRENT="2") == (2, 2)
+    assert sizes(LLM_POOL_SIZE="2", LLM_MAX_CONCURRENT="4") == (2, 4)
+    assert sizes(LLM_POOL_SIZE="3") == (3, 3)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test SSE framing, token coalescing and disconnect handling of chat streams
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+from core.streaming import coalesce_events, format_event
+
+async def tokens(items, delay=0.0, closed=None):
+    try:
+        for item in items:
+            if delay:
+                await asyncio.sleep(delay)
+            yield item
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+async def collect(events):
+    return [event async for event in events]
+
+def test_frames_are_json_and_survive_newlines():
+    frame = format_event("token", {"text": "a\n\nb"})
+    assert frame.endswith("\n\n") and frame.count("\n\n") == 1
+    event, data = frame.strip().split("\n")
+    assert event == "event: token"
+    assert json.loads(data[len("data: "):]) == {"text": "a\n\nb"}
+
+def test_tokens_are_merged_and_other_events_flush_them():
+    items = [{"type": "context", "files": ["a.md"], "chunks": 1, "cached": False}]
+    items += [f"t{i} " for i in range(10)] + [{"type": "final", "response": "done"}]
+    events = asyncio.run(collect(coalesce_events(tokens(items), flush_seconds=10, flush_bytes=12)))
+
+    assert [event for event, _ in events] == ["context", "token", "token", "token", "token", "final"]
+    # The first token goes out alone, then batches of at least flush_bytes
+    texts = [data["text"] for event, data in events if event == "token"]
+    assert texts[0] == "t0 " and all(len(text) >= 12 for text in texts[1:-1])
+    assert "".join(texts) == "".join(f"t{i} " for i in range(10))
+
+def test_slow_tokens_are_flushed_on_time():
+    events = asyncio.run(collect(coalesce_events(tokens(["a", "b", "c"], delay=0.05), flush_seconds=0.01, flush_bytes=1000)))
+    assert [data["text"] for _, data in events] == ["a", "b", "c"]
+
+def test_disconnect_stops_and_closes_the_source():
+    closed = []
+    checks = []
+
+    async def is_disconnected():
+        checks.append(True)
+        return len(checks) > 1
+
+    async def scenario():
+        source = tokens(["x"] * 1000, delay=0.01, closed=closed)
+        return await collect(coalesce_events(source, is_disconnected, flush_seconds=0.01, check_seconds=0.05))
+
+    events = asyncio.run(scenario())
+    assert closed == [True]
+    assert sum(len(data["text"]) for _, data in events) < 1000
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test the watch-folder sync: debouncing, checkpointed skips, re-ingest on change and deletes
+"""
+
+import os
+import sys
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(backend_dir)
+
+import pytest
+from core.watcher import FolderWatcher
+
+class Recorder:
+    def __init__(self):
+        self.ingested = []
+        self.deleted = []
+
+    def ingest(self, path):
+        self.ingested.append(os.path.basename(path))
+        return {"added": 1}
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "notes"
+    folder.mkdir()
+    (folder / "a.txt").write_text("alpha")
+    (folder / "sub").mkdir()
+    (folder / "sub" / "b.txt").write_text("beta")
+    (folder / "ignored.bin").write_text("not a document")
+    (folder / ".a.txt.swp").write_text("swap")
+    return folder
+
+def make_watcher(folder, tmp_path, recorder):
+    watcher = FolderWatcher([str(folder)], state_file=str(tmp_path / "state" / "watch.db"), debounce_seconds=2,
+                            use_events=False, extensions={".txt"}, ingest=recorder.ingest, delete=recorder.delete)
+    watcher.init_state()
+    return watcher
+
+def test_changes_are_debounced(folder, tmp_path):
+    recorder = Recorder()
+    watcher = make_watcher(folder, tmp_path, recorder)
+    watcher.notify(str(folder / "a.txt"))
+    watcher.notify(str(folder / "ignored.bin"))
+    assert watcher.process_due() == 0
+    assert watcher.process_due(now=float("inf")) == 1
+    assert recorder.ingested == ["a.txt"]
+
+def test_sync_skips_unchanged_files_and_resumes_from_checkpoint(folder, tmp_path):
+    recorder = Recorder()
+    watcher = make_watcher(folder, tmp_path, recorder)
+    assert watcher.scan() == 2
+    watcher.process_due(now=float("inf"))
+    assert sorted(recorder.ingested) == ["a.txt", "b.txt"]
+
+    # Touched without a content change: hashed, not re-ingested
+    os.utime(folder / "a.txt", ns=(0, 0))
+    (folder / "sub" / "b.txt").write_text("beta, edited")
+    assert watcher.scan() == 2
+    watcher.process_due(now=float("inf"))
+    assert sorted(recorder.ingested) == ["a.txt", "b.txt", "b.txt"]
+
+    # A new watcher over the same checkpoint only sees what changed while it was down
+    (folder / "a.txt").unlink()
+    (folder / "c.txt").write_text("gamma")
+    restarted = make_watcher(folder, tmp_path, recorder)
+    assert restarted.scan() == 2
+    restarted.process_due(now=float("inf"))
+    assert recorder.ingested[-1] == "c.txt" and recorder.deleted == ["a.txt"]
+    assert restarted.scan() == 0
+
+def test_failed_sync_is_retried(folder, tmp_path):
+    recorder = Recorder()
+    watcher = make_watcher(folder, tmp_path, recorder)
+
+    def failing_ingest(path):
+        raise RuntimeError("model not loaded")
+
+    watcher.ingest = failing_ingest
+    assert watcher.sync_path(str(folder / "a.txt")) == "failed"
+    watcher.ingest = recorder.ingest
+    assert watcher.sync_path(str(folder / "a.txt")) == "ingested"
+    assert watcher.sync_path(str(folder / "a.txt")) == "unchanged"
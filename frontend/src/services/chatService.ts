@@ -9,6 +9,36 @@ const api = axios.create({
     }
 });
 
+// Files the answer draws on, sent before the first token
+export interface ChatContext {
+    files: string[];
+    chunks: number;
+    cached: boolean;
+}
+
+type StreamEvent =
+    | { type: "token"; data: { text: string } }
+    | { type: "context"; data: ChatContext }
+    | { type: "error"; data: { message?: string } }
+    | { type: "final"; data: { response?: string } };
+
+// Parse one server-sent event frame into its type and JSON payload
+function parseEvent(frame: string): StreamEvent | null {
+    let type = "message";
+    const dataLines: string[] = [];
+    for (const line of frame.split("\n")) {
+        if (line.startsWith("event:")) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+            dataLines.push(line.slice(5).trimStart());
+        }
+    }
+    if (dataLines.length === 0) {
+        return null;
+    }
+    return { type, data: JSON.parse(dataLines.join("\n")) } as StreamEvent;
+}
+
 const chatService = {
     // Get all chats
     async getChats(): Promise<Chat[]> {
@@ -86,6 +116,7 @@ const chatService = {
         chatId: string,
         message: string,
         onToken?: (token: string) => void,
+        onContext?: (context: ChatContext) => void,
     ): Promise<string> {
         try {
             const { files, sanitizedInput } = extractFilesAndSanitize(message);
@@ -109,8 +140,10 @@ const chatService = {
             }
             const decoder = new TextDecoder();
             let result = "";
+            let buffer = "";
 
             try {
+                // Server-sent events: "event: <type>" and "data: <json>" lines, frames end with a blank line
                 while (true) {
                     const { done, value } = await reader.read();
 
@@ -118,30 +151,31 @@ const chatService = {
                         break;
                     }
 
-                    const chunk = decoder.decode(value, { stream: true });
+                    buffer += decoder.decode(value, { stream: true });
+                    const frames = buffer.split("\n\n");
+                    buffer = frames.pop() ?? "";
 
-                    // Handle special markers
-                    if (chunk.includes("[END]")) {
-                        // Remove the end marker and break
-                        const cleanChunk = chunk.replace("[END]", "");
-                        if (cleanChunk && onToken) {
-                            onToken(cleanChunk);
+                    for (const frame of frames) {
+                        const event = parseEvent(frame);
+                        if (!event) {
+                            continue;
                         }
-                        result += cleanChunk;
-                        break;
-                    }
 
-                    if (chunk.includes("[ERROR]")) {
-                        // Handle error marker
-                        const errorMsg = chunk.replace("[ERROR]", "");
-                        throw new Error(errorMsg || "Streaming error occurred");
-                    }
-                    
-                    result += chunk;
-
-                    // Call the callback for each token to create typewriter effect
-                    if (onToken) {
-                        onToken(chunk);
+                        if (event.type === "token") {
+                            result += event.data.text;
+                            // Call the callback for each batch of tokens to create typewriter effect
+                            if (onToken) {
+                                onToken(event.data.text);
+                            }
+                        } else if (event.type === "context") {
+                            if (onContext) {
+                                onContext(event.data);
+                            }
+                        } else if (event.type === "error") {
+                            throw new Error(event.data.message || "Streaming error occurred");
+                        } else if (event.type === "final") {
+                            return event.data.response ?? result;
+                        }
                     }
                 }
             } finally {